@@ -0,0 +1,285 @@
+"""
+=============================================================================
+  CITY AIR WATCH — ALERT LIFECYCLE
+=============================================================================
+  AlertLifecycle: one alert state machine per ward, stepped for every ward
+  at once (or one ward at a time in the per-ward engine).
+
+    level      : -1 (no alert) or an index into the thresholds, lowest first
+    target     : highest level whose threshold the AQI reaches; a level at
+                 or below the current one is held while the AQI stays above
+                 threshold - hysteresis, so a ward hovering at a threshold
+                 does not flap.
+    dwell      : a move up must persist for raise_dwell_s, a move down for
+                 clear_dwell_s, measured from the first step it appeared.
+
+  Transitions (the only thing emitted on the stream):
+    raise       no alert -> level
+    escalate    level -> higher level        (same alert id)
+    deescalate  level -> lower level         (same alert id)
+    resolve     level -> no alert
+    reopen      a raise within dedup_s of the ward's last resolve: the old
+                alert id comes back with occurrences + 1 instead of a new alert
+
+  AlertStore: the active alerts, indexed by ward, severity and time of the
+  last transition, so filtered queries never scan every alert. Records are
+  replaced, never mutated, so lists handed out stay valid.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import math
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+RAISING: frozenset[str] = frozenset(("raise", "escalate", "reopen"))
+
+
+def alert_record(
+    threshold: Sequence[Any],
+    alert_id: str,
+    ward_id: str,
+    ward_name: str,
+    aqi: int,
+    timestamp: str,
+    raised_at: str,
+    occurrences: int = 1,
+) -> Dict[str, Any]:
+    """Active THRESHOLD_ALERT for one (level_aqi, severity, icon, action) threshold."""
+    level_aqi, severity, icon, action = threshold
+    return {
+        "id":          alert_id,
+        "type":        "THRESHOLD_ALERT",
+        "state":       "active",
+        "severity":    severity,
+        "icon":        icon,
+        "ward_id":     ward_id,
+        "ward_name":   ward_name,
+        "aqi":         aqi,
+        "threshold":   level_aqi,
+        "action":      action,
+        "raised_at":   raised_at,
+        "occurrences": occurrences,
+        "timestamp":   timestamp,
+    }
+
+
+class AlertLifecycle:
+    """Hysteresis + dwell alert state for a fixed list of wards."""
+
+    def __init__(
+        self,
+        ward_ids: Sequence[str],
+        ward_names: Sequence[str],
+        thresholds: Sequence[Sequence[Any]],
+        hysteresis: float = 15.0,
+        raise_dwell_s: float = 0.0,
+        clear_dwell_s: float = 30.0,
+        dedup_s: float = 300.0,
+    ) -> None:
+        self.ward_ids: List[str] = list(ward_ids)
+        self.ward_names: List[str] = list(ward_names)
+        self.index: Dict[str, int] = {wid: i for i, wid in enumerate(self.ward_ids)}
+        self.thresholds: List[tuple[Any, ...]] = sorted((tuple(t) for t in thresholds), key=lambda t: t[0])
+        self.enter: np.ndarray = np.array([t[0] for t in self.thresholds], dtype=np.float64)
+        self.exit: np.ndarray = self.enter - hysteresis
+        self._enter: List[float] = self.enter.tolist()
+        self._exit: List[float] = self.exit.tolist()
+        self.raise_dwell_s: float = raise_dwell_s
+        self.clear_dwell_s: float = clear_dwell_s
+        self.dedup_s: float = dedup_s
+
+        n: int = len(self.ward_ids)
+        self.level: np.ndarray = np.full(n, -1, dtype=np.int64)
+        self.pending_dir: np.ndarray = np.zeros(n, dtype=np.int64)    # -1 / 0 / +1
+        self.pending_since: np.ndarray = np.zeros(n, dtype=np.float64)
+        self.resolved_at: np.ndarray = np.full(n, -math.inf)
+        self.alerts: Dict[int, Dict[str, Any]] = {}     # ward position -> active alert
+        self.last_alert: Dict[int, Dict[str, Any]] = {}  # ward position -> last resolved alert
+        self.sequence: np.ndarray = np.zeros(n, dtype=np.int64)       # alerts raised per ward
+
+    # ── batched (columnar / sharded) ──────────────
+    def step(self, aqi: np.ndarray, timestamp: str, rows: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        One reading per ward (aligned with ward_ids) -> the transitions it
+        causes. Only the wards at positions `rows` (default: all) reported;
+        the others keep their state and pending dwell.
+        """
+        now: float = datetime.fromisoformat(timestamp).timestamp()
+        pos: np.ndarray = np.arange(len(self.level)) if rows is None else np.asarray(rows, dtype=np.int64)
+        values: np.ndarray = np.asarray(aqi, dtype=np.float64)[pos]
+        level: np.ndarray = self.level[pos]
+        up: np.ndarray = np.searchsorted(self.enter, values, side="right") - 1
+        held: np.ndarray = np.searchsorted(self.exit, values, side="right") - 1
+        target: np.ndarray = np.maximum(up, np.minimum(held, level))
+        direction: np.ndarray = np.sign(target - level)
+        restarted: np.ndarray = direction != self.pending_dir[pos]
+        self.pending_since[pos[restarted]] = now
+        self.pending_dir[pos] = direction
+        dwell: np.ndarray = np.where(direction > 0, self.raise_dwell_s, self.clear_dwell_s)
+        due: np.ndarray = np.flatnonzero((direction != 0) & (now - self.pending_since[pos] >= dwell))
+        aqis: List[int] = values[due].astype(np.int64).tolist()
+        return [
+            self._transition(i, new, a, now, timestamp)
+            for i, new, a in zip(pos[due].tolist(), target[due].tolist(), aqis)
+        ]
+
+    # ── per reading (ward engine) ──────────────────
+    def step_one(self, ward_id: str, aqi: int, timestamp: str) -> Optional[Dict[str, Any]]:
+        """step() for a single ward's reading."""
+        i: int = self.index[ward_id]
+        now: float = datetime.fromisoformat(timestamp).timestamp()
+        level: int = int(self.level[i])
+        up: int = bisect_right(self._enter, aqi) - 1
+        held: int = bisect_right(self._exit, aqi) - 1
+        target: int = max(up, min(held, level))
+        direction: int = (target > level) - (target < level)
+        if direction != self.pending_dir[i]:
+            self.pending_since[i] = now
+            self.pending_dir[i] = direction
+        if not direction:
+            return None
+        dwell: float = self.raise_dwell_s if direction > 0 else self.clear_dwell_s
+        if now - float(self.pending_since[i]) < dwell:
+            return None
+        return self._transition(i, target, int(aqi), now, timestamp)
+
+    def _transition(self, i: int, new: int, aqi: int, now: float, timestamp: str) -> Dict[str, Any]:
+        old: int = int(self.level[i])
+        self.level[i] = new
+        self.pending_dir[i] = 0
+        ward_id: str = self.ward_ids[i]
+        current: Optional[Dict[str, Any]] = self.alerts.get(i)
+        kind: str
+        alert: Dict[str, Any]
+        if new < 0:
+            kind = "resolve"
+            assert current is not None
+            alert = {**current, "state": "resolved", "aqi": aqi, "timestamp": timestamp}
+            del self.alerts[i]
+            self.last_alert[i] = alert
+            self.resolved_at[i] = now
+        else:
+            if current is not None:
+                kind = "escalate" if new > old else "deescalate"
+                alert_id, raised_at, occurrences = current["id"], current["raised_at"], current["occurrences"]
+            elif i in self.last_alert and now - float(self.resolved_at[i]) <= self.dedup_s:
+                kind = "reopen"
+                last: Dict[str, Any] = self.last_alert[i]
+                alert_id, raised_at, occurrences = last["id"], last["raised_at"], last["occurrences"] + 1
+            else:
+                kind = "raise"
+                self.sequence[i] += 1
+                alert_id, raised_at, occurrences = f"{ward_id}:{int(self.sequence[i])}", timestamp, 1
+            alert = alert_record(
+                self.thresholds[new], alert_id, ward_id, self.ward_names[i], aqi, timestamp, raised_at, occurrences
+            )
+            self.alerts[i] = alert
+        return {
+            "type":       "ALERT_TRANSITION",
+            "transition": kind,
+            "ward_id":    ward_id,
+            "aqi":        aqi,
+            "from":       self.thresholds[old][1] if old >= 0 else None,
+            "to":         self.thresholds[new][1] if new >= 0 else None,
+            "alert":      alert,
+            "timestamp":  timestamp,
+        }
+
+
+# ─────────────────────────────────────────────
+#  Indexed active-alert store (front process)
+# ─────────────────────────────────────────────
+class AlertStore:
+    """Active alerts by id, ward, severity and last-transition time; recent transitions."""
+
+    def __init__(self, history: int = 1000) -> None:
+        self.active: Dict[str, Dict[str, Any]] = {}               # alert id -> record
+        self.by_ward: Dict[str, str] = {}                          # ward id -> alert id
+        self.by_severity: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.updated: Dict[str, float] = {}                        # alert id -> epoch s of its last transition
+        self._times: List[float] = []                              # append-only time index, stale entries skipped
+        self._ids: List[str] = []
+        self.transitions: deque[Dict[str, Any]] = deque(maxlen=history)
+        self.version: int = 0
+        self._values: Optional[List[Dict[str, Any]]] = []
+
+    def __len__(self) -> int:
+        return len(self.active)
+
+    def apply(self, transitions: Sequence[Dict[str, Any]]) -> None:
+        if not transitions:
+            return
+        for t in transitions:
+            alert: Dict[str, Any] = t["alert"]
+            alert_id: str = alert["id"]
+            previous: Optional[Dict[str, Any]] = self.active.pop(alert_id, None)
+            if previous is not None:
+                self.by_severity[previous["severity"]].pop(alert_id, None)
+            if alert["state"] == "active":
+                self.active[alert_id] = alert
+                self.by_ward[alert["ward_id"]] = alert_id
+                self.by_severity.setdefault(alert["severity"], {})[alert_id] = alert
+                when: float = datetime.fromisoformat(alert["timestamp"]).timestamp()
+                self.updated[alert_id] = when
+                if self._times and when < self._times[-1]:
+                    # Clock went backwards (e.g. a replay restarted): keep the index sorted
+                    k: int = bisect_right(self._times, when)
+                    self._times.insert(k, when)
+                    self._ids.insert(k, alert_id)
+                else:
+                    self._times.append(when)
+                    self._ids.append(alert_id)
+            else:
+                self.by_ward.pop(alert["ward_id"], None)
+                self.updated.pop(alert_id, None)
+            self.transitions.append(t)
+        self.version += 1
+        self._values = None
+        if len(self._times) > 2 * len(self.active) + 1024:
+            live: List[tuple[float, str]] = [
+                (w, a) for w, a in zip(self._times, self._ids) if self.updated.get(a) == w
+            ]
+            self._times = [w for w, _ in live]
+            self._ids = [a for _, a in live]
+
+    def values(self) -> List[Dict[str, Any]]:
+        """Every active alert; the list is rebuilt only after a change."""
+        if self._values is None:
+            self._values = list(self.active.values())
+        return self._values
+
+    def query(
+        self,
+        severity: Optional[str] = None,
+        since: Optional[float] = None,
+        ward_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Active alerts matching every given filter, starting from the narrowest index."""
+        if ward_id is not None:
+            alert_id: Optional[str] = self.by_ward.get(ward_id)
+            found: List[Dict[str, Any]] = [self.active[alert_id]] if alert_id is not None else []
+        elif since is not None:
+            start: int = bisect_left(self._times, since)
+            found = [
+                self.active[a]
+                for w, a in zip(self._times[start:], self._ids[start:])
+                if self.updated.get(a) == w
+            ]
+        elif severity is not None:
+            return list(self.by_severity.get(severity, {}).values())
+        else:
+            return self.values()
+        return [
+            a for a in found
+            if (severity is None or a["severity"] == severity)
+            and (since is None or self.updated[a["id"]] >= since)
+        ]
+
+    def counts(self) -> Dict[str, int]:
+        return {severity: len(alerts) for severity, alerts in self.by_severity.items() if alerts}
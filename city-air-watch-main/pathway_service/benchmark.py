@@ -0,0 +1,1075 @@
+"""
+=============================================================================
+  CITY AIR WATCH — PATHWAY ENGINE BENCHMARKS
+=============================================================================
+  Usage:
+    python pathway_service/benchmark.py columnar [--wards 8 1000 5000 50000]
+    python pathway_service/benchmark.py fanout   [--clients 100 1000 10000]
+    python pathway_service/benchmark.py topics   [--clients 1000 10000] [--distinct 10 100 1000]
+    python pathway_service/benchmark.py pubsub   [--wards 1000 5000] [--subscribers 1 4 8]
+    python pathway_service/benchmark.py rag      [--docs 1000 10000] [--wards 1000 50000]
+    python pathway_service/benchmark.py ingest   [--readings 1000000] [--wards 50000]
+    python pathway_service/benchmark.py eventtime [--events 1000000] [--disorder 30]
+    python pathway_service/benchmark.py history  [--wards 50000] [--ticks 100]
+    python pathway_service/benchmark.py shards   [--wards 10000 50000] [--workers 1 2 4 8]
+    python pathway_service/benchmark.py nearby   [--wards 1000 50000] [--radius 500 2000 5000]
+    python pathway_service/benchmark.py forecast [--wards 1000 50000] [--days 3] [--step 60]
+    python pathway_service/benchmark.py subindex [--wards 1000 50000] [--ticks 40] [--step 600]
+    python pathway_service/benchmark.py replay   [--wards 100 5000] [--clients 0 100] [--spike-rate 0.05 0.2]
+                                                 [--modes ward columnar sharded] [--runtimes thread async]
+                                                 [--recording FILE]
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import contextlib
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List
+
+import numpy as np
+
+import pathway_engine as engine
+from columnar import generate_aqi_batch
+from doc_index import LEVEL_TERMS, POLLUTANT_TERMS, DocumentIndex, build_document_index
+from event_time import EventTimeWindows
+from fanout import FanoutHub
+from forecast import ForecastModel
+from delta import ward_patches
+from history import HistoryStore
+from ingest import FileTailConnector, HttpBatchConnector, LineServerConnector, Reading, ReadingQueue, window_batch
+from metrics import process_rss_bytes
+from pubsub import TOPIC_TICK, TickPublisher, TickSubscriber
+from replay import Replay, ReplayClock, write_window
+from spatial import haversine_m
+from sub_index import AVERAGING_HOURS, CONCENTRATION_BREAKPOINTS, INDEX_BREAKPOINTS, SubIndexEngine
+from topics import StreamFilter, TopicRouter
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    start: float = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000.0
+
+
+# ─────────────────────────────────────────────
+#  columnar: per-ward loop vs. batched NumPy tick
+# ─────────────────────────────────────────────
+def _ward_path_tick(wards: List[Dict[str, Any]], batch: Dict[str, Any]) -> Dict[str, Any]:
+    updates: List[Dict[str, Any]] = []
+    for i, ward in enumerate(wards):
+        reading: Dict[str, Any] = {
+            "ward_id":   ward["id"],
+            "ward_name": ward["name"],
+            "ward_type": ward["type"],
+            "aqi":       int(batch["aqi"][i]),
+            "spike":     bool(batch["spike"][i]),
+            "_tick":     batch["tick"],
+        }
+        updates.append(engine.process_reading(ward, reading))
+    return engine.build_city_summary([int(u["aqi"]) for u in updates])
+
+
+def _signature(summary: Dict[str, Any]) -> tuple[Any, ...]:
+    """Everything the two engine modes must agree on after a tick."""
+    wards = tuple(
+        (wid, r["aqi"], r["rolling_avg"], r["spike"], (r["alert"] or {}).get("severity"), json.dumps(r["windows"]))
+        for wid, r in sorted(engine.latest_readings.items())
+    )
+    return (
+        wards,
+        tuple(sorted(summary.items())),
+        int(engine.pipeline_stats["spikes_detected"]),
+        int(engine.pipeline_stats["alerts_triggered"]),
+    )
+
+
+def bench_columnar(args: argparse.Namespace) -> None:
+    print(f"{'wards':>8} {'per-ward':>12} {'columnar':>12} {'col+rows':>12} {'speedup':>9}  equal")
+    for count in args.wards:
+        wards: List[Dict[str, Any]] = engine.build_ward_grid(count)
+        engine.WARDS = wards
+        rng: np.random.Generator = np.random.default_rng(args.seed)
+        base: np.ndarray = np.array([int(w["base_aqi"]) for w in wards], dtype=np.int64)
+        prone: np.ndarray = np.array([w["type"] in ("industrial", "traffic") for w in wards])
+        batches: List[Dict[str, Any]] = [
+            generate_aqi_batch(base, prone, t, 1.0, rng) for t in range(args.ticks)
+        ]
+
+        # Per-ward reference path
+        engine.reset_pipeline_state()
+        ward_ms: List[float] = []
+        ward_sigs: List[tuple[Any, ...]] = []
+        run_ward_path: bool = count <= args.max_ward_path
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch in batches if run_ward_path else []:
+                start: float = time.perf_counter()
+                summary: Dict[str, Any] = _ward_path_tick(wards, batch)
+                ward_ms.append((time.perf_counter() - start) * 1000.0)
+                ward_sigs.append(_signature(summary))
+
+        # Columnar compute only
+        col = engine.new_columnar_engine(wards)
+        col_ms: List[float] = [_timed(lambda b=b: col.step(b["aqi"])) for b in batches]
+
+        # Columnar incl. latest_readings materialisation
+        engine.reset_pipeline_state()
+        col = engine.new_columnar_engine(wards)
+        full_ms: List[float] = []
+        equal: bool = True
+        with contextlib.redirect_stdout(io.StringIO()):
+            for t, batch in enumerate(batches):
+                start = time.perf_counter()
+                _, summary = engine.process_columnar_tick(col, wards, batch)
+                full_ms.append((time.perf_counter() - start) * 1000.0)
+                if run_ward_path:
+                    equal = equal and _signature(summary) == ward_sigs[t]
+
+        ward_avg: float = float(np.mean(ward_ms)) if ward_ms else float("nan")
+        col_avg: float = float(np.mean(col_ms))
+        full_avg: float = float(np.mean(full_ms))
+        print(
+            f"{count:>8} {ward_avg:>10.3f}ms {col_avg:>10.3f}ms {full_avg:>10.3f}ms "
+            f"{ward_avg / col_avg:>8.1f}x  {equal if run_ward_path else 'skipped'}"
+        )
+
+
+# ─────────────────────────────────────────────
+#  fanout: pipeline thread -> N subscribers, delivery skew per tick
+# ─────────────────────────────────────────────
+def _sample_tick_event(ward_count: int) -> Dict[str, Any]:
+    """A realistic aqi_update payload from one columnar tick."""
+    wards: List[Dict[str, Any]] = engine.build_ward_grid(ward_count)
+    engine.WARDS = wards
+    engine.reset_pipeline_state()
+    col = engine.new_columnar_engine(wards)
+    rng: np.random.Generator = np.random.default_rng(0)
+    base: np.ndarray = np.array([int(w["base_aqi"]) for w in wards], dtype=np.int64)
+    prone: np.ndarray = np.array([w["type"] in ("industrial", "traffic") for w in wards])
+    with contextlib.redirect_stdout(io.StringIO()):
+        updates, summary = engine.process_columnar_tick(col, wards, generate_aqi_batch(base, prone, 0, 1.0, rng))
+    return {"event": "aqi_update", "tick": 0, "city_summary": summary, "wards": updates}
+
+
+async def _fanout_run(clients: int, ticks: int, interval: float, event: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    hub: FanoutHub = FanoutHub(max_pending=ticks + 1, heartbeat_s=0)
+    received: np.ndarray = np.zeros((ticks, clients))
+    sent: np.ndarray = np.zeros(ticks)
+    publish_ms: np.ndarray = np.zeros(ticks)
+
+    async def consume(j: int) -> None:
+        sub = hub.subscribe()
+        for t in range(ticks):
+            await sub.next_frame()
+            received[t, j] = time.perf_counter()
+
+    tasks = [asyncio.create_task(consume(j)) for j in range(clients)]
+    await asyncio.sleep(0)  # let every consumer subscribe
+
+    def produce() -> None:
+        for t in range(ticks):
+            sent[t] = time.perf_counter()
+            hub.publish({**event, "tick": t})
+            publish_ms[t] = (time.perf_counter() - sent[t]) * 1000.0
+            time.sleep(interval)
+
+    await asyncio.get_running_loop().run_in_executor(None, produce)
+    await asyncio.gather(*tasks)
+    return {
+        "publish": publish_ms,
+        "first":   (received.min(axis=1) - sent) * 1000.0,
+        "last":    (received.max(axis=1) - sent) * 1000.0,
+        "skew":    (received.max(axis=1) - received.min(axis=1)) * 1000.0,
+    }
+
+
+def bench_fanout(args: argparse.Namespace) -> None:
+    event: Dict[str, Any] = _sample_tick_event(args.wards)
+    print(f"payload: {args.wards} wards, {len(json.dumps(event)) / 1024.0:.1f} KiB per tick")
+    print(f"{'clients':>8} {'publish p50':>12} {'first p50':>10} {'last p50':>10} {'last p99':>10} {'skew p50':>10} {'skew p99':>10}")
+    for clients in args.clients:
+        r: Dict[str, np.ndarray] = asyncio.run(_fanout_run(clients, args.ticks, args.interval, event))
+        print(
+            f"{clients:>8} {np.percentile(r['publish'], 50):>10.3f}ms "
+            f"{np.percentile(r['first'], 50):>8.3f}ms {np.percentile(r['last'], 50):>8.3f}ms "
+            f"{np.percentile(r['last'], 99):>8.3f}ms {np.percentile(r['skew'], 50):>8.3f}ms "
+            f"{np.percentile(r['skew'], 99):>8.3f}ms"
+        )
+
+
+# ─────────────────────────────────────────────
+#  topics: filtered subscriptions vs. the full broadcast
+# ─────────────────────────────────────────────
+async def _topics_run(
+    clients: int,
+    filters: List[StreamFilter],
+    ticks: int,
+    interval: float,
+    event: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Clients spread round-robin over `filters` (none: everyone on the full stream)."""
+    full: FanoutHub = FanoutHub(max_pending=ticks + 1, heartbeat_s=0)
+    router: TopicRouter = TopicRouter(lambda: FanoutHub(max_pending=ticks + 1, heartbeat_s=0), idle_ticks=ticks)
+    rows: Dict[str, Dict[str, Any]] = {str(r["ward_id"]): r for r in event["wards"]}
+    received: np.ndarray = np.zeros(ticks)
+    sent: np.ndarray = np.zeros(ticks)
+    publish_ms: np.ndarray = np.zeros(ticks)
+    nbytes: List[int] = [0]
+
+    async def consume(j: int) -> None:
+        if filters:
+            joined = router.subscribe(filters[j % len(filters)])
+            assert joined is not None
+            sub = joined[1]
+        else:
+            sub = full.subscribe()
+        for t in range(ticks):
+            frame = await sub.next_frame()
+            nbytes[0] += len(frame or b"")
+            received[t] = time.perf_counter()
+
+    tasks = [asyncio.create_task(consume(j)) for j in range(clients)]
+    await asyncio.sleep(0)
+
+    def produce() -> None:
+        for t in range(ticks):
+            sent[t] = time.perf_counter()
+            if filters:
+                router.publish({**event, "tick": t}, lambda: rows)
+            else:
+                full.publish({**event, "tick": t})
+            publish_ms[t] = (time.perf_counter() - sent[t]) * 1000.0
+            time.sleep(interval)
+
+    await asyncio.get_running_loop().run_in_executor(None, produce)
+    await asyncio.gather(*tasks)
+    return {
+        "publish":  float(np.percentile(publish_ms, 50)),
+        "last":     float(np.percentile((received - sent) * 1000.0, 50)),
+        "kib_tick": nbytes[0] / ticks / 1024.0,
+        "hubs":     len(router) if filters else 1,
+    }
+
+
+def bench_topics(args: argparse.Namespace) -> None:
+    event: Dict[str, Any] = {
+        **_sample_tick_event(args.wards),
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "pipeline": {"layer": "Pathway Streaming Engine", "tick": 0, "stats": engine.pipeline_stats_payload()},
+        "alert_transitions": [],
+        "rag_bands": engine.rag_bands_payload(),
+    }
+    ward_ids: List[str] = [str(w["id"]) for w in engine.WARDS]
+    topics: tuple[str, ...] = tuple(sorted(args.topics))
+    print(f"payload: {args.wards} wards, {len(json.dumps(event)) / 1024.0:.1f} KiB per full tick; "
+          f"filtered clients: one ward each, topics={','.join(topics)}")
+    print(f"{'clients':>8} {'filters':>8} {'hubs':>6} {'publish p50':>12} {'last p50':>10} {'sent/tick':>12} {'of full':>8}")
+    for clients in args.clients:
+        base: Dict[str, Any] = asyncio.run(_topics_run(clients, [], args.ticks, args.interval, event))
+        print(f"{clients:>8} {'full':>8} {base['hubs']:>6} {base['publish']:>10.3f}ms {base['last']:>8.3f}ms "
+              f"{base['kib_tick']:>9.0f}KiB {'100%':>8}")
+        for distinct in args.distinct:
+            if distinct > clients:
+                continue
+            step: int = max(1, len(ward_ids) // distinct)
+            filters: List[StreamFilter] = [StreamFilter((ward_ids[(k * step) % len(ward_ids)],), topics) for k in range(distinct)]
+            r: Dict[str, Any] = asyncio.run(_topics_run(clients, filters, args.ticks, args.interval, event))
+            print(f"{clients:>8} {distinct:>8} {r['hubs']:>6} {r['publish']:>10.3f}ms {r['last']:>8.3f}ms "
+                  f"{r['kib_tick']:>9.0f}KiB {r['kib_tick'] / base['kib_tick']:>8.3%}")
+
+
+# ─────────────────────────────────────────────
+#  pubsub: engine -> output worker tick delivery over the Unix socket
+# ─────────────────────────────────────────────
+def _pubsub_worker(path: str, ticks: int, parse: bool, results: Any) -> None:
+    """An output worker's share: receive (and parse) every tick, note when each arrived."""
+    arrived: List[float] = []
+    parse_ms: List[float] = []
+    done: threading.Event = threading.Event()
+
+    def handle(_topic: bytes, payload: bytes) -> None:
+        arrived.append(time.time())
+        if parse:
+            start: float = time.perf_counter()
+            json.loads(payload)
+            parse_ms.append((time.perf_counter() - start) * 1000.0)
+        if len(arrived) == ticks:
+            done.set()
+
+    sub: TickSubscriber = TickSubscriber(path, handle, retry_s=0.05)
+    sub.start()
+    done.wait(120)
+    sub.stop()
+    results.put((arrived, parse_ms))
+
+
+def bench_pubsub(args: argparse.Namespace) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'wards':>8} {'payload':>9} {'subs':>5} {'send':>9} {'deliver p50':>12} {'p99':>9} "
+          f"{'parse p50':>10} {'MB/s':>8} {'dropped':>8}")
+    for count in args.wards:
+        body: bytes = json.dumps(_sample_tick_event(count)).encode("utf-8")
+        for subs in args.subscribers:
+            path: str = os.path.join(tempfile.mkdtemp(), "ticks.sock")
+            publisher: TickPublisher = TickPublisher(path)
+            results = ctx.Queue()
+            procs = [ctx.Process(target=_pubsub_worker, args=(path, args.ticks, args.parse, results)) for _ in range(subs)]
+            for proc in procs:
+                proc.start()
+            deadline: float = time.monotonic() + 30
+            while len(publisher) < subs and time.monotonic() < deadline:
+                time.sleep(0.01)
+            sent: List[float] = []
+            send_ms: List[float] = []
+            started: float = time.perf_counter()
+            for _ in range(args.ticks):
+                sent.append(time.time())
+                t0: float = time.perf_counter()
+                publisher.send(TOPIC_TICK, body)
+                send_ms.append((time.perf_counter() - t0) * 1000.0)
+                time.sleep(args.interval)
+            collected = [results.get(timeout=120) for _ in procs]
+            elapsed: float = time.perf_counter() - started
+            for proc in procs:
+                proc.join()
+            dropped: int = publisher.dropped
+            publisher.close()
+            n: int = min(len(arrived) for arrived, _ in collected)
+            last: np.ndarray = np.max([arrived[:n] for arrived, _ in collected], axis=0)
+            latency: np.ndarray = (last - np.array(sent[:n])) * 1000.0
+            parse_ms: List[float] = [ms for _, p in collected for ms in p]
+            parse: str = f"{np.median(parse_ms):>8.2f}ms" if parse_ms else f"{'-':>10}"
+            mb_s: float = len(body) * n * subs / elapsed / 1e6
+            print(f"{count:>8} {len(body) / 1024.0:>6.0f}KiB {subs:>5} {np.median(send_ms):>7.3f}ms "
+                  f"{np.percentile(latency, 50):>10.2f}ms {np.percentile(latency, 99):>7.2f}ms "
+                  f"{parse} {mb_s:>8.1f} {dropped:>8}")
+
+
+# ─────────────────────────────────────────────
+#  rag: document index build + batched per-tick retrieval latency
+# ─────────────────────────────────────────────
+def _synthetic_corpus(count: int, rng: np.random.Generator) -> DocumentIndex:
+    """Advisory-like documents: domain terms mixed with filler, 60-400 words each."""
+    domain: List[str] = sorted({t for terms in (*LEVEL_TERMS.values(), *POLLUTANT_TERMS.values()) for t in terms})
+    filler: List[str] = [f"w{i}" for i in range(5000)]
+    index: DocumentIndex = build_document_index(engine.DOCUMENT_STORE)
+    for d in range(count):
+        n: int = int(rng.integers(60, 400))
+        words: List[str] = [
+            domain[int(rng.integers(len(domain)))] if rng.random() < 0.3 else filler[int(rng.integers(len(filler)))]
+            for _ in range(n)
+        ]
+        index.add_document(f"Circular {d}", " ".join(words), "synthetic")
+    return index
+
+
+def bench_rag(args: argparse.Namespace) -> None:
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    print(f"{'docs':>7} {'chunks':>7} {'build':>9} {'wards':>7} {'ms/tick':>9} {'us/ward':>8}")
+    for docs in args.docs:
+        index: DocumentIndex = _synthetic_corpus(docs, rng)
+        build_ms: float = _timed(index.build)
+        for count in args.wards:
+            wards: List[Dict[str, Any]] = engine.build_ward_grid(count)
+            base: np.ndarray = np.array([int(w["base_aqi"]) for w in wards], dtype=np.int64)
+            prone: np.ndarray = np.array([w["type"] in ("industrial", "traffic") for w in wards])
+            types: List[str] = [str(w["type"]) for w in wards]
+            times: List[float] = []
+            for t in range(args.ticks):
+                batch: Dict[str, Any] = generate_aqi_batch(base, prone, t, 1.0, rng)
+                times.append(_timed(lambda b=batch: index.search_profiles(b["aqi"], b, types, args.k)))
+            ms: float = float(np.median(times))
+            print(f"{docs:>7} {len(index.chunks):>7} {build_ms:>7.0f}ms {count:>7} {ms:>7.2f}ms {ms * 1000.0 / count:>8.2f}")
+
+
+# ─────────────────────────────────────────────
+#  ingest: connector -> queue throughput, window collapse cost
+# ─────────────────────────────────────────────
+def _sensor_lines(count: int, wards: int, seed: int) -> List[bytes]:
+    rng: np.random.Generator = np.random.default_rng(seed)
+    ward = rng.integers(0, wards, count).tolist()
+    aqi = rng.integers(10, 500, count).tolist()
+    return [
+        f"ward_{w + 1},{a},{a * 0.6:.1f},{a * 0.9:.1f},{a * 0.3:.1f},{a * 0.02:.2f},2026-01-01T00:00:00+00:00\n".encode()
+        for w, a in zip(ward, aqi)
+    ]
+
+
+def _tcp_sender(port: int, payload: bytes) -> None:
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(payload)
+
+
+def _drain_until(queue: ReadingQueue, total: int, start: float) -> float:
+    """Consume like the pipeline does; readings/s once `total` have been drained or dropped."""
+    got: int = 0
+    while got + queue.dropped < total:
+        got += len(queue.drain(0.5))
+        if time.perf_counter() - start > 120:
+            break
+    return got / (time.perf_counter() - start)
+
+
+def bench_ingest(args: argparse.Namespace) -> None:
+    lines: List[bytes] = _sensor_lines(args.readings, args.wards, args.seed)
+    payload: bytes = b"".join(lines)
+    print(f"{args.readings} readings, {len(payload) / 1e6:.1f} MB of line protocol, {args.wards} wards")
+    print(f"{'connector':>10} {'readings/s':>12} {'dropped':>9} {'throttled':>10}")
+
+    # TCP: sender in a separate process so it does not share our GIL
+    queue: ReadingQueue = ReadingQueue(args.queue)
+    line = LineServerConnector(queue, host="127.0.0.1", tcp_port=0, udp_port=-1)
+    line.start()
+    line.ready.wait()
+    sender = multiprocessing.Process(target=_tcp_sender, args=(line.tcp_port, payload))
+    start: float = time.perf_counter()
+    sender.start()
+    rate: float = _drain_until(queue, args.readings, start)
+    sender.join()
+    line.stop()
+    print(f"{'tcp':>10} {rate:>12,.0f} {queue.dropped:>9} {line.throttled:>10}")
+
+    # File tail: the whole file is present up front, read from the start
+    queue = ReadingQueue(args.queue)
+    with tempfile.NamedTemporaryFile("wb", suffix=".csv", delete=False) as fh:
+        fh.write(payload)
+    tail = FileTailConnector(queue, fh.name, from_start=True)
+    start = time.perf_counter()
+    tail.start()
+    rate = _drain_until(queue, args.readings, start)
+    tail.stop()
+    os.unlink(fh.name)
+    print(f"{'file':>10} {rate:>12,.0f} {queue.dropped:>9} {'-':>10}")
+
+    # HTTP batch: JSON decode + validation + enqueue per request body (no socket)
+    queue = ReadingQueue(args.queue)
+    http = HttpBatchConnector(queue)
+    body: bytes = json.dumps([
+        dict(zip(("ward_id", "aqi", "pm25", "pm10", "no2", "co"), ln.decode().split(",")[:6]))
+        for ln in lines[:args.http_batch]
+    ]).encode()
+    consumer = threading.Thread(target=_drain_until, args=(queue, args.readings, time.perf_counter()), daemon=True)
+    start = time.perf_counter()
+    consumer.start()
+    for _ in range(args.readings // args.http_batch):
+        http.submit(json.loads(body))
+    consumer.join()
+    rate = (args.readings // args.http_batch) * args.http_batch / (time.perf_counter() - start)
+    print(f"{'http':>10} {rate:>12,.0f} {queue.dropped:>9} {'-':>10}")
+
+    # Columnar window collapse of one window's worth of readings
+    index: Dict[str, int] = {f"ward_{i + 1}": i for i in range(args.wards)}
+    rows: List[Reading] = HttpBatchConnector(ReadingQueue(1)).parse_lines([ln.decode() for ln in lines[:args.window]])
+    previous: Dict[str, np.ndarray] = {k: np.zeros(args.wards) for k in ("aqi", "pm25", "pm10", "no2", "co")}
+    ms: float = float(np.median([_timed(lambda: window_batch(rows, index, previous, 0)) for _ in range(5)]))
+    print(f"window_batch: {len(rows)} readings -> {args.wards} wards in {ms:.1f} ms")
+
+
+# ─────────────────────────────────────────────
+#  eventtime: per-event cost of out-of-order windowing vs. window length
+# ─────────────────────────────────────────────
+def bench_eventtime(args: argparse.Namespace) -> None:
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    keys: List[str] = [f"ward_{i + 1}" for i in range(args.wards)]
+    # Readings arrive in batches at `rate` events/s of event time, each shifted back by up to `disorder` s
+    t: np.ndarray = np.arange(args.events) / args.rate - rng.uniform(0.0, args.disorder, args.events)
+    idx: np.ndarray = rng.integers(0, args.wards, args.events)
+    values: np.ndarray = rng.integers(10, 500, args.events).astype(np.float64)
+    print(f"{args.events} events over {args.events / args.rate:.0f}s of event time, {args.wards} wards, "
+          f"disorder <= {args.disorder}s, batches of {args.batch}")
+    print(f"{'window':>14} {'us/event':>9} {'emitted':>8} {'updates':>8} {'dropped':>8} {'panes':>6}")
+    for size in args.sizes:
+        win: EventTimeWindows = EventTimeWindows(
+            f"{size:g}s/{args.slide:g}s", keys, size, args.slide, args.lateness, args.delay
+        )
+        emitted: int = 0
+        start: float = time.perf_counter()
+        for b in range(0, args.events, args.batch):
+            win.add(idx[b:b + args.batch], t[b:b + args.batch], values[b:b + args.batch])
+            emitted += len(win.advance())
+        us: float = (time.perf_counter() - start) * 1e6 / args.events
+        print(f"{win.name:>14} {us:>9.3f} {emitted:>8} {win.updates_emitted:>8} {win.dropped_late:>8} {len(win.panes):>6}")
+
+
+# ─────────────────────────────────────────────
+#  history: segment store write throughput and range-query latency
+# ─────────────────────────────────────────────
+def bench_history(args: argparse.Namespace) -> None:
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    keys: List[str] = [f"ward_{i + 1}" for i in range(args.wards)]
+    t0: float = float(int(time.time() // 86400) * 86400 - 86400)   # start of yesterday, UTC
+    with tempfile.TemporaryDirectory() as root:
+        store: HistoryStore = HistoryStore(root, max_pending=args.ticks + 1)
+        store.start()
+        idx: np.ndarray = np.arange(args.wards)
+        append_ms: List[float] = []
+        start: float = time.perf_counter()
+        for tick in range(args.ticks):
+            aqi: np.ndarray = rng.integers(10, 500, args.wards).astype(np.float64)
+            columns: Dict[str, np.ndarray] = {
+                "aqi": aqi, "pm25": aqi * 0.6, "pm10": aqi * 0.9, "no2": aqi * 0.3, "co": aqi * 0.02,
+                "spike": rng.random(args.wards) < 0.05,
+            }
+            times: np.ndarray = np.full(args.wards, t0 + tick * args.interval)
+            append_ms.append(_timed(lambda: store.append(keys, idx, times, columns)))
+        store.flush(600.0)
+        elapsed: float = time.perf_counter() - start
+        records: int = args.wards * args.ticks
+        print(f"write: {records} records ({args.wards} wards x {args.ticks} ticks) in {elapsed:.2f}s "
+              f"= {records / elapsed:,.0f} records/s, {store.bytes_written / 1e6:.1f} MB, "
+              f"append() p99 {np.percentile(append_ms, 99):.3f} ms, dropped {store.chunks_dropped}")
+
+        # One ward with a full day of 1-second readings
+        day: int = 86400
+        dense: HistoryStore = HistoryStore(os.path.join(root, "dense"), max_pending=4)
+        dense.start()
+        aqi = rng.integers(10, 500, day).astype(np.float64)
+        dense.append(["ward_1"], np.zeros(day, dtype=np.int64), t0 + np.arange(day, dtype=np.float64), {
+            "aqi": aqi, "pm25": aqi * 0.6, "pm10": aqi * 0.9, "no2": aqi * 0.3, "co": aqi * 0.02,
+            "spike": np.zeros(day, dtype=bool),
+        })
+        dense.flush(60.0)
+        print(f"{'range':>8} {'resolution':>11} {'points':>7} {'scanned':>8} {'ms':>8}")
+        for span, resolution in ((3600, 60), (86400, 300), (86400, 60), (7 * 86400, 3600)):
+            result: Dict[str, Any] = {}
+
+            def run(span: int = span, resolution: int = resolution) -> None:
+                result.update(dense.query("ward_1", t0, t0 + span, resolution))
+            ms: float = float(np.median([_timed(run) for _ in range(5)]))
+            print(f"{span:>7}s {resolution:>10}s {len(result['points']):>7} {result['scanned']:>8} {ms:>8.2f}")
+
+
+# ─────────────────────────────────────────────
+#  nearby: spatial index build, radius queries and per-tick neighbourhood aggregates
+# ─────────────────────────────────────────────
+def bench_nearby(args: argparse.Namespace) -> None:
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+    print(f"{'wards':>7} {'build ms':>9} {'tick ms':>8} {'radius':>7} {'in range':>9} "
+          f"{'index p50':>10} {'index p99':>10} {'/nearby p50':>12} {'/nearby p99':>12}  exact")
+    for n in args.wards:
+        engine.WARDS = engine.build_ward_grid(n)
+        engine.reset_pipeline_state()
+        build_ms: float = _timed(lambda: engine.ward_spatial_index(engine.WARDS))
+        index = engine.ward_spatial_index(engine.WARDS)
+        base: np.ndarray = np.array([w["base_aqi"] for w in engine.WARDS], dtype=np.int64)
+        tick_ms: List[float] = []
+        for _ in range(args.ticks):
+            aqi: np.ndarray = base + rng.integers(-20, 40, n)
+            tick_ms.append(_timed(lambda: engine.update_spatial(engine.WARDS, aqi, base.astype(np.float64))))
+        lat0, lat1 = float(index.lat.min()), float(index.lat.max())
+        lon0, lon1 = float(index.lon.min()), float(index.lon.max())
+        points: np.ndarray = np.column_stack((rng.uniform(lat0, lat1, args.queries), rng.uniform(lon0, lon1, args.queries)))
+        for radius in args.radius:
+            index_ms: List[float] = []
+            handler_ms: List[float] = []
+            found: List[int] = []
+            exact: bool = True
+            for lat, lon in points.tolist():
+                result: List[Any] = []
+                index_ms.append(_timed(lambda: result.append(index.within(lat, lon, radius))))
+                handler_ms.append(_timed(lambda: loop.run_until_complete(
+                    engine.get_nearby(lat=lat, lon=lon, radius=radius, limit=args.limit)
+                )))
+                found.append(len(result[0][0]))
+            for lat, lon in points[:20].tolist():
+                brute: np.ndarray = np.flatnonzero(haversine_m(lat, lon, index.lat, index.lon) <= radius)
+                exact = exact and set(brute.tolist()) == set(index.within(lat, lon, radius)[0].tolist())
+            print(f"{n:>7} {build_ms:>9.1f} {np.median(tick_ms):>8.3f} {radius:>6.0f}m {np.mean(found):>9.1f} "
+                  f"{np.median(index_ms):>8.3f}ms {np.percentile(index_ms, 99):>8.3f}ms "
+                  f"{np.median(handler_ms):>10.3f}ms {np.percentile(handler_ms, 99):>10.3f}ms  {exact}")
+    engine.reset_pipeline_state()
+    loop.close()
+
+
+# ─────────────────────────────────────────────
+#  forecast: per-tick update cost, and accuracy against persistence
+# ─────────────────────────────────────────────
+def bench_forecast(args: argparse.Namespace) -> None:
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    print(f"{'wards':>7} {'update ms':>10} {'forecast ms':>12} {'ms/1k wards':>12} {'/forecast p50':>14}")
+    loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+    for n in args.wards:
+        engine.WARDS = engine.build_ward_grid(n)
+        engine.reset_pipeline_state()
+        base: np.ndarray = np.array([w["base_aqi"] for w in engine.WARDS], dtype=np.int64)
+        model: ForecastModel = ForecastModel(n, engine.FORECAST_HORIZONS)
+        update_ms: List[float] = []
+        forecast_ms: List[float] = []
+        for t in range(args.ticks):
+            aqi: np.ndarray = base + rng.integers(-20, 40, n)
+            update_ms.append(_timed(lambda: model.update(aqi, t * engine.TICK_INTERVAL_S, 12)))
+            forecast_ms.append(_timed(model.forecast))
+            engine.update_forecast(engine.WARDS, aqi, np.arange(n))
+        ids: List[str] = [str(engine.WARDS[i]["id"]) for i in rng.integers(0, n, args.queries).tolist()]
+        handler_ms: List[float] = [
+            _timed(lambda: loop.run_until_complete(engine.get_forecast(wid))) for wid in ids
+        ]
+        per_tick: float = float(np.median(update_ms)) + float(np.median(forecast_ms))
+        print(f"{n:>7} {np.median(update_ms):>10.3f} {np.median(forecast_ms):>12.3f} "
+              f"{per_tick * 1000.0 / n:>12.4f} {np.median(handler_ms):>12.3f}ms")
+    engine.reset_pipeline_state()
+    loop.close()
+
+    # Backtest on the simulator's own model (diurnal factor + drift + noise + spikes)
+    n = args.backtest_wards
+    engine.WARDS = engine.build_ward_grid(n)
+    base = np.array([w["base_aqi"] for w in engine.WARDS], dtype=np.int64)
+    prone: np.ndarray = np.array([w["type"] in ("industrial", "traffic") for w in engine.WARDS])
+    steps: int = int(args.days * 86400 / args.step)
+    model = ForecastModel(n, engine.FORECAST_HORIZONS)
+    readings: List[np.ndarray] = []
+    forecasts: List[np.ndarray] = []
+    for t in range(steps):
+        hour: int = int(t * args.step // 3600) % 24
+        aqi = generate_aqi_batch(base, prone, t, engine.time_of_day_factor(hour), rng)["aqi"]
+        model.update(aqi, t * args.step, hour)
+        readings.append(aqi.astype(np.float64))
+        forecasts.append(model.forecast()["aqi"])
+    scored_from: int = int(86400 / args.step)   # the first day trains the diurnal profile
+    print(f"\nbacktest: {n} wards, {args.days:g} days at {args.step:g}s steps, scored after day 1 (MAE, AQI)")
+    print(f"{'horizon':>8} {'model':>8} {'persistence':>12}")
+    for h, name in enumerate(engine.FORECAST_HORIZONS):
+        ahead: int = int(engine.FORECAST_HORIZONS[name] / args.step)
+        model_err: List[float] = []
+        naive_err: List[float] = []
+        for t in range(scored_from, steps - ahead):
+            actual: np.ndarray = readings[t + ahead]
+            model_err.append(float(np.abs(forecasts[t][:, h] - actual).mean()))
+            naive_err.append(float(np.abs(readings[t] - actual).mean()))
+        print(f"{name:>8} {np.mean(model_err):>8.2f} {np.mean(naive_err):>12.2f}")
+
+
+# ─────────────────────────────────────────────
+#  subindex: CPCB averaging windows + sub-indices per tick, against a per-reading loop
+# ─────────────────────────────────────────────
+SUBINDEX_POLLUTANTS: tuple[str, ...] = ("pm25", "pm10", "no2", "co")
+
+
+def _concentrations(rng: np.random.Generator, n: int, missing: float) -> Dict[str, np.ndarray]:
+    # Roughly the simulator's levels; `missing` of the values are not reported
+    scale: Dict[str, float] = {"pm25": 90.0, "pm10": 150.0, "no2": 45.0, "co": 2.0}
+    return {
+        p: np.where(rng.random(n) < missing, np.nan, rng.gamma(4.0, scale[p] / 4.0, n))
+        for p in SUBINDEX_POLLUTANTS
+    }
+
+
+def _reference_aqi(
+    batches: List[tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]],
+    n: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Per-reading loop: hourly buckets in dicts, scalar breakpoint lookup."""
+    buckets: List[Dict[str, Dict[int, List[float]]]] = [{p: {} for p in SUBINDEX_POLLUTANTS} for _ in range(n)]
+    now: int = -1
+    for idx, times, columns in batches:
+        now = max(now, int(np.floor(times.max() / 3600.0)))
+        for i, t, *values in zip(idx.tolist(), times.tolist(), *(columns[p].tolist() for p in SUBINDEX_POLLUTANTS)):
+            hour: int = int(t // 3600.0)
+            if hour <= now - 24:
+                continue
+            for p, v in zip(SUBINDEX_POLLUTANTS, values):
+                if v == v and v >= 0:
+                    acc: List[float] = buckets[i][p].setdefault(hour, [0.0, 0])
+                    acc[0] += v
+                    acc[1] += 1
+    aqi: np.ndarray = np.full(n, -1, dtype=np.int64)
+    dominant: np.ndarray = np.full(n, -1, dtype=np.int64)
+    for i in range(n):
+        best: tuple[float, int] = (-1.0, -1)
+        valid: int = 0
+        for j, p in enumerate(SUBINDEX_POLLUTANTS):
+            means: List[float] = [s / c for h, (s, c) in buckets[i][p].items() if h > now - AVERAGING_HOURS[p]]
+            if not means:
+                continue
+            valid += 1
+            c: float = sum(means) / len(means)
+            conc: tuple[float, ...] = CONCENTRATION_BREAKPOINTS[p]
+            band: int = min(bisect.bisect_left(conc, c, 1) - 1, len(conc) - 2)
+            index: float = INDEX_BREAKPOINTS[band] + (c - conc[band]) * (
+                (INDEX_BREAKPOINTS[band + 1] - INDEX_BREAKPOINTS[band]) / (conc[band + 1] - conc[band])
+            )
+            best = max(best, (min(index, INDEX_BREAKPOINTS[-1]), -j))
+        if valid >= 3 and (buckets[i]["pm25"] or buckets[i]["pm10"]):
+            aqi[i] = round(best[0])
+            dominant[i] = -best[1]
+    return aqi, dominant
+
+
+def bench_subindex(args: argparse.Namespace) -> None:
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    start: float = 1_700_000_000.0
+    print(f"{'wards':>7} {'add ms':>8} {'state ms':>9} {'rollover ms':>12} {'µs/reading':>11}")
+    for n in args.wards:
+        model: SubIndexEngine = SubIndexEngine(n, SUBINDEX_POLLUTANTS)
+        idx: np.ndarray = np.arange(n, dtype=np.int64)
+        add_ms: List[float] = []
+        state_ms: List[float] = []
+        rollover_ms: List[float] = []
+        for t in range(args.ticks):
+            times: np.ndarray = start + t * args.step + rng.uniform(-args.step, 0.0, n)
+            columns: Dict[str, np.ndarray] = _concentrations(rng, n, args.missing)
+            hour: Any = model.hour
+            ms: float = _timed(lambda: model.add(idx, times, columns))
+            (add_ms if hour == model.hour else rollover_ms).append(ms)
+            state_ms.append(_timed(model.state))
+        add: float = float(np.median(add_ms))
+        print(f"{n:>7} {add:>8.2f} {np.median(state_ms):>9.2f} "
+              f"{np.median(rollover_ms) if rollover_ms else 0.0:>12.2f} {add * 1000.0 / n:>11.3f}")
+
+    # Same readings through a per-reading Python loop; AQI and dominant pollutant must match
+    n = args.check_wards
+    model = SubIndexEngine(n, SUBINDEX_POLLUTANTS)
+    batches: List[tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]] = []
+    for t in range(args.ticks):
+        m: int = n * 3
+        batches.append((
+            rng.integers(0, n, m),
+            start + t * args.step + rng.uniform(-3 * args.step, 0.0, m),   # out of order, some late
+            _concentrations(rng, m, args.missing),
+        ))
+    vector_ms: float = sum(_timed(lambda b=b: model.add(*b)) for b in batches) + _timed(model.state)
+    state: Dict[str, np.ndarray] = model.state()
+    started: float = time.perf_counter()
+    aqi, dominant = _reference_aqi(batches, n)
+    loop_ms: float = (time.perf_counter() - started) * 1000.0
+    equal: bool = bool((aqi == state["aqi"]).all() and (dominant == state["dominant"]).all())
+    print(f"\ncheck: {n} wards, {n * 3 * args.ticks} readings: vectorized {vector_ms:.1f} ms, "
+          f"per-reading loop {loop_ms:.1f} ms, equal={equal}")
+
+
+# ─────────────────────────────────────────────
+#  shards: tick cost vs. worker processes, and what stays in the front process
+# ─────────────────────────────────────────────
+def _row_signature(rows: List[Dict[str, Any]]) -> List[tuple[Any, ...]]:
+    return sorted(
+        (r["ward_id"], r["aqi"], r["rolling_avg"], r["spike"], (r["alert"] or {}).get("severity"), json.dumps(r["windows"]))
+        for r in rows
+    )
+
+
+def bench_shards(args: argparse.Namespace) -> None:
+    print(f"cpus available: {len(os.sched_getaffinity(0))}")
+    print(f"{'wards':>8} {'workers':>8} {'tick':>11} {'front cpu':>11} {'speedup':>8}  equal")
+    for count in args.wards:
+        wards: List[Dict[str, Any]] = engine.build_ward_grid(count)
+        engine.WARDS = wards
+        rng: np.random.Generator = np.random.default_rng(args.seed)
+        base: np.ndarray = np.array([int(w["base_aqi"]) for w in wards], dtype=np.int64)
+        prone: np.ndarray = np.array([w["type"] in ("industrial", "traffic") for w in wards])
+        batches: List[Dict[str, Any]] = [generate_aqi_batch(base, prone, t, 1.0, rng) for t in range(args.ticks)]
+        for batch in batches:
+            batch["rag_band"] = engine.rag_index["band_array"][np.clip(batch["aqi"], 0, engine.RAG_MAX_AQI)]
+
+        # Single process: what the columnar front process does per tick
+        engine.reset_pipeline_state()
+        col = engine.new_columnar_engine(wards)
+        single_ms: List[float] = []
+        rows: List[Dict[str, Any]] = []
+        prev: Dict[str, Dict[str, Any]] = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch in batches:
+                start: float = time.perf_counter()
+                rows, _ = engine.process_columnar_tick(col, wards, batch)
+                by_id: Dict[str, Dict[str, Any]] = {r["ward_id"]: r for r in rows}
+                json.dumps(rows)
+                json.dumps(ward_patches(prev, by_id))
+                prev = by_id
+                single_ms.append((time.perf_counter() - start) * 1000.0)
+        reference: List[tuple[Any, ...]] = _row_signature(rows)
+        single: float = float(np.median(single_ms[1:] or single_ms))
+        print(f"{count:>8} {'-':>8} {single:>9.1f}ms {single:>9.1f}ms {1.0:>7.2f}x  (single process)")
+
+        for workers in args.workers:
+            pool = engine.new_shard_pool(wards, workers)
+            try:
+                tick_ms: List[float] = []
+                cpu_ms: List[float] = []
+                out: Dict[str, Any] = {}
+                for t, batch in enumerate(batches):
+                    wall: float = time.perf_counter()
+                    cpu: float = time.thread_time()
+                    out = pool.step(batch, t, "2026-01-01T00:00:00+00:00")
+                    cpu_ms.append((time.thread_time() - cpu) * 1000.0)
+                    tick_ms.append((time.perf_counter() - wall) * 1000.0)
+                sharded_rows: List[Dict[str, Any]] = json.loads(b"[" + out["encoded_wards"]["rows"] + b"]")
+                equal: bool = _row_signature(sharded_rows) == reference
+            finally:
+                pool.close()
+            tick: float = float(np.median(tick_ms[1:] or tick_ms))
+            front: float = float(np.median(cpu_ms[1:] or cpu_ms))
+            print(f"{count:>8} {workers:>8} {tick:>9.1f}ms {front:>9.1f}ms {single / tick:>7.2f}x  {equal}")
+
+
+# ─────────────────────────────────────────────
+#  replay: the full pipeline over a recording, no sleeps, fixed seed
+# ─────────────────────────────────────────────
+def _write_recording(
+    path: str, wards: List[Dict[str, Any]], ticks: int, spike_rate: float, seed: int, coverage: float = 1.0,
+) -> None:
+    """
+    Synthetic recording from the batch simulator on a virtual clock (same seed
+    -> same file); each ward reports in a window with probability `coverage`.
+    """
+    clock: ReplayClock = ReplayClock()
+    engine.clock = clock
+    engine.WARDS = wards
+    generate = engine.simulated_batch_readings(np.random.default_rng(seed), spike_rate)
+    silent: np.random.Generator = np.random.default_rng(seed + 1)
+    with open(path, "w", encoding="utf-8") as fh:
+        for t in range(ticks):
+            rows: List[Reading] = generate(t)
+            if coverage < 1.0:
+                rows = [r for r, keep in zip(rows, (silent.random(len(rows)) < coverage).tolist()) if keep]
+            clock.advance(engine.TICK_INTERVAL_S)
+            write_window(fh, t, clock.iso(), rows)
+
+
+@contextlib.contextmanager
+def _sse_clients(count: int) -> Iterator[Dict[str, int]]:
+    """`count` subscribers draining the full stream on their own event loop thread."""
+    hub: FanoutHub = engine.stream_hub
+    stats: Dict[str, int] = {"frames": 0, "dropped": hub.dropped}
+    if not count:
+        yield stats
+        return
+    loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+    thread: threading.Thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    tasks: List[asyncio.Task[None]] = []
+
+    async def consume(sub: Any) -> None:
+        while await sub.next_frame() is not None:
+            stats["frames"] += 1
+
+    async def subscribe() -> None:
+        tasks.extend(loop.create_task(consume(hub.subscribe())) for _ in range(count))
+
+    asyncio.run_coroutine_threadsafe(subscribe(), loop).result()
+    try:
+        yield stats
+    finally:
+        deadline: float = time.monotonic() + 10.0
+        while hub.delivered_id < hub.last_id and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+        async def stop() -> None:
+            for sub in list(hub.subscribers):
+                hub.unsubscribe(sub)
+            # Consumers and the hub's heartbeat task
+            pending: List[asyncio.Task[Any]] = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        stats["dropped"] = hub.dropped - stats["dropped"]
+
+
+def _replay_run(
+    path: str, wards: List[Dict[str, Any]], mode: str, clients: int, shards: int, runtime: str = "thread",
+) -> Dict[str, Any]:
+    engine.WARDS = wards
+    engine.SHARD_COUNT = shards
+    engine.history_store = None
+    engine.reset_pipeline_state()
+    clock: ReplayClock = ReplayClock()
+    replay: Replay = Replay(path, clock, engine.TICK_INTERVAL_S)
+    engine.clock, engine.replay = clock, replay
+    pipeline: Callable[[], None] = {
+        "ward":     engine.pathway_pipeline,
+        "columnar": engine.columnar_pipeline,
+        "sharded":  engine.sharded_pipeline,
+    }[mode]
+    try:
+        with _sse_clients(clients) as sse, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            if runtime == "async":
+                # Same steps as a task on an event loop, tick compute on a worker thread
+                executor = engine.new_tick_executor()
+                asyncio.run(engine.async_pipeline(mode, executor))
+                if executor is not None:
+                    executor.shutdown()
+            else:
+                pipeline()
+        workers_rss: int = sum(
+            process_rss_bytes(p.pid) or 0 for p in (engine.shard_pool.procs if engine.shard_pool else [])
+        )
+    finally:
+        engine.reset_pipeline_state()
+        engine.replay = None
+    return {**replay.stats(), "tick_s": replay.tick_seconds, "rss": replay.peak_rss + workers_rss, **sse}
+
+
+def bench_replay(args: argparse.Namespace) -> None:
+    print(f"{'wards':>7} {'clients':>7} {'spikes%':>7} {'mode':>8} {'runtime':>7} {'ticks/s':>9} {'p50':>9} {'p99':>9} "
+          f"{'rss MiB':>8} {'spikes':>7} {'plumes':>7} {'alerts':>7} {'digest':>12}  same")
+    configs: List[tuple[int, float]] = (
+        [(args.wards[0], float("nan"))] if args.recording
+        else [(w, rate) for w in args.wards for rate in args.spike_rate]
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for count, rate in configs:
+            wards: List[Dict[str, Any]] = engine.build_ward_grid(count)
+            path: str = args.recording or os.path.join(tmp, f"replay-{count}-{rate}.jsonl")
+            if not args.recording:
+                _write_recording(path, wards, args.ticks, rate, args.seed, args.coverage)
+            reference: str = ""
+            for clients in args.clients:
+                for mode, runtime, _ in itertools.product(args.modes, args.runtimes, range(args.repeat)):
+                    r: Dict[str, Any] = _replay_run(path, wards, mode, clients, args.shards, runtime)
+                    reference = reference or r["digest"]
+                    ms: np.ndarray = np.array(r["tick_s"]) * 1000.0
+                    print(
+                        f"{count:>7} {clients:>7} {rate * 100.0:>6.1f}% {mode:>8} {runtime:>7} "
+                        f"{r['ticks'] / r['wall_s']:>9.1f} {np.percentile(ms, 50):>7.2f}ms "
+                        f"{np.percentile(ms, 99):>7.2f}ms {r['rss'] / 2**20:>8.1f} {r['spikes']:>7} "
+                        f"{r['regional']:>7} {r['alerts']:>7} {r['digest'][:12]:>12}  {r['digest'] == reference}"
+                        + (f"  ({r['dropped']} clients dropped)" if r["dropped"] else "")
+                    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pathway engine benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p_col = sub.add_parser("columnar", help="ms/tick: per-ward loop vs. columnar engine")
+    p_col.add_argument("--wards", type=int, nargs="+", default=[8, 1000, 5000, 20000, 50000])
+    p_col.add_argument("--ticks", type=int, default=30)
+    p_col.add_argument("--seed", type=int, default=7)
+    p_col.add_argument("--max-ward-path", type=int, default=20000,
+                       help="skip the (slow) per-ward reference above this ward count")
+    p_col.set_defaults(func=bench_columnar)
+
+    p_fan = sub.add_parser("fanout", help="SSE hub delivery latency and skew across clients")
+    p_fan.add_argument("--clients", type=int, nargs="+", default=[100, 1000, 10000])
+    p_fan.add_argument("--wards", type=int, default=8)
+    p_fan.add_argument("--ticks", type=int, default=20)
+    p_fan.add_argument("--interval", type=float, default=0.05, help="seconds between published ticks")
+    p_fan.set_defaults(func=bench_fanout)
+
+    p_top = sub.add_parser("topics", help="filtered /stream subscriptions: publish cost and bytes vs. full broadcast")
+    p_top.add_argument("--clients", type=int, nargs="+", default=[1000, 10000])
+    p_top.add_argument("--distinct", type=int, nargs="+", default=[10, 100, 1000],
+                       help="distinct filters the clients are spread over")
+    p_top.add_argument("--topics", nargs="+", default=["alerts", "summary", "wards"])
+    p_top.add_argument("--wards", type=int, default=5000)
+    p_top.add_argument("--ticks", type=int, default=10)
+    p_top.add_argument("--interval", type=float, default=0.2, help="seconds between published ticks")
+    p_top.set_defaults(func=bench_topics)
+
+    p_pub = sub.add_parser("pubsub", help="tick socket: engine send cost and delivery latency to worker processes")
+    p_pub.add_argument("--wards", type=int, nargs="+", default=[1000, 5000])
+    p_pub.add_argument("--subscribers", type=int, nargs="+", default=[1, 4, 8])
+    p_pub.add_argument("--ticks", type=int, default=20)
+    p_pub.add_argument("--interval", type=float, default=0.2, help="seconds between published ticks")
+    p_pub.add_argument("--parse", action="store_true", help="subscribers also json-parse every tick, as workers do")
+    p_pub.set_defaults(func=bench_pubsub)
+
+    p_rag = sub.add_parser("rag", help="document index build time and batched retrieval latency")
+    p_rag.add_argument("--docs", type=int, nargs="+", default=[1000, 5000])
+    p_rag.add_argument("--wards", type=int, nargs="+", default=[8, 1000, 10000, 50000])
+    p_rag.add_argument("--ticks", type=int, default=10)
+    p_rag.add_argument("--k", type=int, default=3)
+    p_rag.add_argument("--seed", type=int, default=7)
+    p_rag.set_defaults(func=bench_rag)
+
+    p_ing = sub.add_parser("ingest", help="connector -> queue readings/s and window collapse cost")
+    p_ing.add_argument("--readings", type=int, default=1_000_000)
+    p_ing.add_argument("--wards", type=int, default=50_000)
+    p_ing.add_argument("--queue", type=int, default=200_000, help="ingest queue capacity")
+    p_ing.add_argument("--http-batch", type=int, default=10_000, help="readings per POST body")
+    p_ing.add_argument("--window", type=int, default=500_000, help="readings collapsed by window_batch")
+    p_ing.add_argument("--seed", type=int, default=7)
+    p_ing.set_defaults(func=bench_ingest)
+
+    p_evt = sub.add_parser("eventtime", help="event-time windows: us/event vs. window length under disorder")
+    p_evt.add_argument("--events", type=int, default=1_000_000)
+    p_evt.add_argument("--wards", type=int, default=5000)
+    p_evt.add_argument("--rate", type=float, default=1000.0, help="events per second of event time")
+    p_evt.add_argument("--disorder", type=float, default=30.0, help="max seconds a reading arrives late")
+    p_evt.add_argument("--batch", type=int, default=5000, help="readings per add() call")
+    p_evt.add_argument("--sizes", type=float, nargs="+", default=[60.0, 300.0, 3600.0])
+    p_evt.add_argument("--slide", type=float, default=60.0)
+    p_evt.add_argument("--lateness", type=float, default=120.0)
+    p_evt.add_argument("--delay", type=float, default=10.0, help="watermark delay, s")
+    p_evt.add_argument("--seed", type=int, default=7)
+    p_evt.set_defaults(func=bench_eventtime)
+
+    p_his = sub.add_parser("history", help="history store write throughput and range-query latency")
+    p_his.add_argument("--wards", type=int, default=50_000)
+    p_his.add_argument("--ticks", type=int, default=100)
+    p_his.add_argument("--interval", type=float, default=5.0, help="event-time seconds between ticks")
+    p_his.add_argument("--seed", type=int, default=7)
+    p_his.set_defaults(func=bench_history)
+
+    p_shd = sub.add_parser("shards", help="sharded mode: tick wall time and front-process CPU vs. workers")
+    p_shd.add_argument("--wards", type=int, nargs="+", default=[10_000, 50_000])
+    p_shd.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    p_shd.add_argument("--ticks", type=int, default=8)
+    p_shd.add_argument("--seed", type=int, default=7)
+    p_shd.set_defaults(func=bench_shards)
+
+    p_nby = sub.add_parser("nearby", help="spatial index: build time, /nearby latency, neighbourhood tick cost")
+    p_nby.add_argument("--wards", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    p_nby.add_argument("--radius", type=float, nargs="+", default=[500.0, 2000.0, 5000.0], help="metres")
+    p_nby.add_argument("--queries", type=int, default=500)
+    p_nby.add_argument("--limit", type=int, default=50, help="wards listed per /nearby response")
+    p_nby.add_argument("--ticks", type=int, default=20)
+    p_nby.add_argument("--seed", type=int, default=7)
+    p_nby.set_defaults(func=bench_nearby)
+
+    p_fct = sub.add_parser("forecast", help="online forecaster: update cost per 1k wards, /forecast latency, backtest MAE")
+    p_fct.add_argument("--wards", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    p_fct.add_argument("--ticks", type=int, default=50)
+    p_fct.add_argument("--queries", type=int, default=500)
+    p_fct.add_argument("--backtest-wards", type=int, default=1000)
+    p_fct.add_argument("--days", type=float, default=3.0, help="simulated days in the backtest")
+    p_fct.add_argument("--step", type=float, default=60.0, help="seconds between backtest readings")
+    p_fct.add_argument("--seed", type=int, default=7)
+    p_fct.set_defaults(func=bench_forecast)
+
+    p_sub = sub.add_parser("subindex", help="CPCB sub-index AQI: window update / sub-index cost per tick vs. ward count")
+    p_sub.add_argument("--wards", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    p_sub.add_argument("--ticks", type=int, default=40)
+    p_sub.add_argument("--step", type=float, default=600.0, help="event-time seconds between ticks (600: a rollover every 6)")
+    p_sub.add_argument("--missing", type=float, default=0.1, help="share of pollutant values not reported")
+    p_sub.add_argument("--check-wards", type=int, default=500)
+    p_sub.add_argument("--seed", type=int, default=7)
+    p_sub.set_defaults(func=bench_subindex)
+
+    p_rep = sub.add_parser("replay", help="full pipeline replay: ticks/s, tick latency, memory, result digest")
+    p_rep.add_argument("--wards", type=int, nargs="+", default=[100, 5000])
+    p_rep.add_argument("--clients", type=int, nargs="+", default=[0, 100], help="SSE subscribers on /stream")
+    p_rep.add_argument("--spike-rate", type=float, nargs="+", default=[0.05], help="spike chance per prone ward")
+    p_rep.add_argument("--modes", nargs="+", default=["ward", "columnar"], choices=["ward", "columnar", "sharded"])
+    p_rep.add_argument("--runtimes", nargs="+", default=["thread"], choices=["thread", "async"])
+    p_rep.add_argument("--ticks", type=int, default=60)
+    p_rep.add_argument("--coverage", type=float, default=1.0, help="chance a ward reports in a given window")
+    p_rep.add_argument("--repeat", type=int, default=1, help="runs per mode (digests must match)")
+    p_rep.add_argument("--shards", type=int, default=2)
+    p_rep.add_argument("--recording", default="", help="replay this recording (with --wards N matching it)")
+    p_rep.add_argument("--seed", type=int, default=7)
+    p_rep.set_defaults(func=bench_replay)
+
+    args = parser.parse_args()
+    engine.log.setLevel(logging.WARNING)   # per-tick / per-spike lines would swamp the tables
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+=============================================================================
+  CITY AIR WATCH — NON-BLOCKING CONSOLE LOG
+=============================================================================
+  BufferedConsole: a logging handler whose emit() only enqueues the record.
+  A writer thread formats everything that has accumulated and writes it in
+  one call, so the pipeline never waits on console I/O. The queue is
+  bounded: when the console cannot keep up, new lines are dropped and
+  counted instead of stalling a tick. flush() / close() wait (briefly) for
+  the queue to drain but leave the writer running: logging.dictConfig()
+  (uvicorn's log setup) closes every existing handler, and at exit
+  logging.shutdown() flushes them.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import sys
+import threading
+from typing import List, Optional, TextIO
+
+
+class BufferedConsole(logging.Handler):
+    """Queue-backed handler; a daemon thread writes the queued lines in batches."""
+
+    def __init__(self, stream: Optional[TextIO] = None, capacity: int = 10_000, batch: int = 1000) -> None:
+        super().__init__()
+        self.stream: Optional[TextIO] = stream    # None: sys.stdout at write time
+        self.batch: int = batch
+        self.queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=capacity)
+        self.written: int = 0
+        self.dropped: int = 0
+        self._thread: threading.Thread = threading.Thread(target=self._run, name="console-log", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            records: List[logging.LogRecord] = [self.queue.get()]
+            while len(records) < self.batch:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines: List[str] = []
+            for record in records:
+                try:
+                    lines.append(self.format(record))
+                except (TypeError, ValueError, KeyError):   # bad format args must not kill the writer
+                    self.handleError(record)
+            if lines:
+                stream: TextIO = self.stream or sys.stdout
+                try:
+                    stream.write("\n".join(lines) + "\n")
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+                self.written += len(lines)
+            for _ in records:
+                self.queue.task_done()
+
+    def flush(self, timeout: float = 1.0) -> None:
+        """Wait up to `timeout` seconds for the queued lines to be written."""
+        with self.queue.all_tasks_done:
+            self.queue.all_tasks_done.wait_for(lambda: not self.queue.unfinished_tasks, timeout)
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+
+def console_logger(name: str, level: str = "INFO") -> logging.Logger:
+    """Logger writing bare messages through a BufferedConsole."""
+    logger: logging.Logger = logging.getLogger(name)
+    if console_handler(logger) is None:
+        handler: BufferedConsole = BufferedConsole()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def console_handler(logger: logging.Logger) -> Optional[BufferedConsole]:
+    return next((h for h in logger.handlers if isinstance(h, BufferedConsole)), None)
@@ -0,0 +1,172 @@
+"""
+=============================================================================
+  CITY AIR WATCH — DELTA STREAM ENCODING  (/stream?mode=delta)
+=============================================================================
+  Protocol:
+    1. On connect the client receives one full state:
+         {"event": "snapshot", "seq": N, "tick", "timestamp",
+          "city_summary", "wards": [...], "active_alerts": [...],
+          "rag_bands", "pipeline"}
+    2. Every tick after that it receives only what changed:
+         {"event": "aqi_delta", "seq": N+1, "tick", "timestamp",
+          "wards":        {ward_id: {changed fields}},
+          "alerts":       {"raised": [new/changed alerts], "cleared": [ward_ids]},
+                          (from the tick's alert_transitions: every transition
+                          but a resolve is "raised", a resolve is "cleared")
+          "city_summary": {changed keys},      (omitted when unchanged)
+          "stats":        {changed keys},      (omitted when unchanged)
+          "rag_bands":    {version, contexts},  (only after a Document Store reload)
+          "window_results": [...],             (event-time window emissions, as sent)
+          "spike_corroboration": [...]}        (regional / local verdict per spike, as sent)
+       Patches deep-merge into the client's copy: nested objects (e.g.
+       "windows", "rag_context") carry only their changed keys, any other
+       value replaces the old one. Rows never drop keys, so a patch never
+       needs to express removal. "timestamp" and "_tick" of every ward row
+       are implied by the delta header.
+    3. A client that sees seq != last_seq + 1 has missed a frame and must
+       reconnect to get a fresh snapshot.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Optional
+
+from fanout import splice_json
+
+# Per-ward fields that change every tick and are carried by the delta header
+IMPLIED_WARD_FIELDS: tuple[str, ...] = ("timestamp", "_tick")
+_MISSING: object = object()
+
+
+def _changed(prev: Optional[Dict[str, Any]], cur: Dict[str, Any], skip: tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Keys of `cur` that differ from `prev`, recursing into nested dicts."""
+    if prev is None:
+        return {k: v for k, v in cur.items() if k not in skip}
+    patch: Dict[str, Any] = {}
+    for k, v in cur.items():
+        if k in skip:
+            continue
+        old: Any = prev.get(k, _MISSING)
+        if old is v or old == v:
+            continue
+        if isinstance(v, dict) and isinstance(old, dict):
+            patch[k] = _changed(old, v)
+        else:
+            patch[k] = v
+    return patch
+
+
+def ward_patches(prev_wards: Mapping[str, Dict[str, Any]], wards: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Changed fields per ward row since the previous rows (rows unchanged are left out)."""
+    patches: Dict[str, Dict[str, Any]] = {}
+    for ward_id, row in wards.items():
+        before: Optional[Dict[str, Any]] = prev_wards.get(ward_id)
+        if before is row:
+            continue
+        patch: Dict[str, Any] = _changed(before, row, IMPLIED_WARD_FIELDS)
+        if patch:
+            patches[ward_id] = patch
+    return patches
+
+
+class DeltaEncoder:
+    """
+    Diffs consecutive aqi_update events. Each encode() returns the delta event
+    plus an immutable state record (the full view as of that seq) that is
+    used to build snapshots for newly connected delta clients.
+    """
+
+    def __init__(self) -> None:
+        self.seq: int = 0
+        self.state: Optional[Dict[str, Any]] = None
+
+    def encode(
+        self,
+        event: Dict[str, Any],
+        encoded_wards: Optional[Dict[str, bytes]] = None,
+    ) -> tuple[Dict[str, Any] | bytes, Dict[str, Any]]:
+        """
+        encoded_wards: ward rows and patches already JSON-encoded by the shard
+        workers ({"rows", "patches"}, see shards.py); the delta is then
+        returned as encoded bytes and the state keeps the encoded rows.
+        """
+        prev: Optional[Dict[str, Any]] = self.state
+        wards: Optional[Dict[str, Dict[str, Any]]] = None
+        if encoded_wards is None:
+            wards = {str(w["ward_id"]): w for w in event["wards"]}
+        transitions: List[Dict[str, Any]] = event.get("alert_transitions") or []
+        stats: Dict[str, Any] = event["pipeline"]["stats"]
+        self.seq += 1
+
+        alerts: Dict[str, Dict[str, Any]] = prev["alerts"] if prev else {}
+        patches: Dict[str, Dict[str, Any]] = {}
+        if wards is not None:
+            patches = ward_patches((prev["wards"] if prev else None) or {}, wards)
+        raised: List[Dict[str, Any]] = []
+        cleared: List[str] = []
+        if transitions:
+            alerts = dict(alerts)   # the previous state record stays as it was
+            for t in transitions:
+                if t["transition"] == "resolve":
+                    alerts.pop(str(t["ward_id"]), None)
+                    cleared.append(str(t["ward_id"]))
+                else:
+                    alerts[str(t["ward_id"])] = t["alert"]
+                    raised.append(t["alert"])
+
+        delta: Dict[str, Any] = {
+            "event":     "aqi_delta",
+            "seq":       self.seq,
+            "tick":      event["tick"],
+            "timestamp": event["timestamp"],
+            "wards":     patches,
+            "alerts":    {"raised": raised, "cleared": cleared},
+        }
+        summary_patch: Dict[str, Any] = _changed(prev["city_summary"] if prev else None, event["city_summary"])
+        if summary_patch:
+            delta["city_summary"] = summary_patch
+        stats_patch: Dict[str, Any] = _changed(prev["stats"] if prev else None, stats)
+        if stats_patch:
+            delta["stats"] = stats_patch
+        rag_bands: Any = event.get("rag_bands")
+        if rag_bands is not None and (prev is None or prev["rag_bands"] != rag_bands):
+            delta["rag_bands"] = rag_bands
+        if event.get("window_results"):
+            delta["window_results"] = event["window_results"]
+        if event.get("spike_corroboration"):
+            delta["spike_corroboration"] = event["spike_corroboration"]
+
+        self.state = {
+            "seq":          self.seq,
+            "tick":         event["tick"],
+            "timestamp":    event["timestamp"],
+            "wards":        wards,
+            "alerts":       alerts,
+            "city_summary": event["city_summary"],
+            "stats":        stats,
+            "rag_bands":    rag_bands,
+            "wards_json":   encoded_wards["rows"] if encoded_wards is not None else None,
+        }
+        if encoded_wards is not None:
+            return splice_json(delta, "wards", encoded_wards["patches"], b"{}"), self.state
+        return delta, self.state
+
+
+def snapshot_event(state: Dict[str, Any]) -> Dict[str, Any] | bytes:
+    """Full-state event a delta client starts from (encoded bytes for pre-encoded rows)."""
+    event: Dict[str, Any] = {
+        "event":         "snapshot",
+        "seq":           state["seq"],
+        "tick":          state["tick"],
+        "timestamp":     state["timestamp"],
+        "city_summary":  state["city_summary"],
+        "wards":         [],
+        "active_alerts": list(state["alerts"].values()),
+        "rag_bands":     state["rag_bands"],
+        "pipeline":      {"stats": state["stats"]},
+    }
+    if state["wards"] is None:
+        return splice_json(event, "wards", state["wards_json"])
+    event["wards"] = list(state["wards"].values())
+    return event
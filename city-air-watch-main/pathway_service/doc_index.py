@@ -0,0 +1,268 @@
+"""
+=============================================================================
+  CITY AIR WATCH — LOCAL VECTOR DOCUMENT INDEX
+=============================================================================
+  Offline retrieval over advisory documents (WHO, CPCB, GRAP orders,
+  municipal circulars) for the RAG layer. No network, no model files:
+
+    1. Documents are split into overlapping word-window chunks.
+    2. Chunks are embedded as hashed TF-IDF vectors (crc32 feature hashing
+       into `dims` features, sublinear tf, smoothed idf, L2-normalised) and
+       stored as one float32 NumPy matrix laid out (dims x chunks), so a
+       query only reads the rows of the few terms it actually contains.
+    3. Ward pollutant profiles (aqi, pm25, pm10, no2, co, ward type) are
+       turned into weighted concept-term queries. Profiles are quantised,
+       so wards with the same profile share one query row, and all rows
+       are scored with a single matrix product per block -> top-k chunks.
+
+  An index is immutable once built; reloading builds a new one and swaps
+  the reference.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+TOKEN_RE: re.Pattern[str] = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+# Concept terms a pollutant profile expands into
+LEVEL_TERMS: Dict[str, List[str]] = {
+    "Good":         ["good", "satisfactory", "no", "risk"],
+    "Satisfactory": ["satisfactory", "minor", "sensitive"],
+    "Moderate":     ["moderate", "sensitive", "children", "older", "lung", "heart"],
+    "Poor":         ["poor", "breathing", "discomfort", "construction", "ban"],
+    "Very Poor":    ["very", "poor", "respiratory", "illness", "industries", "grap"],
+    "Severe":       ["severe", "emergency", "health", "advisory", "grap", "halt", "schools"],
+}
+POLLUTANT_TERMS: Dict[str, List[str]] = {
+    "pm25": ["pm2.5", "fine", "particulate", "mask", "n95"],
+    "pm10": ["pm10", "particulate", "dust", "construction"],
+    "no2":  ["no2", "nitrogen", "dioxide", "vehicle", "traffic"],
+    "co":   ["co", "carbon", "monoxide", "combustion"],
+}
+# Reference concentrations the profile is scaled by (CPCB NAAQS: 24h PM/NO2, 8h CO mg/m3)
+POLLUTANT_LIMITS: Dict[str, float] = {"pm25": 60.0, "pm10": 100.0, "no2": 80.0, "co": 2.0}
+POLLUTANTS: tuple[str, ...] = ("pm25", "pm10", "no2", "co")
+AQI_LEVELS: tuple[str, ...] = ("Good", "Satisfactory", "Moderate", "Poor", "Very Poor", "Severe")
+AQI_LEVEL_EDGES: tuple[int, ...] = (50, 100, 200, 300, 400)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def chunk_text(text: str, chunk_words: int = 80, overlap: int = 20) -> List[str]:
+    """Overlapping word windows; short texts stay a single chunk."""
+    words: List[str] = text.split()
+    if len(words) <= chunk_words:
+        return [" ".join(words)] if words else []
+    step: int = max(1, chunk_words - overlap)
+    return [
+        " ".join(words[start:start + chunk_words])
+        for start in range(0, len(words) - overlap, step)
+    ]
+
+
+class DocumentIndex:
+    """Chunked, hashed TF-IDF index with batched top-k retrieval."""
+
+    def __init__(self, dims: int = 2048, chunk_words: int = 80, overlap: int = 20) -> None:
+        self.dims: int = dims
+        self.chunk_words: int = chunk_words
+        self.overlap: int = overlap
+        self.documents: List[Dict[str, Any]] = []
+        self.chunks: List[Dict[str, Any]] = []
+        self.matrix: np.ndarray = np.zeros((dims, 0), dtype=np.float32)   # (dims x chunks)
+        self.idf: np.ndarray = np.ones(dims, dtype=np.float32)
+        self._term_cols: Dict[str, int] = {}
+
+    # ── building ──────────────────────────────────
+    def _col(self, term: str) -> int:
+        col: Optional[int] = self._term_cols.get(term)
+        if col is None:
+            col = zlib.crc32(term.encode("utf-8")) % self.dims
+            self._term_cols[term] = col
+        return col
+
+    def add_document(self, title: str, text: str, source: str = "") -> None:
+        doc_id: int = len(self.documents)
+        parts: List[str] = chunk_text(text, self.chunk_words, self.overlap)
+        self.documents.append({"id": doc_id, "title": title, "source": source, "chunks": len(parts)})
+        for part in parts:
+            self.chunks.append({"doc_id": doc_id, "title": title, "source": source, "text": part})
+
+    def build(self) -> DocumentIndex:
+        """Embed every chunk into the TF-IDF matrix. Returns self for chaining."""
+        n: int = len(self.chunks)
+        rows: List[int] = []
+        cols: List[int] = []
+        vals: List[float] = []
+        for i, chunk in enumerate(self.chunks):
+            counts: Dict[int, int] = {}
+            for term in tokenize(f"{chunk['title']} {chunk['text']}"):
+                col: int = self._col(term)
+                counts[col] = counts.get(col, 0) + 1
+            for col, count in counts.items():
+                rows.append(i)
+                cols.append(col)
+                vals.append(1.0 + math.log(count))
+
+        matrix: np.ndarray = np.zeros((n, self.dims), dtype=np.float32)
+        if n:
+            matrix[rows, cols] = vals
+            df: np.ndarray = np.bincount(np.array(cols, dtype=np.int64), minlength=self.dims)
+            self.idf = (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+            matrix *= self.idf
+            norms: np.ndarray = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.maximum(norms, 1e-12)
+        self.matrix = np.ascontiguousarray(matrix.T)
+        return self
+
+    # ── querying ──────────────────────────────────
+    def _top_k(self, queries: np.ndarray, k: int, block: int = 1024) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k chunk ids and cosine scores per query row, scored in row blocks."""
+        n_chunks: int = self.matrix.shape[1]
+        k = max(0, min(k, n_chunks))
+        ids: np.ndarray = np.zeros((len(queries), k), dtype=np.int64)
+        scores: np.ndarray = np.zeros((len(queries), k), dtype=np.float32)
+        if k == 0:
+            return ids, scores
+        # Queries are sparse: only the features they use take part in the product
+        used: np.ndarray = np.flatnonzero(queries.any(axis=0))
+        features: np.ndarray = self.matrix[used]
+        for start in range(0, len(queries), block):
+            sim: np.ndarray = queries[start:start + block, used] @ features
+            part: np.ndarray = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+            part_scores: np.ndarray = np.take_along_axis(sim, part, axis=1)
+            order: np.ndarray = np.argsort(-part_scores, axis=1)
+            ids[start:start + block] = np.take_along_axis(part, order, axis=1)
+            scores[start:start + block] = np.take_along_axis(part_scores, order, axis=1)
+        return ids, scores
+
+    def _normalise(self, queries: np.ndarray) -> np.ndarray:
+        queries *= self.idf
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        return queries
+
+    def search(self, text: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Free-text top-k search."""
+        query: np.ndarray = np.zeros((1, self.dims), dtype=np.float32)
+        for term in tokenize(text):
+            query[0, self._col(term)] += 1.0
+        ids, scores = self._top_k(self._normalise(query), k)
+        return [self.passage(int(i), float(sc)) for i, sc in zip(ids[0], scores[0]) if sc > 0.0]
+
+    def search_profiles(
+        self,
+        aqi: np.ndarray,
+        pollutants: Dict[str, np.ndarray],
+        ward_types: Sequence[str],
+        k: int = 3,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Batched retrieval for every ward's pollutant profile. Returns (ids, scores)
+        of shape (wards x k). Identical quantised profiles are scored once.
+        """
+        type_names: List[str] = sorted(set(ward_types))
+        type_pos: Dict[str, int] = {t: i for i, t in enumerate(type_names)}
+        type_code: np.ndarray = np.array([type_pos[t] for t in ward_types], dtype=np.int64)
+        level: np.ndarray = np.searchsorted(np.array(AQI_LEVEL_EDGES), np.asarray(aqi), side="left")
+        # Profile packed into one int64 key: level, type, then pollutant weight steps
+        # (concentration / reference limit in 0.5 steps, capped at 4 -> 0..8)
+        key: np.ndarray = level.astype(np.int64) * len(type_names) + type_code
+        for p in POLLUTANTS:
+            step: np.ndarray = np.clip(np.round(np.asarray(pollutants[p], dtype=np.float64) / POLLUTANT_LIMITS[p] * 2.0), 0, 8)
+            key = key * 9 + step.astype(np.int64)
+        unique, inverse = np.unique(key, return_inverse=True)
+
+        queries: np.ndarray = np.zeros((len(unique), self.dims), dtype=np.float32)
+        for row, packed in enumerate(unique.tolist()):
+            steps: List[int] = []
+            for _p in POLLUTANTS:
+                packed, w = divmod(packed, 9)
+                steps.append(w)
+            lvl, typ = divmod(packed, len(type_names))
+            for term in LEVEL_TERMS[AQI_LEVELS[lvl]]:
+                queries[row, self._col(term)] += 1.0
+            queries[row, self._col(type_names[typ])] += 0.5
+            for p, w in zip(POLLUTANTS, reversed(steps)):
+                if w:
+                    for term in POLLUTANT_TERMS[p]:
+                        queries[row, self._col(term)] += w / 2.0
+        ids, scores = self._top_k(self._normalise(queries), k)
+        inverse = inverse.reshape(-1)
+        return ids[inverse], scores[inverse]
+
+    def passage(self, chunk_id: int, score: float) -> Dict[str, Any]:
+        chunk: Dict[str, Any] = self.chunks[chunk_id]
+        return {
+            "chunk_id": chunk_id,
+            "doc_id":   chunk["doc_id"],
+            "title":    chunk["title"],
+            "source":   chunk["source"],
+            "text":     chunk["text"],
+            "score":    round(score, 4),  # type: ignore[call-overload]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.documents),
+            "chunks":    len(self.chunks),
+            "dims":      self.dims,
+            "bytes":     int(self.matrix.nbytes),
+        }
+
+
+# ─────────────────────────────────────────────
+#  Document sources
+# ─────────────────────────────────────────────
+def store_documents(store: Dict[str, Any]) -> Iterable[tuple[str, str, str]]:
+    """(title, text, source) for every entry of the built-in Document Store."""
+    for level, g in store.get("who_guidelines", {}).items():
+        yield f"WHO guideline: {level.replace('_', ' ')} (AQI {g['range']})", g["desc"], "who_guidelines"
+    for i, rule in enumerate(store.get("govt_rules", [])):
+        yield f"Government rule {i + 1}", rule, "govt_rules"
+    if store.get("heatwave_advisory"):
+        yield "Heatwave advisory", store["heatwave_advisory"], "heatwave_advisory"
+    for key, advice in store.get("elderly_advice", {}).items():
+        yield f"Elderly advice ({key.replace('_', ' ').upper()})", advice, "elderly_advice"
+
+
+def directory_documents(path: str) -> Iterable[tuple[str, str, str]]:
+    """
+    Advisory documents from a directory: .txt/.md files are one document each,
+    .json files hold a list of {"title", "text", "source"} objects.
+    """
+    for root, _dirs, files in os.walk(path):
+        for name in sorted(files):
+            full: str = os.path.join(root, name)
+            ext: str = os.path.splitext(name)[1].lower()
+            if ext in (".txt", ".md"):
+                with open(full, encoding="utf-8") as fh:
+                    yield os.path.splitext(name)[0], fh.read(), os.path.relpath(full, path)
+            elif ext == ".json":
+                with open(full, encoding="utf-8") as fh:
+                    for doc in json.load(fh):
+                        yield str(doc["title"]), str(doc["text"]), str(doc.get("source", name))
+
+
+def build_document_index(
+    store: Dict[str, Any],
+    docs_dir: str = "",
+    dims: int = 2048,
+) -> DocumentIndex:
+    index: DocumentIndex = DocumentIndex(dims=dims)
+    for title, text, source in store_documents(store):
+        index.add_document(title, text, source)
+    if docs_dir:
+        for title, text, source in directory_documents(docs_dir):
+            index.add_document(title, text, source)
+    return index.build()
@@ -0,0 +1,304 @@
+"""
+=============================================================================
+  CITY AIR WATCH — EVENT-TIME WINDOWS
+=============================================================================
+  Windowed aggregates keyed on each reading's own timestamp, for sensors
+  that report late or out of order.
+
+  Time is cut into panes of `slide` seconds. A window of `size` seconds is
+  size / slide consecutive panes (tumbling: size == slide). Readings are
+  added to their pane with one vectorized bincount per pane present in a
+  batch, so the per-reading cost is O(1) amortized whatever the window
+  size, and per-ward aggregates (count / sum / sum of squares / min / max)
+  combine across panes without keeping samples.
+
+  Watermark  = max event time seen - watermark_delay. A window fires
+               (kind "final") once the watermark passes its end.
+  Lateness   : a fired window keeps its panes for `allowed_lateness`
+               seconds of watermark progress. A reading landing in it
+               marks the ward dirty; the next advance() re-emits the
+               window for those wards as kind "update" with a "retract"
+               entry holding the previously emitted values ("late" if
+               the window had never fired). Readings older than that are
+               dropped and counted.
+  Skew       : readings stamped more than max_skew seconds ahead of the
+               processing time passed to add() are dropped and counted, so
+               a bad sensor clock cannot push the watermark into the future.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Largest event time accepted (epoch s): 9999-12-31T23:59:59Z, the end of datetime's range
+MAX_EVENT_TIME_S: float = 253402300799.0
+
+
+def event_times(stamps: Sequence[str]) -> np.ndarray:
+    """
+    Epoch seconds for ISO-8601 timestamps (naive = UTC) or numeric epoch
+    strings; unparseable stamps and times outside 0 .. MAX_EVENT_TIME_S give
+    NaN. Batches usually share a handful of distinct stamps, so each is
+    parsed once.
+    """
+    cache: Dict[str, float] = {}
+    out: np.ndarray = np.empty(len(stamps), dtype=np.float64)
+    for i, stamp in enumerate(stamps):
+        t: Optional[float] = cache.get(stamp)
+        if t is None:
+            try:
+                t = float(stamp)
+            except ValueError:
+                try:
+                    dt: datetime = datetime.fromisoformat(stamp)
+                except ValueError:
+                    t = math.nan
+                else:
+                    if dt.tzinfo is None:
+                        dt = dt.replace(tzinfo=timezone.utc)
+                    t = dt.timestamp()
+            if not 0.0 <= t <= MAX_EVENT_TIME_S:
+                t = math.nan
+            cache[stamp] = t
+        out[i] = t
+    return out
+
+
+def _iso(t: float) -> Optional[str]:
+    if not math.isfinite(t):
+        return None
+    try:
+        return datetime.fromtimestamp(t, timezone.utc).isoformat()
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+class EventTimeWindows:
+    """Tumbling (slide == size) or sliding event-time windows over every key at once."""
+
+    def __init__(
+        self,
+        name: str,
+        keys: Sequence[str],
+        size_s: float,
+        slide_s: Optional[float] = None,
+        allowed_lateness_s: float = 0.0,
+        watermark_delay_s: float = 0.0,
+        max_skew_s: float = math.inf,
+    ) -> None:
+        slide: float = float(slide_s or size_s)
+        panes: float = size_s / slide
+        if slide <= 0 or panes < 1 or abs(panes - round(panes)) > 1e-9:
+            raise ValueError("window size must be a positive multiple of the slide")
+        self.name: str = name
+        self.keys: List[str] = list(keys)
+        self.size: float = float(size_s)
+        self.slide: float = slide
+        self.panes_per_window: int = int(round(panes))
+        self.allowed_lateness: float = float(allowed_lateness_s)
+        self.watermark_delay: float = float(watermark_delay_s)
+        self.max_skew: float = float(max_skew_s)
+
+        self.panes: Dict[int, Dict[str, np.ndarray]] = {}   # pane id -> per-key aggregates
+        self.fired: Dict[int, Dict[str, np.ndarray]] = {}   # window id -> aggregates last emitted
+        self.dirty: Dict[int, np.ndarray] = {}              # window id -> keys to (re-)emit
+        self.next_window: Optional[int] = None              # windows below this are past the watermark
+        self.max_event_time: float = -math.inf
+        self.watermark: float = -math.inf
+
+        self.events: int = 0
+        self.late_events: int = 0      # accepted into an already fired window
+        self.dropped_late: int = 0     # beyond allowed lateness
+        self.dropped_future: int = 0   # stamped beyond max_skew ahead of processing time
+        self.windows_fired: int = 0
+        self.updates_emitted: int = 0
+
+    # Window w covers panes w - panes_per_window + 1 .. w, i.e. ends at (w + 1) * slide
+    def window_start(self, w: int) -> float:
+        return (w - self.panes_per_window + 1) * self.slide
+
+    def window_end(self, w: int) -> float:
+        return (w + 1) * self.slide
+
+    def _new_pane(self) -> Dict[str, np.ndarray]:
+        n: int = len(self.keys)
+        return {
+            "count": np.zeros(n, dtype=np.int64),
+            "sum":   np.zeros(n),
+            "sumsq": np.zeros(n),
+            "min":   np.full(n, math.inf),
+            "max":   np.full(n, -math.inf),
+        }
+
+    def add(self, idx: np.ndarray, times: np.ndarray, values: np.ndarray, now_s: Optional[float] = None) -> None:
+        """
+        Add readings: key positions, event times (epoch s) and values, aligned
+        arrays. `now_s`: processing time the max_skew check is measured from.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        ok: np.ndarray = (idx >= 0) & np.isfinite(times)
+        if now_s is not None and math.isfinite(self.max_skew):
+            future: np.ndarray = ok & (times > now_s + self.max_skew)
+            if future.any():
+                self.dropped_future += int(future.sum())
+                ok &= ~future
+        pane: np.ndarray = np.floor(times[ok] / self.slide).astype(np.int64)
+        idx, times, values = idx[ok], times[ok], values[ok]
+        if math.isfinite(self.watermark) and len(pane):
+            # The last window holding a pane ends (pane + panes_per_window) * slide
+            live: np.ndarray = (pane + self.panes_per_window) * self.slide + self.allowed_lateness > self.watermark
+            if not live.all():
+                self.dropped_late += int(len(live) - live.sum())
+                pane, idx, times, values = pane[live], idx[live], times[live], values[live]
+        if not len(pane):
+            return
+        self.events += len(pane)
+
+        n: int = len(self.keys)
+        lo: int = int(pane.min())
+        if lo == int(pane.max()):
+            groups: List[tuple[int, np.ndarray, np.ndarray]] = [(lo, idx, values)]
+        else:
+            order: np.ndarray = np.argsort(pane, kind="stable")
+            uniq, starts = np.unique(pane[order], return_index=True)
+            bounds: List[int] = [*starts.tolist(), len(order)]
+            groups = [
+                (int(p), idx[order[bounds[j]:bounds[j + 1]]], values[order[bounds[j]:bounds[j + 1]]])
+                for j, p in enumerate(uniq.tolist())
+            ]
+        for p, ii, v in groups:
+            agg: Optional[Dict[str, np.ndarray]] = self.panes.get(p)
+            if agg is None:
+                agg = self.panes[p] = self._new_pane()
+            agg["count"] += np.bincount(ii, minlength=n)
+            agg["sum"] += np.bincount(ii, weights=v, minlength=n)
+            agg["sumsq"] += np.bincount(ii, weights=v * v, minlength=n)
+            np.minimum.at(agg["min"], ii, v)
+            np.maximum.at(agg["max"], ii, v)
+            if self.next_window is not None and p < self.next_window:
+                # Windows p .. next_window - 1 are past the watermark already
+                self.late_events += len(ii)
+                for w in range(p, min(p + self.panes_per_window, self.next_window)):
+                    if self.window_end(w) + self.allowed_lateness <= self.watermark:
+                        continue
+                    mask: Optional[np.ndarray] = self.dirty.get(w)
+                    if mask is None:
+                        mask = self.dirty[w] = np.zeros(n, dtype=bool)
+                    mask[ii] = True
+
+        top: float = float(times.max())
+        if top > self.max_event_time:
+            self.max_event_time = top
+            self.watermark = max(self.watermark, top - self.watermark_delay)
+
+    def _aggregate(self, w: int) -> Optional[Dict[str, np.ndarray]]:
+        parts: List[Dict[str, np.ndarray]] = [
+            self.panes[p] for p in range(w - self.panes_per_window + 1, w + 1) if p in self.panes
+        ]
+        if not parts:
+            return None
+        if len(parts) == 1:
+            return {k: a.copy() for k, a in parts[0].items()}
+        return {
+            "count": np.sum([a["count"] for a in parts], axis=0),
+            "sum":   np.sum([a["sum"] for a in parts], axis=0),
+            "sumsq": np.sum([a["sumsq"] for a in parts], axis=0),
+            "min":   np.min([a["min"] for a in parts], axis=0),
+            "max":   np.max([a["max"] for a in parts], axis=0),
+        }
+
+    def _stats(self, agg: Dict[str, np.ndarray], rows: np.ndarray) -> Dict[str, Dict[str, Any]]:
+        count: np.ndarray = agg["count"][rows]
+        mean: np.ndarray = agg["sum"][rows] / count
+        variance: np.ndarray = np.maximum(agg["sumsq"][rows] / count - mean * mean, 0.0)
+        return {
+            self.keys[i]: {"count": c, "mean": round(m, 1), "min": lo, "max": hi, "variance": round(var, 2)}  # type: ignore[call-overload]
+            for i, c, m, lo, hi, var in zip(
+                rows.tolist(), count.tolist(), mean.tolist(),
+                agg["min"][rows].tolist(), agg["max"][rows].tolist(), variance.tolist(),
+            )
+        }
+
+    def _result(
+        self,
+        w: int,
+        kind: str,
+        agg: Dict[str, np.ndarray],
+        mask: Optional[np.ndarray] = None,
+        previous: Optional[Dict[str, np.ndarray]] = None,
+    ) -> Dict[str, Any]:
+        held: np.ndarray = agg["count"] > 0
+        rows: np.ndarray = np.flatnonzero(held if mask is None else held & mask)
+        result: Dict[str, Any] = {
+            "window":    self.name,
+            "kind":      kind,
+            "start":     _iso(self.window_start(w)),
+            "end":       _iso(self.window_end(w)),
+            "watermark": _iso(self.watermark),
+            "wards":     self._stats(agg, rows),
+        }
+        if previous is not None:
+            before: np.ndarray = rows[previous["count"][rows] > 0]
+            result["retract"] = self._stats(previous, before)
+        return result
+
+    def advance(self) -> List[Dict[str, Any]]:
+        """Emit late updates and every window the watermark has passed, then purge expired state."""
+        results: List[Dict[str, Any]] = []
+        for w in sorted(self.dirty):
+            mask: np.ndarray = self.dirty.pop(w)
+            agg: Optional[Dict[str, np.ndarray]] = self._aggregate(w)
+            if agg is None:
+                continue
+            previous: Optional[Dict[str, np.ndarray]] = self.fired.get(w)
+            results.append(self._result(w, "update" if previous is not None else "late", agg, mask, previous))
+            self.fired[w] = agg
+            self.updates_emitted += 1
+
+        if self.panes and math.isfinite(self.watermark):
+            last: int = math.floor(self.watermark / self.slide) - 1   # highest w with end <= watermark
+            first: int = self.next_window if self.next_window is not None else min(self.panes)
+            if last >= first:
+                due: List[int] = sorted({
+                    w
+                    for p in self.panes
+                    for w in range(max(p, first), min(p + self.panes_per_window - 1, last) + 1)
+                })
+                for w in due:
+                    agg = self._aggregate(w)
+                    if agg is None:
+                        continue
+                    results.append(self._result(w, "final", agg))
+                    self.fired[w] = agg
+                    self.windows_fired += 1
+                self.next_window = last + 1
+
+        horizon: float = self.watermark - self.allowed_lateness
+        for w in [w for w in self.fired if self.window_end(w) <= horizon]:
+            del self.fired[w]
+        for p in [p for p in self.panes if (p + self.panes_per_window) * self.slide <= horizon]:
+            del self.panes[p]
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window":            self.name,
+            "size_s":            self.size,
+            "slide_s":           self.slide,
+            "allowed_lateness_s": self.allowed_lateness,
+            "watermark_delay_s": self.watermark_delay,
+            "watermark":         _iso(self.watermark),
+            "open_panes":        len(self.panes),
+            "retained_windows":  len(self.fired),
+            "events":            self.events,
+            "late_events":       self.late_events,
+            "dropped_late":      self.dropped_late,
+            "dropped_future":    self.dropped_future,
+            "windows_fired":     self.windows_fired,
+            "updates_emitted":   self.updates_emitted,
+        }
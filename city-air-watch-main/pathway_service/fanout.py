@@ -0,0 +1,269 @@
+"""
+=============================================================================
+  CITY AIR WATCH — SSE FAN-OUT HUB
+=============================================================================
+  Bridges the pipeline thread and the uvicorn event loop.
+
+  publish() may be called from any thread. It serializes the event ONCE
+  into a pre-framed SSE buffer (b"data: ...\\n\\n") and hands it to the
+  loop with a single call_soon_threadsafe().
+
+  On the loop the frame is appended to a shared ring of recent frames and
+  one shared asyncio.Event is pulsed, waking every waiting subscriber.
+  Subscribers only hold a cursor into the ring, so a tick costs one
+  json.dumps + one loop wakeup regardless of client count, and every
+  client writes the very same bytes object. publish_many() does the same
+  for a batch of hubs (e.g. one per /stream filter) with one wakeup.
+
+  A subscriber whose cursor falls out of the ring (more than `max_pending`
+  frames behind) is dropped instead of slowing down everyone else. When no
+  frame has been sent for `heartbeat_s`, the hub publishes one shared
+  heartbeat frame instead of each client running its own timer.
+
+  A frame may carry a `context` (e.g. the full state it was derived from);
+  the hub exposes the context of the last delivered frame so a new client
+  can be started from a state that matches its cursor exactly.
+
+  Resumable streams: every published frame gets an SSE `id:` of the form
+  "<epoch>-<n>" (epoch changes on every engine start) and is kept in a
+  bounded journal (by frame count and total bytes). A reconnecting client
+  that sends Last-Event-ID is replayed the frames it missed from the
+  journal; replay_since() returns None when that is impossible (unknown
+  epoch, or the journal no longer reaches back far enough) and the client
+  should get a fresh snapshot instead.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+
+SPLICE_MARKER: str = "@@splice@@"
+
+
+def splice_json(obj: Dict[str, Any], key: str, body: bytes, brackets: bytes = b"[]") -> bytes:
+    """
+    json.dumps(obj) with obj[key] replaced by an array / object whose items
+    were encoded elsewhere: `body` is their comma-separated JSON, without
+    the enclosing brackets. Only the small remainder of obj is serialized here.
+    """
+    head, _, tail = json.dumps({**obj, key: SPLICE_MARKER}).partition(f'"{SPLICE_MARKER}"')
+    return b"".join((head.encode("utf-8"), brackets[:1], body, brackets[1:], tail.encode("utf-8")))
+
+
+def encode_sse(event: Dict[str, Any] | bytes, event_id: Optional[str] = None) -> bytes:
+    """
+    Serialize an event into one SSE frame (`id:` line only when event_id is
+    given). Bytes are taken as already encoded JSON.
+    """
+    payload: bytes = event if isinstance(event, bytes) else json.dumps(event).encode("utf-8")
+    data: bytes = b"data: " + payload + b"\n\n"
+    if event_id is None:
+        return data
+    return b"id: " + event_id.encode("ascii") + b"\n" + data
+
+
+class Subscriber:
+    """One SSE client: a cursor into the hub's ring of shared frames."""
+
+    def __init__(self, hub: FanoutHub) -> None:
+        self.hub: FanoutHub = hub
+        self.id: int = hub.subscribed   # stable label for per-client metrics
+        self.cursor: int = hub.seq   # last frame sequence handed to this client
+        self.closed: bool = False
+
+    @property
+    def depth(self) -> int:
+        """Frames published but not yet consumed by this client."""
+        return self.hub.seq - self.cursor
+
+    async def next_frame(self) -> Optional[bytes]:
+        """Next frame for this client; None once it has been closed or dropped."""
+        hub: FanoutHub = self.hub
+        while not self.closed:
+            if self.cursor < hub.seq:
+                oldest: int = hub.seq - len(hub.frames) + 1
+                if self.cursor + 1 < oldest:
+                    hub.dropped += 1
+                    hub.unsubscribe(self)
+                    return None
+                self.cursor += 1
+                return hub.frames[self.cursor - oldest]
+            await hub.wait()
+        return None
+
+
+class FanoutHub:
+    """Thread-safe, loop-aware broadcast of encoded ticks to SSE subscribers."""
+
+    def __init__(
+        self,
+        max_pending: int = 100,
+        heartbeat_s: float = 3.0,
+        journal_frames: int = 120,
+        journal_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.max_pending: int = max_pending
+        self.heartbeat_s: float = heartbeat_s
+        self.subscribers: Set[Subscriber] = set()
+        self.frames: deque[bytes] = deque(maxlen=max_pending)
+        self.seq: int = 0
+        self.context: Any = None
+        # Replay journal of (event id number, frame), oldest first
+        self.epoch: str = format(time.time_ns() // 1_000_000, "x")
+        self.journal: deque[tuple[int, bytes]] = deque()
+        self.journal_frames: int = journal_frames
+        self.journal_bytes: int = journal_bytes
+        self._journal_size: int = 0
+        self.last_id: int = 0        # last id assigned by publish()
+        self.delivered_id: int = 0   # last id delivered on the loop
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Held while binding a loop and while delivering with none bound, so the pipeline
+        # thread never delivers in place while subscribe() swaps the wakeup event
+        self._bind_lock: threading.Lock = threading.Lock()
+        self.published: int = 0
+        self.dropped: int = 0
+        self.subscribed: int = 0
+        self.encode_s: float = 0.0   # time spent serializing the last published frame
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._heartbeat_task: Optional[asyncio.Task[None]] = None
+        self._last_frame_at: float = 0.0
+
+    def __len__(self) -> int:
+        return len(self.subscribers)
+
+    # ── loop side ─────────────────────────────────
+    def subscribe(self) -> Subscriber:
+        """Register a client. Must be called from the event loop that serves it."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            with self._bind_lock:
+                self.loop = loop
+                self._wakeup = asyncio.Event()
+                self._heartbeat_task = None
+        if self._heartbeat_task is None and self.heartbeat_s > 0:
+            self._heartbeat_task = loop.create_task(self._heartbeat())
+        self.subscribed += 1
+        sub: Subscriber = Subscriber(self)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        sub.closed = True
+        self.subscribers.discard(sub)
+
+    async def wait(self) -> None:
+        """Block until the next frame is delivered."""
+        await self._wakeup.wait()
+
+    def event_id(self, n: int) -> str:
+        return f"{self.epoch}-{n}"
+
+    def replay_since(self, last_event_id: Optional[str]) -> Optional[List[bytes]]:
+        """
+        Journaled frames published after `last_event_id`, or None if the stream
+        cannot be resumed from there. Call right after subscribe(), on the loop
+        and without awaiting in between, so replay and live frames line up.
+        """
+        if not last_event_id:
+            return None
+        epoch, _, raw = last_event_id.strip().rpartition("-")
+        if epoch != self.epoch or not raw.isdigit():
+            return None
+        last: int = int(raw)
+        if last > self.delivered_id:
+            return None
+        if last == self.delivered_id:
+            return []
+        if not self.journal or self.journal[0][0] > last + 1:
+            return None
+        start: int = last + 1 - self.journal[0][0]
+        return [frame for _n, frame in islice(self.journal, start, None)]
+
+    def _deliver(self, frame: bytes, context: Any = None, n: Optional[int] = None) -> None:
+        self.frames.append(frame)
+        self.seq += 1
+        if context is not None:
+            self.context = context
+        if n is not None:
+            self.delivered_id = n
+            self.journal.append((n, frame))
+            self._journal_size += len(frame)
+            while self.journal and (
+                len(self.journal) > self.journal_frames or self._journal_size > self.journal_bytes
+            ):
+                self._journal_size -= len(self.journal.popleft()[1])
+        self._last_frame_at = time.monotonic()
+        # set() resolves every current waiter; clear() re-arms for the next frame
+        self._wakeup.set()
+        self._wakeup.clear()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_s)
+            if self.subscribers and time.monotonic() - self._last_frame_at >= self.heartbeat_s:
+                self._deliver(encode_sse({
+                    "event":     "heartbeat",
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                }))
+
+    # ── any thread ────────────────────────────────
+    def prepare(self, event: Dict[str, Any] | bytes) -> tuple[bytes, int]:
+        """Assign the next event id and encode the frame (publish() without the delivery)."""
+        n: int = self.last_id + 1
+        self.last_id = n
+        self.published += 1
+        started: float = time.perf_counter()
+        frame: bytes = encode_sse(event, self.event_id(n))
+        self.encode_s = time.perf_counter() - started
+        return frame, n
+
+    def _deliver_unbound(self, frame: bytes, context: Any, n: int) -> Optional[asyncio.AbstractEventLoop]:
+        """
+        Deliver in place if no loop is bound (no client has connected yet:
+        nothing to wake, but journal and context stay current); otherwise
+        return the loop the delivery must be scheduled on.
+        """
+        with self._bind_lock:
+            loop: Optional[asyncio.AbstractEventLoop] = self.loop
+            if loop is None or loop.is_closed():
+                self._deliver(frame, context, n)
+                return None
+        return loop
+
+    def publish(self, event: Dict[str, Any] | bytes, context: Any = None) -> int:
+        """Encode once (with the next event id) and schedule delivery on the subscribers' loop."""
+        frame, n = self.prepare(event)
+        loop: Optional[asyncio.AbstractEventLoop] = self._deliver_unbound(frame, context, n)
+        if loop is not None:
+            loop.call_soon_threadsafe(self._deliver, frame, context, n)
+        return n
+
+
+def publish_many(items: Sequence[tuple[FanoutHub, Dict[str, Any] | bytes, Any]]) -> None:
+    """
+    publish() of one event (and context) per hub, with a single
+    call_soon_threadsafe() per loop for the whole batch, so many small hubs
+    cost the loop one wakeup per tick instead of one per hub.
+    """
+    batches: Dict[asyncio.AbstractEventLoop, List[tuple[FanoutHub, bytes, Any, int]]] = {}
+    for hub, event, context in items:
+        frame, n = hub.prepare(event)
+        loop: Optional[asyncio.AbstractEventLoop] = hub._deliver_unbound(frame, context, n)
+        if loop is not None:
+            batches.setdefault(loop, []).append((hub, frame, context, n))
+    for loop, batch in batches.items():
+        loop.call_soon_threadsafe(_deliver_batch, batch)
+
+
+def _deliver_batch(batch: List[tuple[FanoutHub, bytes, Any, int]]) -> None:
+    for hub, frame, context, n in batch:
+        hub._deliver(frame, context, n)
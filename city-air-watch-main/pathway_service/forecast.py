@@ -0,0 +1,162 @@
+"""
+=============================================================================
+  CITY AIR WATCH — ONLINE AQI FORECASTING
+=============================================================================
+  ForecastModel: one incrementally updated forecaster per ward, the wards
+  that reported updated in one vectorized pass per tick. Smoothing weights
+  come from time constants and the seconds since each ward's previous
+  update, so the model behaves the same at any tick rate and a ward that
+  went silent resumes where it left off.
+
+    level    exponential smoothing of the reading       (tau: level_tau_s)
+    trend    smoothed slope of the level, AQI / s        (tau: trend_tau_s)
+    mean     slow average the forecast reverts to        (tau: mean_tau_s)
+    season   hour-of-day profile, reading / mean per hour of day
+    err_var  smoothed one-step squared error (short-horizon uncertainty)
+    spread   smoothed squared deviation from the mean (long-horizon uncertainty)
+             (both start at prior_sd ** 2)
+
+  Forecast H seconds ahead (hour of day h now, h' at t + H):
+    damped = level + trend * trend_tau * (1 - exp(-H / trend_tau))
+    w      = 1 - exp(-H / revert_tau)
+    f      = (1 - w) * damped * season[h'] / season[h] + w * mean * season[h']
+    sigma  = sqrt(err_var + w * spread)          (interval: f +/- z * sigma)
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+INTERVAL_Z: float = 1.645   # two-sided 90% interval
+
+
+class ForecastModel:
+    """Damped-trend exponential smoothing with mean reversion and a diurnal profile, for all wards at once."""
+
+    def __init__(
+        self,
+        wards: int,
+        horizons: Mapping[str, float],
+        level_tau_s: float = 300.0,
+        trend_tau_s: float = 1800.0,
+        mean_tau_s: float = 6 * 3600.0,
+        revert_tau_s: float = 3 * 3600.0,
+        season_tau_s: float = 2 * 3600.0,
+        prior_sd: float = 20.0,
+    ) -> None:
+        self.horizon_names: List[str] = list(horizons)
+        self.horizon_s: np.ndarray = np.array([float(horizons[h]) for h in self.horizon_names])
+        self.level_tau_s: float = level_tau_s
+        self.trend_tau_s: float = trend_tau_s
+        self.mean_tau_s: float = mean_tau_s
+        self.season_tau_s: float = season_tau_s
+        self.prior_sd: float = prior_sd
+        # Per-horizon constants: damped-trend gain and reversion weight
+        self.trend_gain: np.ndarray = trend_tau_s * (1.0 - np.exp(-self.horizon_s / trend_tau_s))
+        self.revert: np.ndarray = 1.0 - np.exp(-self.horizon_s / revert_tau_s)
+        self.hour_shift: np.ndarray = (self.horizon_s // 3600.0).astype(np.int64)
+
+        self.level: np.ndarray = np.zeros(wards)
+        self.trend: np.ndarray = np.zeros(wards)
+        self.mean: np.ndarray = np.zeros(wards)
+        self.err_var: np.ndarray = np.zeros(wards)
+        self.spread: np.ndarray = np.zeros(wards)
+        self.season: np.ndarray = np.ones((24, wards))   # hour-major: one contiguous row per hour
+        self.updates: np.ndarray = np.zeros(wards, dtype=np.int64)   # readings folded in per ward
+        self.last_t: np.ndarray = np.full(wards, math.nan)          # time of each ward's last update
+        self.hour: int = 0
+
+    def __len__(self) -> int:
+        return len(self.level)
+
+    def update(self, aqi: np.ndarray, now_s: float, hour: int, rows: Optional[np.ndarray] = None) -> None:
+        """
+        Fold one reading per ward (aligned with the wards, taken at now_s, hour
+        of day `hour`) into the model. Only the wards at positions `rows`
+        (default: all) reported; the others keep their state.
+        """
+        self.hour = hour % 24
+        at: Any = slice(None) if rows is None or len(rows) == len(self.level) else np.asarray(rows, dtype=np.int64)
+        y: np.ndarray = np.asarray(aqi, dtype=np.float64)[at]
+        first: np.ndarray = self.updates[at] == 0
+        if first.all():
+            self._start(at, y, now_s)
+            return
+        dt: Any = now_s - self.last_t[at]
+        if first.any() or not (dt == dt[0]).all():
+            # Wards last updated at different times (or starting now): per-ward weights
+            dt = np.maximum(np.where(first, 1.0, dt), 1e-3)
+            expm1: Any = np.expm1
+        else:
+            dt = max(float(dt[0]), 1e-3)
+            expm1 = math.expm1
+        a: Any = -expm1(-dt / self.level_tau_s)
+        b: Any = -expm1(-dt / self.trend_tau_s)
+        g: Any = -expm1(-dt / self.mean_tau_s)
+        r: Any = -expm1(-dt / self.season_tau_s)
+        if first.any():
+            r = np.where(first, 0.0, r)   # a first reading leaves the diurnal profile alone
+        level0: np.ndarray = self.level[at]
+        trend0: np.ndarray = self.trend[at]
+        err: np.ndarray = y - (level0 + trend0 * dt)
+        level: np.ndarray = level0 + trend0 * dt + a * err
+        self.trend[at] = trend0 + b * ((level - level0) / dt - trend0)
+        self.level[at] = level
+        err_var: np.ndarray = self.err_var[at]
+        self.err_var[at] = err_var + a * (err * err - err_var)
+        mean: np.ndarray = self.mean[at]
+        mean = mean + g * (y - mean)
+        self.mean[at] = mean
+        dev: np.ndarray = y - mean
+        spread: np.ndarray = self.spread[at]
+        self.spread[at] = spread + g * (dev * dev - spread)
+        season: np.ndarray = self.season[self.hour, at]
+        self.season[self.hour, at] = season + r * (y / np.maximum(mean, 1.0) - season)
+        self.last_t[at] = now_s
+        self.updates[at] += 1
+        if first.any():
+            starting: np.ndarray = np.arange(len(self.level))[at][first]
+            self._start(starting, y[first], now_s)
+
+    def _start(self, at: Any, y: np.ndarray, now_s: float) -> None:
+        """First reading of the wards at `at`: start their model from it."""
+        self.level[at] = y
+        self.mean[at] = y
+        self.trend[at] = 0.0
+        # Wide intervals until the errors have been measured
+        self.err_var[at] = self.prior_sd ** 2
+        self.spread[at] = self.prior_sd ** 2
+        self.last_t[at] = now_s
+        self.updates[at] = 1
+
+    def forecast(self) -> Dict[str, np.ndarray]:
+        """(wards, horizons) point forecasts and interval bounds as of the last update."""
+        n: int = len(self.level)
+        h: int = len(self.horizon_s)
+        point: np.ndarray = np.empty((h, n))
+        sigma: np.ndarray = np.empty((h, n))
+        shape: np.ndarray = np.empty(n)
+        for k in range(h):   # a handful of horizons: each pass works on contiguous rows
+            w: float = float(self.revert[k])
+            ahead: np.ndarray = self.season[(self.hour + int(self.hour_shift[k])) % 24]
+            np.divide(ahead, self.season[self.hour], out=shape)
+            row: np.ndarray = point[k]
+            np.multiply(self.trend, float(self.trend_gain[k]), out=row)
+            row += self.level
+            row *= shape
+            row *= 1.0 - w
+            row += w * self.mean * ahead
+            np.maximum(row, 0.0, out=row)
+            np.multiply(self.spread, w, out=sigma[k])
+            sigma[k] += self.err_var
+        np.sqrt(sigma, out=sigma)
+        sigma *= INTERVAL_Z
+        return {
+            "aqi":   point.T,
+            "lower": np.maximum(point - sigma, 0.0).T,
+            "upper": (point + sigma).T,
+        }
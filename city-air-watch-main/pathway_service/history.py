@@ -0,0 +1,406 @@
+"""
+=============================================================================
+  CITY AIR WATCH — READING HISTORY STORE
+=============================================================================
+  Append-only, segment-based local storage of every ingested reading.
+
+  Layout:   <root>/<YYYY-MM-DD>/<ward>.seg     one segment per ward per UTC day
+  Record:   fixed-width, little-endian, 23 bytes
+              t_ms   uint32   milliseconds since the segment's day start
+              aqi    int16
+              flags  uint8    bit 0 = spike
+              pm25, pm10, no2, co   float32
+  Records are appended in arrival order (late readings land at the end).
+  A torn record from a crash is ignored: count = file size // record size.
+
+  Writes: append() only enqueues the arrays of one chunk (never blocks, a
+  full queue drops the chunk and counts it); a writer thread encodes the
+  records in one NumPy pass and groups them by (ward, day). Groups are
+  buffered per segment and appended with a single os.write once a segment
+  holds `flush_records` records or every `flush_s` seconds, so large
+  grids cost one write per segment per flush rather than per tick.
+
+  Event times later than now + `max_future_s` are rejected (counted), and
+  retention is measured from today's wall-clock date, so a sensor with a
+  bad clock can neither create far-future days nor prune the real ones.
+
+  Reads: query() maps the day segments a range touches with np.memmap
+  (plus any records still buffered) and downsamples with vectorized
+  masks + bincount; only the output buckets become Python objects.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+RECORD: np.dtype = np.dtype([
+    ("t_ms",  "<u4"),
+    ("aqi",   "<i2"),
+    ("flags", "u1"),
+    ("pm25",  "<f4"),
+    ("pm10",  "<f4"),
+    ("no2",   "<f4"),
+    ("co",    "<f4"),
+])
+DAY_S: int = 86400
+# Range a query may span (what datetime can represent)
+EARLIEST_T: float = datetime(1, 1, 2, tzinfo=timezone.utc).timestamp()
+LATEST_T: float = datetime(9999, 12, 31, tzinfo=timezone.utc).timestamp()
+POLLUTANTS: tuple[str, ...] = ("pm25", "pm10", "no2", "co")
+_SAFE_NAME: re.Pattern[str] = re.compile(r"[A-Za-z0-9_.-]+")
+_DAY_NAME: re.Pattern[str] = re.compile(r"\d{4}-\d{2}-\d{2}")
+log: logging.Logger = logging.getLogger("pathway.history")
+
+
+def segment_name(ward_id: str) -> str:
+    """File name for a ward; ids outside [A-Za-z0-9_.-] are hex-encoded."""
+    if _SAFE_NAME.fullmatch(ward_id) and not ward_id.startswith("."):
+        return ward_id + ".seg"
+    return "x" + ward_id.encode("utf-8").hex() + ".seg"
+
+
+def day_dir(day: int) -> str:
+    return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=day)).strftime("%Y-%m-%d")
+
+
+class HistoryStore:
+    """Segment store with a background writer and mmap-backed range queries."""
+
+    def __init__(
+        self,
+        root: str,
+        max_pending: int = 256,
+        retention_days: int = 30,
+        open_files: int = 1024,
+        flush_s: float = 10.0,
+        flush_records: int = 4096,
+        max_future_s: float = 300.0,
+    ) -> None:
+        self.root: str = root
+        self.max_future_s: float = max_future_s
+        self.retention_days: int = retention_days
+        self.open_files: int = open_files
+        self.flush_s: float = flush_s
+        self.flush_records: int = flush_records
+        self._pending: queue.Queue[Optional[tuple[Any, ...]]] = queue.Queue(maxsize=max_pending)
+        self._fds: OrderedDict[tuple[int, str], int] = OrderedDict()   # LRU of append fds
+        # Encoded records not yet on disk, per (day, segment file name)
+        self._buffers: Dict[tuple[int, str], List[np.ndarray]] = {}
+        self._buffered: Dict[tuple[int, str], int] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune_day: int = -1
+        self.records_written: int = 0
+        self.bytes_written: int = 0
+        self.chunks_dropped: int = 0
+        self.write_errors: int = 0
+        self.records_rejected: int = 0   # event time too far in the future
+        self.last_error: Optional[str] = None
+        self.last_write_ms: float = 0.0
+
+    # ── pipeline side ─────────────────────────────
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def append(
+        self,
+        keys: Sequence[str],
+        idx: np.ndarray,
+        times: np.ndarray,
+        columns: Dict[str, np.ndarray],
+    ) -> bool:
+        """
+        Queue one chunk for writing: key positions into `keys`, event times
+        (epoch s) and aqi / pollutant / spike arrays, all aligned. Returns
+        False when the writer is behind and the chunk was dropped.
+        """
+        try:
+            self._pending.put_nowait((keys, idx, times, columns))
+        except queue.Full:
+            self.chunks_dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """Wait until every queued chunk is on disk (benchmarks, shutdown)."""
+        deadline: float = time.monotonic() + timeout
+        self._pending.put((), timeout=timeout)   # () = flush every buffered segment
+        while self._pending.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    # ── writer thread ─────────────────────────────
+    def _run(self) -> None:
+        next_flush: float = time.monotonic() + self.flush_s
+        while True:
+            queued: bool = True
+            try:
+                item: Optional[tuple[Any, ...]] = self._pending.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                item, queued = (), False
+            try:
+                if item is None:
+                    break
+                start: float = time.perf_counter()
+                if item:
+                    self._write_chunk(*item)
+                if not item or time.monotonic() >= next_flush:
+                    self._flush_segments(list(self._buffers))
+                    next_flush = time.monotonic() + self.flush_s
+                self.last_write_ms = (time.perf_counter() - start) * 1000.0
+            except Exception as exc:  # noqa: BLE001 - one bad chunk must not stop persistence
+                self.write_errors += 1
+                self.last_error = repr(exc)
+                if not isinstance(exc, OSError):
+                    log.error("[Pathway History] Chunk not written: %r", exc)
+            finally:
+                if queued:
+                    self._pending.task_done()
+        try:
+            self._flush_segments(list(self._buffers))
+        except OSError:
+            self.write_errors += 1
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+    def _fd(self, day: int, name: str) -> int:
+        key: tuple[int, str] = (day, name)
+        fd: Optional[int] = self._fds.get(key)
+        if fd is not None:
+            self._fds.move_to_end(key)
+            return fd
+        directory: str = os.path.join(self.root, day_dir(day))
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, name), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._fds[key] = fd
+        while len(self._fds) > self.open_files:
+            os.close(self._fds.popitem(last=False)[1])
+        return fd
+
+    def _write_chunk(
+        self,
+        keys: Sequence[str],
+        idx: np.ndarray,
+        times: np.ndarray,
+        columns: Dict[str, np.ndarray],
+    ) -> None:
+        now: float = time.time()
+        times = np.where(np.isfinite(times), times, now)
+        ok: np.ndarray = idx >= 0
+        future: np.ndarray = ok & (times > now + self.max_future_s)
+        if future.any():
+            self.records_rejected += int(future.sum())
+            ok &= ~future
+        times = times[ok]
+        idx = idx[ok]
+        if not len(idx):
+            return
+        day: np.ndarray = np.floor(times / DAY_S).astype(np.int64)
+        records: np.ndarray = np.empty(len(idx), dtype=RECORD)
+        records["t_ms"] = np.round((times - day * DAY_S) * 1000.0).clip(0, DAY_S * 1000 - 1)
+        records["aqi"] = np.clip(columns["aqi"][ok], -32768, 32767)
+        records["flags"] = columns["spike"][ok]
+        for name in POLLUTANTS:
+            records[name] = columns[name][ok]
+
+        # Group by (day, ward); each group is buffered for its segment
+        order: np.ndarray = np.lexsort((idx, day))
+        records = records[order]
+        group: np.ndarray = day[order] * (len(keys) + 1) + idx[order]
+        bounds: np.ndarray = np.flatnonzero(np.diff(group)) + 1
+        starts: List[int] = [0, *bounds.tolist()]
+        ends: List[int] = [*bounds.tolist(), len(records)]
+        days: List[int] = day[order][starts].tolist()
+        wards: List[int] = idx[order][starts].tolist()
+        full: List[tuple[int, str]] = []
+        with self._lock:
+            for s, e, d, w in zip(starts, ends, days, wards):
+                key: tuple[int, str] = (d, segment_name(keys[w]))
+                parts: Optional[List[np.ndarray]] = self._buffers.get(key)
+                if parts is None:
+                    parts = self._buffers[key] = []
+                    self._buffered[key] = 0
+                parts.append(records[s:e])
+                self._buffered[key] += e - s
+                if self._buffered[key] >= self.flush_records:
+                    full.append(key)
+        self._flush_segments(full)
+        self._prune(int(now // DAY_S))
+
+    def _flush_segments(self, segments: List[tuple[int, str]]) -> None:
+        """Append the buffered records of each segment with one os.write."""
+        for key in segments:
+            # Held across the write so query() sees each record exactly once
+            with self._lock:
+                parts: Optional[List[np.ndarray]] = self._buffers.pop(key, None)
+                self._buffered.pop(key, None)
+                if not parts:
+                    continue
+                data: bytes = b"".join(part.tobytes() for part in parts)
+                os.write(self._fd(*key), data)
+            self.bytes_written += len(data)
+            self.records_written += len(data) // RECORD.itemsize
+
+    def _prune(self, today: int) -> None:
+        """Drop day directories older than the retention window (checked once per day)."""
+        if today == self._last_prune_day or self.retention_days <= 0:
+            return
+        self._last_prune_day = today
+        cutoff: str = day_dir(today - self.retention_days)
+        for name in os.listdir(self.root):
+            if _DAY_NAME.fullmatch(name) and name < cutoff:
+                for key in [k for k in self._fds if day_dir(k[0]) == name]:
+                    os.close(self._fds.pop(key))
+                with self._lock:
+                    for key in [k for k in self._buffers if day_dir(k[0]) == name]:
+                        del self._buffers[key]
+                        del self._buffered[key]
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    # ── reads ─────────────────────────────────────
+    def days(self, first: int, last: int) -> List[int]:
+        """Days in [first, last) holding records: a day directory on disk or buffered writes."""
+        epoch: datetime = datetime(1970, 1, 1)
+        found: set[int] = set()
+        try:
+            names: List[str] = os.listdir(self.root)
+        except OSError:
+            names = []
+        for name in names:
+            if _DAY_NAME.fullmatch(name):
+                try:
+                    day: int = (datetime.strptime(name, "%Y-%m-%d") - epoch).days
+                except ValueError:
+                    continue
+                if first <= day < last:
+                    found.add(day)
+        with self._lock:
+            found.update(day for day, _ in self._buffers if first <= day < last)
+        return sorted(found)
+
+    def segment(self, ward_id: str, day: int) -> Optional[np.ndarray]:
+        """Read-only memmap of one ward-day segment (complete records only)."""
+        path: str = os.path.join(self.root, day_dir(day), segment_name(ward_id))
+        try:
+            count: int = os.path.getsize(path) // RECORD.itemsize
+        except OSError:
+            return None
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=RECORD, mode="r", shape=(count,))
+
+    def query(self, ward_id: str, t_from: float, t_to: float, resolution: float, max_points: int = 2000) -> Dict[str, Any]:
+        """
+        Downsampled readings of one ward in [t_from, t_to): per `resolution`-second
+        bucket (aligned to multiples of the resolution) count, AQI mean/min/max and
+        pollutant means. Resolution is raised if the range would yield more than
+        `max_points` buckets.
+        """
+        if t_to <= t_from:
+            raise ValueError("'to' must be after 'from'")
+        if t_from < EARLIEST_T or t_to > LATEST_T:
+            raise ValueError("'from' / 'to' must fall between years 1 and 9999")
+        resolution = max(float(resolution), (t_to - t_from) / max_points, 0.001)
+        base: float = math.floor(t_from / resolution) * resolution
+        buckets: int = int(math.ceil((t_to - base) / resolution))
+        count: np.ndarray = np.zeros(buckets, dtype=np.int64)
+        sums: Dict[str, np.ndarray] = {name: np.zeros(buckets) for name in ("aqi", *POLLUTANTS)}
+        aqi_min: np.ndarray = np.full(buckets, np.inf)
+        aqi_max: np.ndarray = np.full(buckets, -np.inf)
+        scanned: int = 0
+        # Only the days that exist: a range spanning centuries costs a listdir, not a stat per day
+        for day in self.days(int(t_from // DAY_S), int(math.ceil(t_to / DAY_S))):
+            with self._lock:
+                pending: List[np.ndarray] = list(self._buffers.get((day, segment_name(ward_id)), ()))
+            for seg in [self.segment(ward_id, day), *pending]:
+                if seg is None:
+                    continue
+                scanned += len(seg)
+                self._accumulate(seg, day, t_from, t_to, base, resolution, count, sums, aqi_min, aqi_max)
+
+        filled: np.ndarray = np.flatnonzero(count)
+        n: np.ndarray = count[filled]
+        means: Dict[str, List[float]] = {
+            name: np.round(sums[name][filled] / n, 2 if name == "co" else 1).tolist() for name in sums
+        }
+        points: List[Dict[str, Any]] = [
+            {
+                "t":       datetime.fromtimestamp(base + b * resolution, timezone.utc).isoformat(),
+                "count":   c,
+                "aqi_avg": means["aqi"][j],
+                "aqi_min": int(lo),
+                "aqi_max": int(hi),
+                **{name: means[name][j] for name in POLLUTANTS},
+            }
+            for j, (b, c, lo, hi) in enumerate(zip(
+                filled.tolist(), n.tolist(), aqi_min[filled].tolist(), aqi_max[filled].tolist()
+            ))
+        ]
+        return {
+            "ward_id":      ward_id,
+            "from":         datetime.fromtimestamp(t_from, timezone.utc).isoformat(),
+            "to":           datetime.fromtimestamp(t_to, timezone.utc).isoformat(),
+            "resolution_s": resolution,
+            "scanned":      scanned,
+            "points":       points,
+        }
+
+    @staticmethod
+    def _accumulate(
+        seg: np.ndarray,
+        day: int,
+        t_from: float,
+        t_to: float,
+        base: float,
+        resolution: float,
+        count: np.ndarray,
+        sums: Dict[str, np.ndarray],
+        aqi_min: np.ndarray,
+        aqi_max: np.ndarray,
+    ) -> None:
+        """Fold the records of one ward-day array into the query buckets."""
+        t: np.ndarray = seg["t_ms"] / 1000.0 + day * DAY_S
+        hit: np.ndarray = np.flatnonzero((t >= t_from) & (t < t_to))
+        if not len(hit):
+            return
+        b: np.ndarray = ((t[hit] - base) // resolution).astype(np.int64)
+        aqi: np.ndarray = seg["aqi"][hit].astype(np.float64)
+        buckets: int = len(count)
+        count += np.bincount(b, minlength=buckets)
+        sums["aqi"] += np.bincount(b, weights=aqi, minlength=buckets)
+        for name in POLLUTANTS:
+            sums[name] += np.bincount(b, weights=seg[name][hit].astype(np.float64), minlength=buckets)
+        np.minimum.at(aqi_min, b, aqi)
+        np.maximum.at(aqi_max, b, aqi)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "root":            self.root,
+            "pending_chunks":  self._pending.qsize(),
+            "records_written": self.records_written,
+            "bytes_written":   self.bytes_written,
+            "chunks_dropped":  self.chunks_dropped,
+            "write_errors":    self.write_errors,
+            "last_error":      self.last_error,
+            "records_rejected": self.records_rejected,
+            "last_write_ms":   round(self.last_write_ms, 2),  # type: ignore[call-overload]
+            "open_segments":   len(self._fds),
+            "buffered_segments": len(self._buffers),
+        }
@@ -0,0 +1,616 @@
+"""
+=============================================================================
+  CITY AIR WATCH — INGESTION CONNECTORS
+=============================================================================
+  Every source of sensor readings is a Connector that parses its input
+  into Reading tuples and feeds one bounded ReadingQueue:
+
+    SimulatorConnector  : the synthetic AQI generator, one batch per interval
+    LineServerConnector : asyncio TCP + UDP line-protocol listener
+    FileTailConnector   : follows a CSV / line-protocol file (tail -f)
+    HttpBatchConnector  : arrays of readings POSTed to /ingest
+
+  Line protocol (also the CSV layout, a header line is skipped):
+      ward_id,aqi[,pm25,pm10,no2,co[,timestamp]]
+  or one JSON object per line with the same keys. Sensors that report raw
+  concentrations leave aqi empty (or out): the reading's AQI is then
+  computed from CPCB sub-indices by the engine (sub_index.py).
+  Readings with an AQI outside 0..MAX_AQI (500) or a non-finite number
+  are rejected as malformed.
+
+  Backpressure: the queue holds at most `capacity` readings. Sources that
+  can wait (TCP streams, file tail) stop reading until there is room, so
+  the sender / file is throttled; sources that cannot (UDP datagrams,
+  HTTP batches, the simulator) drop the excess and count it.
+
+  The pipeline consumes the queue in tumbling windows (iter_window): a
+  window closes once every known ward has reported (but not before
+  `min_s`), or at `max_s`, whichever comes first.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timezone
+from itertools import repeat
+from operator import itemgetter
+from typing import Any, Callable, Collection, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# Simulator model ratios, used to estimate pollutants a sensor did not report
+POLLUTANT_RATIOS: Dict[str, float] = {"pm25": 0.6, "pm10": 0.9, "no2": 0.3, "co": 0.02}
+POLLUTANTS: tuple[str, ...] = tuple(POLLUTANT_RATIOS)
+NO_AQI: int = -1   # Reading.aqi of a concentration-only reading (pollutants it lacks are NaN)
+MAX_AQI: int = 500  # top of the CPCB scale; readings above it are rejected
+
+log: logging.Logger = logging.getLogger("pathway.ingest")
+
+
+class Reading(NamedTuple):
+    ward_id: str
+    aqi: int
+    pm25: float
+    pm10: float
+    no2: float
+    co: float
+    spike: bool
+    timestamp: str
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _number(value: Any) -> float:
+    number: float = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
+
+
+def _pollutant(value: Any, aqi: int, name: str) -> float:
+    if value is None or value == "":
+        if aqi == NO_AQI:
+            return math.nan
+        return round(aqi * POLLUTANT_RATIOS[name], 2)  # type: ignore[call-overload]
+    return _number(value)
+
+
+def _aqi(value: Any, pollutants: Sequence[Any]) -> int:
+    """Reported AQI (0 .. MAX_AQI), or NO_AQI when the reading only carries concentrations."""
+    if value is None or value == "":
+        if all(p is None or p == "" for p in pollutants):
+            raise ValueError("reading has neither an AQI nor a pollutant concentration")
+        return NO_AQI
+    number: float = _number(value)
+    if not 0 <= number <= MAX_AQI:
+        raise ValueError(f"AQI out of range 0..{MAX_AQI}: {number:g}")
+    return round(number)
+
+
+def reading_from_mapping(obj: Mapping[str, Any], received_at: Optional[str] = None) -> Reading:
+    """
+    Reading from a dict (JSON line, HTTP batch item, simulator row). Readings
+    without a timestamp get `received_at` (default: now); readings without
+    an aqi need at least one pollutant concentration. Anything but a mapping
+    raises TypeError.
+    """
+    if not isinstance(obj, Mapping):
+        raise TypeError(f"expected a reading object, got {type(obj).__name__}")
+    values: List[Any] = [obj.get(name) for name in POLLUTANTS]
+    aqi: int = _aqi(obj.get("aqi"), values)
+    return Reading(
+        str(obj["ward_id"]),
+        aqi,
+        *(_pollutant(value, aqi, name) for value, name in zip(values, POLLUTANTS)),
+        bool(obj.get("spike", False)),
+        str(obj.get("timestamp") or received_at or _now()),
+    )
+
+
+def parse_line(line: str, received_at: Optional[str] = None) -> Optional[Reading]:
+    """
+    One line-protocol / CSV line -> Reading. Blank lines, comments and the
+    CSV header give None; malformed lines raise ValueError / KeyError /
+    TypeError (non-finite numbers are malformed).
+    """
+    line = line.strip()
+    if not line or line[0] == "#":
+        return None
+    if line[0] == "{":
+        return reading_from_mapping(json.loads(line), received_at)
+    parts: List[str] = line.split(",")
+    if len(parts) < 2:
+        raise ValueError(f"expected ward_id,aqi[,...]: {line[:80]!r}")
+    if parts[1].strip() == "aqi":
+        return None
+    fields: List[str] = [f.strip() for f in parts[2:6]] + [""] * (6 - len(parts))
+    aqi: int = _aqi(parts[1].strip(), fields)
+    return Reading(
+        parts[0].strip(),
+        aqi,
+        *(_pollutant(value, aqi, name) for value, name in zip(fields, POLLUTANTS)),
+        False,
+        parts[6].strip() if len(parts) > 6 and parts[6].strip() else received_at or _now(),
+    )
+
+
+# ─────────────────────────────────────────────
+#  Bounded reading queue
+# ─────────────────────────────────────────────
+class ReadingQueue:
+    """Thread-safe FIFO of reading batches, bounded by total readings held."""
+
+    def __init__(self, capacity: int = 200_000) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity: int = capacity
+        self.size: int = 0
+        self._chunks: deque[List[Reading]] = deque()
+        self._cond: threading.Condition = threading.Condition()
+        self.accepted: int = 0
+        self.dropped: int = 0        # readings refused because the queue was full
+        self.rejected: int = 0       # readings the pipeline could not use (unknown ward)
+        self.high_water: int = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def offer(self, rows: Sequence[Reading], drop: bool = True) -> int:
+        """
+        Enqueue as many rows as fit without waiting; returns how many were taken.
+        With drop=True the rest count as dropped, otherwise the caller retries them.
+        """
+        if not rows:
+            return 0
+        with self._cond:
+            taken: int = min(len(rows), self.capacity - self.size)
+            if taken > 0:
+                self._chunks.append(list(rows) if taken == len(rows) else list(rows[:taken]))
+                self.size += taken
+                self.accepted += taken
+                self.high_water = max(self.high_water, self.size)
+                self._cond.notify_all()
+            if drop:
+                self.dropped += len(rows) - taken
+        return taken
+
+    def put(self, rows: Sequence[Reading], timeout: Optional[float] = None) -> int:
+        """Enqueue rows, waiting for room (backpressure); returns rows taken before `timeout`."""
+        deadline: Optional[float] = None if timeout is None else time.monotonic() + timeout
+        done: int = 0
+        while done < len(rows):
+            n: int = self.offer(rows[done:] if done else rows, drop=False)
+            done += n
+            if done == len(rows):
+                break
+            with self._cond:
+                if self.size < self.capacity:
+                    continue
+                remaining: Optional[float] = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return done
+
+    def drain(self, timeout: float = 0.0) -> List[Reading]:
+        """Everything queued, waiting up to `timeout` seconds for the first reading."""
+        with self._cond:
+            if not self.size and timeout > 0:
+                self._cond.wait_for(lambda: self.size > 0, timeout)
+            if not self.size:
+                return []
+            chunks: deque[List[Reading]] = self._chunks
+            self._chunks = deque()
+            self.size = 0
+            self._cond.notify_all()   # wake producers blocked in put()
+        if len(chunks) == 1:
+            return chunks[0]
+        out: List[Reading] = []
+        for chunk in chunks:
+            out.extend(chunk)
+        return out
+
+    def reject(self, count: int) -> None:
+        self.rejected += count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth":      self.size,
+            "capacity":   self.capacity,
+            "high_water": self.high_water,
+            "accepted":   self.accepted,
+            "dropped":    self.dropped,
+            "rejected":   self.rejected,
+        }
+
+
+def iter_window(
+    queue: ReadingQueue,
+    keys: Collection[str],
+    min_s: float,
+    max_s: float,
+) -> Iterator[List[Reading]]:
+    """
+    Yield the chunks of one tumbling window as they arrive. The window
+    closes when every key in `keys` has reported and `min_s` has passed,
+    or when `max_s` has passed.
+    """
+    start: float = time.monotonic()
+    earliest: float = start + min_s
+    deadline: float = start + max_s
+    seen: set[str] = set()
+    complete: bool = False
+    while True:
+        now: float = time.monotonic()
+        if now >= deadline or (complete and now >= earliest):
+            return
+        chunk: List[Reading] = queue.drain((earliest if complete else deadline) - now)
+        if not chunk:
+            continue
+        if not complete:
+            seen.update(r.ward_id for r in chunk)
+            complete = len(seen) >= len(keys) and all(k in seen for k in keys)
+        yield chunk
+
+
+def reading_columns(rows: Sequence[Reading]) -> Dict[str, np.ndarray]:
+    """aqi, pollutant and spike columns of a list of readings."""
+    count: int = len(rows)
+    # Column-at-a-time with map(itemgetter): far cheaper than zip(*rows) on large windows
+    columns: Dict[str, np.ndarray] = {
+        name: np.fromiter(map(itemgetter(field), rows), dtype=np.float64, count=count)
+        for field, name in enumerate(("aqi", *POLLUTANTS), start=1)
+    }
+    columns["spike"] = np.fromiter(map(itemgetter(6), rows), dtype=bool, count=count)
+    return columns
+
+
+def window_batch(
+    rows: Sequence[Reading],
+    index: Mapping[str, int],
+    previous: Dict[str, np.ndarray],
+    tick: int,
+    columns: Optional[Mapping[str, np.ndarray]] = None,
+) -> tuple[Dict[str, Any], int]:
+    """
+    Collapse one window of readings into a columnar batch aligned with
+    `index` (ward id -> position): per-ward mean of each field, spike if any
+    reading was flagged. batch["reported"] marks the wards with a reading in
+    the window and batch["readings"] counts the readings collapsed; the other
+    wards repeat their `previous` values (updated in place), which only stand
+    for their latest state and must not be fed to the transformations again.
+    `columns` (reading_columns() layout, aligned with `rows`) replaces the
+    rows' own values, e.g. with the AQI resolved for concentration-only
+    readings. Returns (batch, unknown).
+    """
+    n: int = len(previous["aqi"])
+    count: int = len(rows)
+    idx: np.ndarray = np.fromiter(map(index.get, map(itemgetter(0), rows), repeat(-1)), dtype=np.int64, count=count)
+    known: np.ndarray = idx >= 0
+    unknown: int = count - int(known.sum())
+    pos: np.ndarray = idx[known] if unknown else idx
+    values: Mapping[str, np.ndarray] = columns if columns is not None else reading_columns(rows)
+
+    def column(name: str) -> np.ndarray:
+        col: np.ndarray = values[name]
+        return col[known] if unknown else col
+
+    counts: np.ndarray = np.bincount(pos, minlength=n)
+    seen: np.ndarray = counts > 0
+    divisor: np.ndarray = np.maximum(counts, 1)
+    batch: Dict[str, Any] = {"tick": tick}
+    for name, digits in (("pm25", 1), ("pm10", 1), ("no2", 1), ("co", 2)):
+        mean: np.ndarray = np.round(np.bincount(pos, weights=column(name), minlength=n) / divisor, digits)
+        previous[name] = np.where(seen, mean, previous[name])
+        batch[name] = previous[name]
+    aqi_mean: np.ndarray = np.rint(np.bincount(pos, weights=column("aqi"), minlength=n) / divisor).astype(np.int64)
+    previous["aqi"] = np.where(seen, aqi_mean, previous["aqi"])
+    batch["aqi"] = previous["aqi"]
+    batch["spike"] = np.bincount(pos, weights=column("spike"), minlength=n) > 0
+    batch["reported"] = seen
+    batch["readings"] = count - unknown
+    return batch, unknown
+
+
+# ─────────────────────────────────────────────
+#  Connectors
+# ─────────────────────────────────────────────
+class Connector(ABC):
+    """A source of readings feeding a ReadingQueue."""
+
+    kind: str = "connector"
+
+    def __init__(self, queue: ReadingQueue) -> None:
+        self.queue: ReadingQueue = queue
+        self.received: int = 0
+        self.parse_errors: int = 0
+        self.errors: int = 0            # failures outside record parsing (the source kept going)
+        self.last_error: Optional[str] = None
+        self.running: bool = False
+        self._thread: Optional[threading.Thread] = None
+
+    def parse_lines(self, lines: Sequence[str]) -> List[Reading]:
+        rows: List[Reading] = []
+        received_at: str = _now()
+        for line in lines:
+            try:
+                reading: Optional[Reading] = parse_line(line, received_at)
+            except (ValueError, KeyError, TypeError, ArithmeticError):
+                self.parse_errors += 1
+                continue
+            if reading is not None:
+                rows.append(reading)
+        self.received += len(rows)
+        return rows
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._main, name=f"ingest-{self.kind}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+
+    @abstractmethod
+    def run(self) -> None:
+        """Pull readings into the queue until `stop()`; runs on the connector's thread."""
+
+    def _main(self) -> None:
+        try:
+            self.run()
+        except Exception as exc:  # noqa: BLE001 - a dead source must show as stopped, not hang as running
+            self.failed(exc)
+        finally:
+            self.running = False
+
+    def failed(self, exc: BaseException) -> None:
+        """Count and log an unexpected error; the caller decides whether to carry on."""
+        self.errors += 1
+        self.last_error = f"{type(exc).__name__}: {exc}"
+        log.error("%s connector: %s", self.kind, self.last_error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind":         self.kind,
+            "running":      self.running,
+            "received":     self.received,
+            "parse_errors": self.parse_errors,
+            "errors":       self.errors,
+            "last_error":   self.last_error,
+        }
+
+
+class SimulatorConnector(Connector):
+    """Synthetic sensors: `generate(tick)` -> one batch of readings every `interval` seconds."""
+
+    kind = "simulator"
+
+    def __init__(self, queue: ReadingQueue, generate: Callable[[int], List[Reading]], interval: float) -> None:
+        super().__init__(queue)
+        self.generate: Callable[[int], List[Reading]] = generate
+        self.interval: float = interval
+        self.tick: int = 0
+
+    def emit(self) -> int:
+        """Queue one batch now; returns the readings taken (the async runtime calls this once per tick)."""
+        rows: List[Reading] = self.generate(self.tick)
+        self.received += len(rows)
+        self.tick += 1
+        return self.queue.offer(rows)
+
+    def run(self) -> None:
+        next_at: float = time.monotonic()
+        while self.running:
+            self.emit()
+            next_at += self.interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+
+
+class FileTailConnector(Connector):
+    """Follows a CSV / line-protocol file like `tail -f`, reopening it after rotation."""
+
+    kind = "file"
+
+    def __init__(self, queue: ReadingQueue, path: str, from_start: bool = False, poll_s: float = 0.2) -> None:
+        super().__init__(queue)
+        self.path: str = path
+        self.from_start: bool = from_start
+        self.poll_s: float = poll_s
+        self.rotations: int = 0
+
+    def run(self) -> None:
+        fh: Any = None
+        inode: int = -1
+        partial: str = ""
+        while self.running:
+            if fh is None:
+                try:
+                    fh = open(self.path, encoding="utf-8", errors="replace")
+                except OSError:
+                    time.sleep(self.poll_s)
+                    continue
+                inode = os.fstat(fh.fileno()).st_ino
+                if not self.from_start and self.rotations == 0:
+                    fh.seek(0, os.SEEK_END)
+            data: str = fh.read(1 << 20)
+            if data:
+                lines: List[str] = (partial + data).split("\n")
+                partial = lines.pop()
+                try:
+                    self.queue.put(self.parse_lines(lines))   # blocks while the queue is full
+                except Exception as exc:  # noqa: BLE001 - skip the chunk, keep following the file
+                    self.failed(exc)
+                continue
+            try:
+                st: os.stat_result = os.stat(self.path)
+                rotated: bool = st.st_ino != inode or st.st_size < fh.tell()
+            except OSError:
+                rotated = True
+            if rotated:
+                fh.close()
+                fh = None
+                partial = ""
+                self.rotations += 1
+            else:
+                time.sleep(self.poll_s)
+        if fh is not None:
+            fh.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "path": self.path, "rotations": self.rotations}
+
+
+class LineServerConnector(Connector):
+    """
+    asyncio line-protocol listener on its own event loop thread. TCP
+    connections are throttled while the queue is full; UDP datagrams
+    (one or more lines each) are dropped instead. Port 0 binds an
+    ephemeral port, -1 disables that transport.
+    """
+
+    kind = "line"
+
+    def __init__(self, queue: ReadingQueue, host: str = "0.0.0.0", tcp_port: int = 0, udp_port: int = 0) -> None:
+        super().__init__(queue)
+        self.host: str = host
+        self.tcp_port: int = tcp_port
+        self.udp_port: int = udp_port
+        self.connections: int = 0
+        self.throttled: int = 0
+        self.ready: threading.Event = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        finally:
+            self._loop.close()
+
+    async def _serve(self) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        server: Optional[asyncio.AbstractServer] = None
+        transport: Optional[asyncio.DatagramTransport] = None
+        if self.tcp_port >= 0:
+            server = await asyncio.start_server(self._handle_tcp, self.host, self.tcp_port, limit=1 << 20)
+            self.tcp_port = server.sockets[0].getsockname()[1]
+        if self.udp_port >= 0:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _LineDatagramProtocol(self), local_addr=(self.host, self.udp_port)
+            )
+            self.udp_port = transport.get_extra_info("sockname")[1]
+        self.ready.set()
+        while self.running:
+            await asyncio.sleep(0.5)
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        if transport is not None:
+            transport.close()
+
+    async def _handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        partial: bytes = b""
+        try:
+            while self.running:
+                data: bytes = await reader.read(1 << 18)
+                if not data:
+                    break
+                lines: List[bytes] = (partial + data).split(b"\n")
+                partial = lines.pop()
+                try:
+                    rows: List[Reading] = self.parse_lines([ln.decode("utf-8", "replace") for ln in lines])
+                except Exception as exc:  # noqa: BLE001 - skip the chunk, keep the connection
+                    self.failed(exc)
+                    continue
+                # Not reading from the socket while the queue is full throttles the sender
+                while rows:
+                    rows = rows[self.queue.offer(rows, drop=False):]
+                    if rows:
+                        self.throttled += 1
+                        await asyncio.sleep(0.005)
+            if partial:
+                self.queue.offer(self.parse_lines([partial.decode("utf-8", "replace")]))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as exc:  # noqa: BLE001 - one connection must not take the listener down
+            self.failed(exc)
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "tcp_port":    self.tcp_port,
+            "udp_port":    self.udp_port,
+            "connections": self.connections,
+            "throttled":   self.throttled,
+        }
+
+
+class _LineDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, connector: LineServerConnector) -> None:
+        self.connector: LineServerConnector = connector
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        lines: List[str] = data.decode("utf-8", "replace").split("\n")
+        try:
+            self.connector.queue.offer(self.connector.parse_lines(lines))
+        except Exception as exc:  # noqa: BLE001 - drop the datagram, keep the endpoint
+            self.connector.failed(exc)
+
+
+class HttpBatchConnector(Connector):
+    """Readings POSTed to /ingest as a JSON array (or {"readings": [...]})."""
+
+    kind = "http"
+
+    def __init__(self, queue: ReadingQueue) -> None:
+        super().__init__(queue)
+        self.running = True
+        self.requests: int = 0
+
+    def start(self) -> None:
+        self.running = True
+
+    def run(self) -> None:
+        """Push-driven: readings arrive through `submit()`, so there is no thread to run."""
+
+    def submit(self, payload: Any) -> Dict[str, int]:
+        """
+        Parse and enqueue one request body; items that fail to parse (including
+        anything that is not a JSON object) are counted as invalid, not fatal.
+        """
+        self.requests += 1
+        items: Any = payload.get("readings") if isinstance(payload, dict) else payload
+        if not isinstance(items, list):
+            raise ValueError('expected a JSON array of readings or {"readings": [...]}')
+        rows: List[Reading] = []
+        errors: int = 0
+        received_at: str = _now()
+        for item in items:
+            try:
+                rows.append(reading_from_mapping(item, received_at))
+            except (ValueError, KeyError, TypeError, ArithmeticError):
+                errors += 1
+        self.received += len(rows)
+        self.parse_errors += errors
+        accepted: int = self.queue.offer(rows)
+        return {"accepted": accepted, "dropped": len(rows) - accepted, "invalid": errors}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "requests": self.requests}
@@ -0,0 +1,296 @@
+"""
+=============================================================================
+  CITY AIR WATCH — PIPELINE METRICS & PROFILER
+=============================================================================
+  Per-stage tick latency, tick scheduling and process gauges, rendered in
+  the Prometheus text exposition format (version 0.0.4) for GET /metrics.
+
+  Stage timings are accumulated while a tick is processed (add()) and
+  observed into fixed-bucket histograms once per tick (end_tick()), so a
+  stage that runs per reading (ward mode) and one that runs per batch
+  (columnar / sharded modes) report the same quantity: seconds spent in
+  that stage for one tick. With metrics disabled every call returns
+  before touching any state.
+
+  SamplingProfiler: a daemon thread snapshots every other thread's stack
+  (sys._current_frames) at a fixed interval and counts identical stacks.
+  stop() writes them in the folded format ("root;...;leaf count") read by
+  flamegraph.pl, speedscope and inferno.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timezone
+from types import FrameType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+# Upper bounds (seconds) shared by every latency histogram; +Inf is implicit
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+INTERVAL_BUCKETS: tuple[float, ...] = (0.5, 1.0, 2.0, 3.0, 4.0, 4.5, 5.0, 5.1, 5.25, 5.5, 6.0, 7.5, 10.0, 20.0)
+
+Sample = tuple[Dict[str, str], float]
+
+
+# ─────────────────────────────────────────────
+#  Exposition helpers
+# ─────────────────────────────────────────────
+def _value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if math.isnan(v):
+        return "NaN"
+    return repr(int(v)) if float(v).is_integer() and abs(v) < 1e15 else repr(float(v))
+
+
+def _labels(labels: Mapping[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped: List[str] = [
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in labels.items()
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+def format_metric(name: str, kind: str, help_text: str, samples: Iterable[Sample]) -> str:
+    """One metric family: HELP / TYPE lines and a sample line per (labels, value)."""
+    lines: List[str] = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {_value(value)}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+# ─────────────────────────────────────────────
+#  Histogram
+# ─────────────────────────────────────────────
+class Histogram:
+    """Fixed-bucket histogram (non-cumulative counts; cumulated on render)."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)   # last slot = +Inf
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: Mapping[str, str]) -> List[tuple[str, Dict[str, str], float]]:
+        out: List[tuple[str, Dict[str, str], float]] = []
+        running: int = 0
+        for bound, n in zip((*self.buckets, math.inf), self.counts):
+            running += n
+            out.append((f"{name}_bucket", {**labels, "le": _value(bound)}, float(running)))
+        out.append((f"{name}_sum", dict(labels), self.sum))
+        out.append((f"{name}_count", dict(labels), float(self.count)))
+        return out
+
+
+def format_histograms(name: str, help_text: str, series: Mapping[str, Histogram], label: str) -> str:
+    """A histogram family with one series per label value."""
+    lines: List[str] = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, hist in series.items():
+        for sample_name, labels, value in hist.samples(name, {label: key} if label else {}):
+            lines.append(f"{sample_name}{_labels(labels)} {_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ─────────────────────────────────────────────
+#  Registry
+# ─────────────────────────────────────────────
+class PipelineMetrics:
+    """Per-tick stage latency, tick duration and schedule drift."""
+
+    def __init__(self, tick_interval_s: float, enabled: bool = True) -> None:
+        self.enabled: bool = enabled
+        self.tick_interval_s: float = tick_interval_s
+        self.stages: Dict[str, Histogram] = {}
+        self.tick_duration: Histogram = Histogram()
+        self.tick_interval: Histogram = Histogram(INTERVAL_BUCKETS)
+        self.ticks: int = 0
+        self.last_duration_s: float = 0.0
+        self.last_drift_s: float = 0.0
+        self.skipped: int = 0                  # schedule slots a late tick ran over (async runtime)
+        self._pending: Dict[str, float] = {}   # stage -> seconds in the tick being processed
+        self._last_tick_at: Optional[float] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Charge `seconds` to a stage of the current tick."""
+        if not self.enabled:
+            return
+        pending: Dict[str, float] = self._pending
+        pending[stage] = pending.get(stage, 0.0) + seconds
+
+    def add_all(self, timings: Mapping[str, float]) -> None:
+        if not self.enabled:
+            return
+        for stage, seconds in timings.items():
+            self.add(stage, seconds)
+
+    def end_tick(self, busy_s: float) -> None:
+        """
+        Close the current tick: observe its stage totals, its processing time
+        (busy_s) and the interval since the previous tick; drift is that
+        interval minus the nominal tick period.
+        """
+        if not self.enabled:
+            return
+        now: float = time.monotonic()
+        pending: Dict[str, float] = self._pending
+        self._pending = {}
+        with self._lock:
+            for stage, seconds in pending.items():
+                hist: Optional[Histogram] = self.stages.get(stage)
+                if hist is None:
+                    hist = self.stages[stage] = Histogram()
+                hist.observe(seconds)
+            self.tick_duration.observe(busy_s)
+            if self._last_tick_at is not None:
+                interval: float = now - self._last_tick_at
+                self.tick_interval.observe(interval)
+                self.last_drift_s = interval - self.tick_interval_s
+            self._last_tick_at = now
+            self.last_duration_s = busy_s
+            self.ticks += 1
+
+    def skip(self, slots: int) -> None:
+        """Count tick slots dropped because the previous tick overran them."""
+        with self._lock:
+            self.skipped += slots
+
+    def render(self) -> str:
+        with self._lock:
+            return "".join((
+                format_histograms(
+                    "pathway_stage_seconds", "Time spent in each pipeline stage per tick.",
+                    dict(sorted(self.stages.items())), "stage",
+                ),
+                format_histograms(
+                    "pathway_tick_duration_seconds", "Processing time of one tick (ingest to broadcast).",
+                    {"": self.tick_duration}, "",
+                ),
+                format_histograms(
+                    "pathway_tick_interval_seconds", "Wall time between consecutive ticks.",
+                    {"": self.tick_interval}, "",
+                ),
+                format_metric(
+                    "pathway_tick_drift_seconds", "gauge",
+                    f"Last tick interval minus the {self.tick_interval_s:g}s schedule.",
+                    [({}, self.last_drift_s)],
+                ),
+                format_metric("pathway_ticks_total", "counter", "Ticks emitted.", [({}, float(self.ticks))]),
+                format_metric(
+                    "pathway_tick_slots_skipped_total", "counter",
+                    "Schedule slots skipped because a tick overran them.", [({}, float(self.skipped))],
+                ),
+            ))
+
+
+# ─────────────────────────────────────────────
+#  Process gauges
+# ─────────────────────────────────────────────
+PAGE_SIZE: int = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size of a process (Linux /proc), None where unavailable."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+# ─────────────────────────────────────────────
+#  Sampling profiler
+# ─────────────────────────────────────────────
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack every interval_s into folded-stack counts."""
+
+    def __init__(self, out_dir: str) -> None:
+        self.out_dir: str = out_dir
+        self.interval_s: float = 0.005
+        self.stacks: Counter[str] = Counter()
+        self.samples: int = 0
+        self.started_at: Optional[str] = None
+        self.last_file: Optional[str] = None
+        self._stop: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_s: float = 0.005) -> None:
+        if self.running:
+            raise RuntimeError("profiler already running")
+        self.interval_s = max(interval_s, 0.001)
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pathway-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        own: int = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval_s):
+            frames: Dict[int, FrameType] = sys._current_frames()
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack: List[str] = []
+                f: Optional[FrameType] = frame
+                while f is not None:
+                    stack.append(_frame_label(f))
+                    f = f.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop sampling and write the folded stacks; returns where and how much."""
+        if not self.running:
+            raise RuntimeError("profiler is not running")
+        self._stop.set()
+        assert self._thread is not None
+        self._thread.join()
+        self._thread = None
+        os.makedirs(self.out_dir, exist_ok=True)
+        path: str = os.path.join(self.out_dir, f"pathway-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(path, "w", encoding="utf-8") as fh:
+            for stack, count in self.stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+        self.last_file = path
+        return {"file": path, **self.status()}
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running":     self.running,
+            "interval_ms": round(self.interval_s * 1000.0, 3),  # type: ignore[call-overload]
+            "started_at":  self.started_at,
+            "samples":     self.samples,
+            "stacks":      len(self.stacks),
+            "last_file":   self.last_file,
+        }
@@ -3,7 +3,8 @@
   CITY AIR WATCH — PATHWAY REAL-TIME STREAMING ENGINE
 =============================================================================
   Architecture:
-  1. Ingestion Layer  : Simulated AQI sensor stream (5-second updates)
+  1. Ingestion Layer  : Connectors (simulator, TCP/UDP, file tail, HTTP)
+                       feeding a bounded queue, read in tumbling windows
   2. Streaming Engine : Rolling average, spike detection, threshold alerts
   3. AI Layer         : LLM xPack context + Document Store for RAG
   4. Output Layer     : FastAPI REST + SSE endpoint -> Node.js -> Frontend
@@ -13,20 +14,65 @@
 from __future__ import annotations
 
 import asyncio
+import atexit
 import json
+import logging
 import math
+import os
 import random
 import threading
 import time
 from collections import defaultdict, deque
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Sequence
-
-from fastapi import FastAPI  # type: ignore[import-untyped]
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
+from operator import itemgetter
+from typing import Any, AsyncIterator, Callable, Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+from fastapi import FastAPI, Query, Request  # type: ignore[import-untyped]
 from fastapi.middleware.cors import CORSMiddleware  # type: ignore[import-untyped]
-from fastapi.responses import StreamingResponse  # type: ignore[import-untyped]
+from fastapi.responses import JSONResponse, Response, StreamingResponse  # type: ignore[import-untyped]
 import uvicorn  # type: ignore[import-untyped]
 
+from alerts import RAISING, AlertLifecycle, AlertStore
+from columnar import ColumnarEngine, build_ward_rows, generate_aqi_batch
+from console import BufferedConsole, console_handler, console_logger
+from delta import DeltaEncoder, snapshot_event
+from doc_index import DocumentIndex, build_document_index
+from event_time import EventTimeWindows, event_times
+from fanout import FanoutHub, Subscriber, encode_sse, splice_json
+from forecast import ForecastModel
+from history import HistoryStore
+from pubsub import TOPIC_STATE, TOPIC_TICK, TickPublisher, TickSubscriber
+from metrics import PipelineMetrics, SamplingProfiler, format_metric, process_rss_bytes
+from ingest import (
+    Connector,
+    FileTailConnector,
+    HttpBatchConnector,
+    LineServerConnector,
+    NO_AQI,
+    POLLUTANT_RATIOS,
+    POLLUTANTS,
+    Reading,
+    ReadingQueue,
+    SimulatorConnector,
+    iter_window,
+    reading_columns,
+    reading_from_mapping,
+    window_batch,
+)
+from replay import Clock, Recorder, Replay, ReplayClock
+from shards import ShardPool
+from spatial import SpatialIndex
+from sub_index import AVERAGING_HOURS, SubIndexEngine
+from topics import Projection, StreamFilter, TopicRouter, parse_filter
+from window_state import WindowState
+
+# One window of reading chunks -> the tick it produced (None: nothing usable in it)
+TickStep = Callable[[Iterable[List[Reading]]], Optional[Dict[str, Any]]]
+
 # ─────────────────────────────────────────────
 #  DOCUMENT STORE  (Simulated Pathway Doc Store)
 #  Stores WHO guidelines, Govt rules, advisories
@@ -60,74 +106,293 @@ DOCUMENT_STORE: Dict[str, Any] = {
 #  WARD CONFIGURATION
 # ─────────────────────────────────────────────
 WARDS: List[Dict[str, Any]] = [
-    {"id": "ward_1", "name": "Ward 1 - Central",    "base_aqi": 85,  "type": "residential"},
-    {"id": "ward_2", "name": "Ward 2 - North",       "base_aqi": 45,  "type": "park"},
-    {"id": "ward_3", "name": "Ward 3 - Traffic Hub", "base_aqi": 156, "type": "traffic"},
-    {"id": "ward_4", "name": "Ward 4 - East",        "base_aqi": 120, "type": "mixed"},
-    {"id": "ward_5", "name": "Ward 5 - West",        "base_aqi": 98,  "type": "commercial"},
-    {"id": "ward_6", "name": "Ward 6 - Industrial",  "base_aqi": 210, "type": "industrial"},
-    {"id": "ward_7", "name": "Ward 7 - South",       "base_aqi": 112, "type": "residential"},
-    {"id": "ward_8", "name": "Ward 8 - Market Area", "base_aqi": 145, "type": "commercial"},
+    {"id": "ward_1", "name": "Ward 1 - Central",    "base_aqi": 85,  "type": "residential", "lat": 28.6139, "lon": 77.2090},
+    {"id": "ward_2", "name": "Ward 2 - North",       "base_aqi": 45,  "type": "park",        "lat": 28.7041, "lon": 77.1025},
+    {"id": "ward_3", "name": "Ward 3 - Traffic Hub", "base_aqi": 156, "type": "traffic",     "lat": 28.5245, "lon": 77.1855},
+    {"id": "ward_4", "name": "Ward 4 - East",        "base_aqi": 120, "type": "mixed",       "lat": 28.6139, "lon": 77.3156},
+    {"id": "ward_5", "name": "Ward 5 - West",        "base_aqi": 98,  "type": "commercial",  "lat": 28.6139, "lon": 77.1025},
+    {"id": "ward_6", "name": "Ward 6 - Industrial",  "base_aqi": 210, "type": "industrial",  "lat": 28.7041, "lon": 77.3156},
+    {"id": "ward_7", "name": "Ward 7 - South",       "base_aqi": 112, "type": "residential", "lat": 28.5355, "lon": 77.2500},
+    {"id": "ward_8", "name": "Ward 8 - Market Area", "base_aqi": 145, "type": "commercial",  "lat": 28.5939, "lon": 77.2090},
+]
+
+
+def build_ward_grid(count: int) -> List[Dict[str, Any]]:
+    """
+    Synthetic city grid: repeats the 8 ward profiles above out to `count` sensors,
+    placed on a jittered lattice over the area the real wards span.
+    Used for large-grid runs (PATHWAY_WARDS) and the benchmark harness.
+    """
+    lats: List[float] = [float(w["lat"]) for w in WARDS]
+    lons: List[float] = [float(w["lon"]) for w in WARDS]
+    side: int = max(math.ceil(math.sqrt(count)), 1)
+    step_lat: float = (max(lats) - min(lats)) / side
+    step_lon: float = (max(lons) - min(lons)) / side
+    jitter: np.ndarray = np.random.default_rng(count).uniform(0.1, 0.9, size=(count, 2))
+    grid: List[Dict[str, Any]] = []
+    for i in range(count):
+        template: Dict[str, Any] = WARDS[i % len(WARDS)]
+        area: str = str(template["name"]).split(" - ", 1)[1]
+        grid.append({
+            "id":       f"ward_{i + 1}",
+            "name":     f"Ward {i + 1} - {area}",
+            "base_aqi": template["base_aqi"],
+            "type":     template["type"],
+            "lat":      round(min(lats) + (i // side + float(jitter[i, 0])) * step_lat, 6),  # type: ignore[call-overload]
+            "lon":      round(min(lons) + (i % side + float(jitter[i, 1])) * step_lon, 6),  # type: ignore[call-overload]
+        })
+    return grid
+
+
+# ─────────────────────────────────────────────
+#  ENGINE CONFIGURATION
+#  PATHWAY_ENGINE_MODE: "ward" (per-ward loop) | "columnar" (batched NumPy)
+#                       | "sharded" (columnar ticks in PATHWAY_SHARDS worker processes)
+#  PATHWAY_WARDS      : grid size; > 8 extends WARDS with synthetic sensors
+#  PATHWAY_JOURNAL_TICKS: encoded ticks kept for Last-Event-ID replay
+#  PATHWAY_SSE_PROJECTIONS: distinct /stream?wards=&topics= filters served at once
+#  PATHWAY_DOCSTORE_FILE: JSON Document Store loaded at start / on reload
+#  PATHWAY_DOCS_DIR   : advisory documents (.txt/.md/.json) for the vector index
+#  PATHWAY_INGEST     : connectors to start: simulator,tcp,udp,file (HTTP is always on)
+#  PATHWAY_INGEST_QUEUE / _TCP_PORT / _UDP_PORT / _FILE: connector settings
+#  PATHWAY_WATERMARK_DELAY_S / PATHWAY_ALLOWED_LATENESS_S: event-time windows
+#  PATHWAY_MAX_EVENT_SKEW_S: readings stamped further ahead of the engine clock are rejected
+#  PATHWAY_HISTORY_DIR: reading history segments ("" disables); PATHWAY_HISTORY_DAYS
+#  PATHWAY_SUBINDEX_MIN_COVERAGE / _MIN_POLLUTANTS: CPCB AQI from concentrations: share
+#                       of an averaging period that needs data (CPCB: 0.67 = 16 of 24 h),
+#                       pollutants that need a sub-index (one of them PM2.5 / PM10)
+#  PATHWAY_RUNTIME    : "thread" (pipeline in a daemon thread) | "async" (a task on the
+#                       server's event loop, ticks on a fixed schedule)
+#  PATHWAY_EXECUTOR   : async runtime: "thread" (tick compute on a worker thread) | "inline"
+#  PATHWAY_LOG_LEVEL  : console log level; lines are written by a background thread
+#  PATHWAY_PUBSUB     : Unix socket path; the engine publishes every tick on it (pubsub.py)
+#  PATHWAY_ROLE       : "engine" (compute + serve) | "worker" (serve the ticks subscribed
+#                       from PATHWAY_PUBSUB; run as many as needed, see PATHWAY_WORKERS)
+#  PATHWAY_PORT / PATHWAY_WORKERS: listen port / uvicorn worker processes (worker role)
+# ─────────────────────────────────────────────
+ENGINE_MODE: str = os.environ.get("PATHWAY_ENGINE_MODE", "ward").lower()
+RUNTIME: str = os.environ.get("PATHWAY_RUNTIME", "thread").lower()
+TICK_EXECUTOR: str = os.environ.get("PATHWAY_EXECUTOR", "thread").lower()
+LOG_LEVEL: str = os.environ.get("PATHWAY_LOG_LEVEL", "INFO").upper()
+PUBSUB_PATH: str = os.environ.get("PATHWAY_PUBSUB", "")
+ROLE: str = os.environ.get("PATHWAY_ROLE", "engine").lower()
+PORT: int = int(os.environ.get("PATHWAY_PORT", "5000"))
+WORKERS: int = int(os.environ.get("PATHWAY_WORKERS", "1"))
+SHARD_COUNT: int = int(os.environ.get("PATHWAY_SHARDS", str(min(4, os.cpu_count() or 1))))
+WARD_COUNT: int = int(os.environ.get("PATHWAY_WARDS", str(len(WARDS))))
+if WARD_COUNT != len(WARDS):
+    WARDS = build_ward_grid(WARD_COUNT)
+JOURNAL_TICKS: int = int(os.environ.get("PATHWAY_JOURNAL_TICKS", "120"))
+SSE_PROJECTIONS: int = int(os.environ.get("PATHWAY_SSE_PROJECTIONS", "1000"))
+DOCSTORE_FILE: str = os.environ.get("PATHWAY_DOCSTORE_FILE", "")
+DOCS_DIR: str = os.environ.get("PATHWAY_DOCS_DIR", "")
+RAG_TOP_K: int = 3             # passages retrieved per ward per tick
+INGEST_SOURCES: List[str] = [
+    s.strip() for s in os.environ.get("PATHWAY_INGEST", "simulator").lower().split(",") if s.strip()
+]
+INGEST_QUEUE_SIZE: int = int(os.environ.get("PATHWAY_INGEST_QUEUE", "200000"))
+INGEST_TCP_PORT: int = int(os.environ.get("PATHWAY_INGEST_TCP_PORT", "5010"))
+INGEST_UDP_PORT: int = int(os.environ.get("PATHWAY_INGEST_UDP_PORT", "5011"))
+INGEST_FILE: str = os.environ.get("PATHWAY_INGEST_FILE", "")
+WATERMARK_DELAY_S: float = float(os.environ.get("PATHWAY_WATERMARK_DELAY_S", "10"))
+ALLOWED_LATENESS_S: float = float(os.environ.get("PATHWAY_ALLOWED_LATENESS_S", "120"))
+MAX_EVENT_SKEW_S: float = float(os.environ.get("PATHWAY_MAX_EVENT_SKEW_S", "300"))
+HISTORY_DIR: str = os.environ.get(
+    "PATHWAY_HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "history")
+)
+HISTORY_DAYS: int = int(os.environ.get("PATHWAY_HISTORY_DAYS", "30"))
+SUBINDEX_MIN_COVERAGE: float = float(os.environ.get("PATHWAY_SUBINDEX_MIN_COVERAGE", "0"))
+SUBINDEX_MIN_POLLUTANTS: int = int(os.environ.get("PATHWAY_SUBINDEX_MIN_POLLUTANTS", "3"))
+SEED: Optional[int] = int(os.environ["PATHWAY_SEED"]) if os.environ.get("PATHWAY_SEED") else None
+REPLAY_FILE: str = os.environ.get("PATHWAY_REPLAY", "")
+RECORD_FILE: str = os.environ.get("PATHWAY_RECORD", "")
+METRICS_ENABLED: bool = os.environ.get("PATHWAY_METRICS", "1").lower() not in ("0", "false", "no", "off")
+PROFILE_DIR: str = os.environ.get(
+    "PATHWAY_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles")
+)
+# Alert lifecycle: an alert holds its level until the AQI falls this far below
+# the threshold for ALERT_CLEAR_DWELL_S; a ward re-alerting within
+# ALERT_DEDUP_S of resolving reopens its previous alert instead of a new one.
+ALERT_HYSTERESIS_AQI: float = float(os.environ.get("PATHWAY_ALERT_HYSTERESIS", "15"))
+ALERT_RAISE_DWELL_S: float = float(os.environ.get("PATHWAY_ALERT_RAISE_DWELL_S", "0"))
+ALERT_CLEAR_DWELL_S: float = float(os.environ.get("PATHWAY_ALERT_CLEAR_DWELL_S", "30"))
+ALERT_DEDUP_S: float = float(os.environ.get("PATHWAY_ALERT_DEDUP_S", "300"))
+METRICS_MAX_CLIENTS: int = 100  # per-client SSE depth series exported (deepest first)
+
+ROLLING_WINDOW: int = 20       # samples in the rolling-average window
+SPIKE_WINDOW: int = 5          # recent samples the spike detector compares against
+SPIKE_MIN_HISTORY: int = 3     # samples required before spikes are flagged
+SPIKE_RATIO: float = 1.30      # spike = current AQI > 130% of recent average
+CRITICAL_AQI: int = 150        # wards above this count as critical in the summary
+SPATIAL_K: int = 6             # nearest wards aggregated per ward
+SPATIAL_NEIGHBOUR_M: float = 12000.0   # farther "nearest" wards are not neighbours
+SPATIAL_RISE_RATIO: float = 1.10       # a neighbour is rising above 110% of its rolling average
+SPATIAL_CORROBORATION: float = 0.5     # a spike is regional when this share of neighbours rises too
+# Forecast horizons (seconds ahead), all wards updated in one pass per tick
+FORECAST_HORIZONS: Dict[str, float] = {"1h": 3600.0, "3h": 3 * 3600.0, "6h": 6 * 3600.0}
+TICK_INTERVAL_S: float = 5.0   # longest tumbling window (and simulator period)
+MIN_TICK_S: float = 1.0        # a window closes early once every ward reported, not before this
+# Incremental windows kept per ward (in samples). "spike" and "rolling" drive the
+# transformations; the rest are reported. A ward may override sizes with a
+# "windows" entry in its config; a size of 0 drops that window.
+WINDOW_SIZES: Dict[str, int] = {
+    "spike":   SPIKE_WINDOW,
+    "rolling": ROLLING_WINDOW,
+    "avg_1h":  int(3600 / TICK_INTERVAL_S),
+    "avg_24h": int(86400 / TICK_INTERVAL_S),
+}
+# Event-time windows over the readings' own timestamps: name -> (size_s, slide_s)
+EVENT_WINDOWS: Dict[str, tuple[float, float]] = {
+    "tumbling_1m": (60.0, 60.0),
+    "sliding_5m":  (300.0, 60.0),
+}
+ALERT_THRESHOLDS: List[tuple[int, str, str, str]] = [
+    (300, "EMERGENCY", "🚨", "Immediate action required. Industrial halt mandatory."),
+    (200, "CRITICAL",  "🔴", "High pollution. Vulnerable groups must stay indoors."),
+    (150, "WARNING",   "🟠", "Elevated AQI. Limit outdoor activities."),
 ]
 
 # ─────────────────────────────────────────────
 #  IN-MEMORY STREAMING STATE
 # ─────────────────────────────────────────────
-aqi_history: Dict[str, deque[Dict[str, Any]]] = defaultdict(lambda: deque(maxlen=20))
+aqi_history: Dict[str, deque[Dict[str, Any]]] = defaultdict(lambda: deque(maxlen=ROLLING_WINDOW))
+window_states: Dict[str, WindowState] = {}
 stream_events: deque[Dict[str, Any]] = deque(maxlen=500)
 latest_readings: Dict[str, Dict[str, Any]] = {}
-active_alerts: Dict[str, Dict[str, Any]] = {}
-stream_listeners: List[asyncio.Queue[str]] = []
-stream_lock: threading.Lock = threading.Lock()
+alert_store: AlertStore = AlertStore()
+alert_lifecycle: Optional[AlertLifecycle] = None   # ward mode; columnar / sharded hold their own
+tick_transitions: List[Dict[str, Any]] = []        # alert transitions of the tick being processed
+tick_spikes: List[Dict[str, Any]] = []             # spikes of the tick being processed (for corroboration)
+tick_corroborations: List[Dict[str, Any]] = []     # their regional / local verdicts, drained by emit_tick()
+spatial_index: Optional[SpatialIndex] = None
+# Neighbourhood aggregates of the last tick (arrays aligned with WARDS); replaced per tick
+spatial_state: Dict[str, Any] = {}
+forecast_model: Optional[ForecastModel] = None
+# Forecasts of the last tick (arrays aligned with WARDS); replaced per tick
+forecast_state: Dict[str, Any] = {}
+sub_index_engine: Optional[SubIndexEngine] = None
+# CPCB averages / sub-indices / AQI of the last tick (arrays aligned with WARDS); replaced per tick
+sub_index_state: Dict[str, Any] = {}
+stream_hub: FanoutHub = FanoutHub(max_pending=100, heartbeat_s=3.0, journal_frames=JOURNAL_TICKS)
+delta_hub: FanoutHub = FanoutHub(max_pending=100, heartbeat_s=3.0, journal_frames=JOURNAL_TICKS)
+# Filtered /stream clients: one hub per distinct wards= / topics= projection
+topic_router: TopicRouter = TopicRouter(
+    lambda: FanoutHub(max_pending=100, heartbeat_s=3.0, journal_frames=JOURNAL_TICKS),
+    idle_ticks=JOURNAL_TICKS, max_projections=SSE_PROJECTIONS,
+)
+delta_encoder: DeltaEncoder = DeltaEncoder()
+delta_snapshot_cache: Dict[str, Any] = {"seq": -1, "frame": b""}
+# State of the last tick for the polling endpoints; replaced (never mutated) per tick
+engine_state: Dict[str, Any] = {}
+poll_snapshot: Dict[str, Any] = {"etag": "", "event": None, "bodies": {}, "wards_json": None, "alerts": []}
+tick_publisher: Optional[TickPublisher] = None     # engine with PATHWAY_PUBSUB
+tick_subscriber: Optional[TickSubscriber] = None   # PATHWAY_ROLE=worker
+relayed_alerts_version: int = -1                   # worker: engine alert store version alert_store mirrors
+ingest_queue: ReadingQueue = ReadingQueue(INGEST_QUEUE_SIZE)
+http_connector: HttpBatchConnector = HttpBatchConnector(ingest_queue)
+connectors: List[Connector] = [http_connector]
+event_windows: List[EventTimeWindows] = []
+event_window_latest: Dict[str, Dict[str, Any]] = {}     # ward_id -> window name -> last result
+event_window_log: deque[Dict[str, Any]] = deque(maxlen=100)
+ward_event_clock: np.ndarray = np.empty(0)                # newest event time processed per ward
+history_store: Optional[HistoryStore] = HistoryStore(HISTORY_DIR, retention_days=HISTORY_DAYS) if HISTORY_DIR else None
+shard_pool: Optional[ShardPool] = None
+# Time and randomness seen by the engine; replay swaps in a virtual clock
+clock: Clock = ReplayClock() if REPLAY_FILE else Clock()
+sim_random: random.Random = random.Random(SEED)
+replay: Optional[Replay] = Replay(REPLAY_FILE, clock, TICK_INTERVAL_S) if isinstance(clock, ReplayClock) else None
+recorder: Optional[Recorder] = Recorder(RECORD_FILE) if RECORD_FILE and replay is None else None
+pipeline_metrics: PipelineMetrics = PipelineMetrics(TICK_INTERVAL_S, METRICS_ENABLED)
+log: logging.Logger = console_logger("pathway", LOG_LEVEL)
+profiler: SamplingProfiler = SamplingProfiler(PROFILE_DIR)
 event_counter: int = 0
 pipeline_stats: Dict[str, int | str] = {
     "total_events": 0,
     "spikes_detected": 0,
     "alerts_triggered": 0,
     "windows_processed": 0,
+    "late_readings": 0,
+    "future_readings": 0,
 }
 PIPELINE_STARTED_AT: str = datetime.now(timezone.utc).isoformat()
 
 
+def reset_pipeline_state() -> None:
+    """Clear all streaming state (benchmark / replay runs); stops a shard pool."""
+    global event_counter, latest_readings, shard_pool, delta_encoder, alert_store, alert_lifecycle  # noqa: PLW0603
+    global spatial_index, spatial_state, forecast_model, forecast_state, engine_state  # noqa: PLW0603
+    global sub_index_engine, sub_index_state  # noqa: PLW0603
+    if shard_pool is not None:
+        shard_pool.close()
+        shard_pool = None
+        latest_readings = {}
+    aqi_history.clear()
+    window_states.clear()
+    stream_events.clear()
+    latest_readings.clear()
+    alert_store = AlertStore()
+    alert_lifecycle = None
+    tick_transitions.clear()
+    tick_spikes.clear()
+    tick_corroborations.clear()
+    spatial_index = None
+    spatial_state = {}
+    forecast_model = None
+    forecast_state = {}
+    sub_index_engine = None
+    sub_index_state = {}
+    engine_state = {}
+    event_windows.clear()
+    event_window_latest.clear()
+    event_window_log.clear()
+    ward_event_clock.fill(-math.inf)
+    delta_encoder = DeltaEncoder()
+    event_counter = 0
+    for key in ("total_events", "spikes_detected", "alerts_triggered", "windows_processed", "late_readings", "future_readings"):
+        pipeline_stats[key] = 0
+
+
 # ─────────────────────────────────────────────
 #  PATHWAY STREAMING ENGINE
 #  Step 1: AQI Stream Generator (Ingestion Layer)
 # ─────────────────────────────────────────────
+def time_of_day_factor(hour: int) -> float:
+    """Time-of-day variation (morning/evening rush hours are worse)."""
+    if 7 <= hour <= 9:
+        return 1.25
+    if 17 <= hour <= 20:
+        return 1.20
+    if 0 <= hour <= 5:
+        return 0.75
+    return 1.0
+
+
 def generate_aqi_reading(ward: Dict[str, Any], tick: int) -> Dict[str, Any]:
     """
     Simulates a Pathway connector streaming AQI sensor data.
     Uses sinusoidal pattern + random noise + spikes to mimic real air quality variations.
     """
     base: int = int(ward["base_aqi"])
-    hour: int = datetime.now().hour
-
-    # Time-of-day variation (morning/evening rush hours are worse)
-    time_factor: float = 1.0
-    if 7 <= hour <= 9:
-        time_factor = 1.25
-    elif 17 <= hour <= 20:
-        time_factor = 1.20
-    elif 0 <= hour <= 5:
-        time_factor = 0.75
+    time_factor: float = time_of_day_factor(clock.local_hour())
 
     # Sinusoidal drift + random noise
     drift: float = math.sin(tick * 0.3) * 12.0
-    noise: float = float(random.gauss(0, 8))
+    noise: float = float(sim_random.gauss(0, 8))
     aqi_val: int = int(float(base) * time_factor + drift + noise)
     aqi_val = max(10, min(500, aqi_val))
 
     # Random spike event (5% chance for industrial/traffic wards)
     spike: bool = False
-    if ward["type"] in ("industrial", "traffic") and random.random() < 0.05:
-        aqi_val += random.randint(40, 80)
+    if ward["type"] in ("industrial", "traffic") and sim_random.random() < 0.05:
+        aqi_val += sim_random.randint(40, 80)
         aqi_val = min(500, aqi_val)
         spike = True
 
     # Derived pollutants — explicit float() so Pylance resolves round() overload
-    pm25: float = round(float(aqi_val) * 0.6 + float(random.gauss(0, 3)), 1)  # type: ignore[call-overload]
-    pm10: float = round(float(aqi_val) * 0.9 + float(random.gauss(0, 5)), 1)  # type: ignore[call-overload]
-    no2: float = round(float(aqi_val) * 0.3 + float(random.gauss(0, 2)), 1)  # type: ignore[call-overload]
-    co: float = round(float(aqi_val) * 0.02 + float(random.gauss(0, 0.5)), 2)  # type: ignore[call-overload]
+    pm25: float = round(float(aqi_val) * 0.6 + float(sim_random.gauss(0, 3)), 1)  # type: ignore[call-overload]
+    pm10: float = round(float(aqi_val) * 0.9 + float(sim_random.gauss(0, 5)), 1)  # type: ignore[call-overload]
+    no2: float = round(float(aqi_val) * 0.3 + float(sim_random.gauss(0, 2)), 1)  # type: ignore[call-overload]
+    co: float = round(float(aqi_val) * 0.02 + float(sim_random.gauss(0, 0.5)), 2)  # type: ignore[call-overload]
 
     return {
         "ward_id":   ward["id"],
@@ -139,7 +404,128 @@ def generate_aqi_reading(ward: Dict[str, Any], tick: int) -> Dict[str, Any]:
         "no2":       no2,
         "co":        co,
         "spike":     spike,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": clock.iso(),
+        "_tick":     tick,
+    }
+
+
+def simulated_readings(tick: int) -> List[Reading]:
+    """One simulator batch: a reading per ward (per-ward generator)."""
+    return [reading_from_mapping(generate_aqi_reading(ward, tick)) for ward in WARDS]
+
+
+def simulated_batch_readings(rng: np.random.Generator, spike_rate: float = 0.05) -> Any:
+    """Batch simulator for large grids (vectorized generator); returns generate(tick)."""
+    ward_ids: List[str] = [str(w["id"]) for w in WARDS]
+    base_aqi: np.ndarray = np.array([int(w["base_aqi"]) for w in WARDS], dtype=np.int64)
+    spike_prone: np.ndarray = np.array([w["type"] in ("industrial", "traffic") for w in WARDS])
+
+    def generate(tick: int) -> List[Reading]:
+        batch: Dict[str, Any] = generate_aqi_batch(
+            base_aqi, spike_prone, tick, time_of_day_factor(clock.local_hour()), rng, spike_rate
+        )
+        timestamp: str = clock.iso()
+        return [
+            Reading(wid, aqi, pm25, pm10, no2, co, spike, timestamp)
+            for wid, aqi, pm25, pm10, no2, co, spike in zip(
+                ward_ids, batch["aqi"].tolist(), batch["pm25"].tolist(), batch["pm10"].tolist(),
+                batch["no2"].tolist(), batch["co"].tolist(), batch["spike"].tolist(),
+            )
+        ]
+    return generate
+
+
+def start_connectors(threaded_simulator: bool = True) -> Optional[SimulatorConnector]:
+    """
+    Start the connectors listed in PATHWAY_INGEST (the HTTP batch connector is
+    always on). threaded_simulator=False leaves the simulator to its caller,
+    which emits a batch per tick; it is returned.
+    """
+    simulator: Optional[SimulatorConnector] = None
+    for source in INGEST_SOURCES:
+        connector: Connector
+        if source == "simulator":
+            generate = simulated_batch_readings(np.random.default_rng(SEED)) if ENGINE_MODE == "columnar" else simulated_readings
+            connector = SimulatorConnector(ingest_queue, generate, TICK_INTERVAL_S)
+        elif source in ("tcp", "udp"):
+            if any(isinstance(c, LineServerConnector) for c in connectors):
+                continue
+            connector = LineServerConnector(
+                ingest_queue,
+                tcp_port=INGEST_TCP_PORT if "tcp" in INGEST_SOURCES else -1,
+                udp_port=INGEST_UDP_PORT if "udp" in INGEST_SOURCES else -1,
+            )
+        elif source == "file":
+            if not INGEST_FILE:
+                log.warning("[Pathway Ingest] 'file' connector needs PATHWAY_INGEST_FILE, skipped")
+                continue
+            connector = FileTailConnector(ingest_queue, INGEST_FILE)
+        else:
+            log.warning("[Pathway Ingest] Unknown connector '%s', skipped", source)
+            continue
+        if isinstance(connector, SimulatorConnector) and not threaded_simulator:
+            connector.running = True
+            simulator = connector
+        else:
+            connector.start()
+        connectors.append(connector)
+        log.info("[Pathway Ingest] %s connector started", connector.kind)
+    return simulator
+
+
+def replay_windows() -> Iterator[Iterable[List[Reading]]]:
+    """PATHWAY_REPLAY: the recording's windows back to back, then a summary line."""
+    assert replay is not None
+    log.info("[Pathway Replay] Replaying %s...", replay.path)
+    yield from replay.windows()
+    stats: Dict[str, Any] = replay.stats()
+    log.info(
+        "[Pathway Replay] Done: %d ticks in %.2fs | spikes=%d alerts=%d | digest=%s",
+        stats["ticks"], stats["wall_s"], stats["spikes"], stats["alerts"], stats["digest"][:16],
+    )
+
+
+def reading_windows(keys: Collection[str]) -> Iterator[Iterable[List[Reading]]]:
+    """
+    The pipelines' input: one iterable of reading chunks per tumbling window.
+    Live connectors by default (teed to PATHWAY_RECORD if set); with
+    PATHWAY_REPLAY the recording's windows back to back, then it ends.
+    """
+    if replay is not None:
+        yield from replay_windows()
+        return
+    start_connectors()
+    while True:
+        window: Iterator[List[Reading]] = iter_window(ingest_queue, keys, MIN_TICK_S, TICK_INTERVAL_S)
+        yield window if recorder is None else recorder.tee(window, clock)
+
+
+def scheduled_windows(simulator: Optional[SimulatorConnector]) -> Iterator[Iterable[List[Reading]]]:
+    """
+    Async runtime input: the caller paces the ticks, so each window is what
+    the queue holds when it is pulled (after the simulator's batch for the tick).
+    """
+    while True:
+        if simulator is not None:
+            simulator.emit()
+        chunk: List[Reading] = ingest_queue.drain()
+        window: List[List[Reading]] = [chunk] if chunk else []
+        yield window if recorder is None else recorder.tee(window, clock)
+
+
+def reading_row(ward: Dict[str, Any], reading: Reading, tick: int) -> Dict[str, Any]:
+    """Ingested reading -> the row shape generate_aqi_reading() produces."""
+    return {
+        "ward_id":   ward["id"],
+        "ward_name": ward["name"],
+        "ward_type": ward["type"],
+        "aqi":       reading.aqi,
+        "pm25":      reading.pm25,
+        "pm10":      reading.pm10,
+        "no2":       reading.no2,
+        "co":        reading.co,
+        "spike":     reading.spike,
+        "timestamp": reading.timestamp,
         "_tick":     tick,
     }
 
@@ -156,13 +542,22 @@ def get_aqi_level(aqi: int) -> str:
     return "Severe"
 
 
+def window_state_for(ward: Dict[str, Any]) -> WindowState:
+    """Incremental window state of a ward, created on first use from WINDOW_SIZES + overrides."""
+    state: Optional[WindowState] = window_states.get(ward["id"])
+    if state is None:
+        sizes: Dict[str, int] = {**WINDOW_SIZES, **ward.get("windows", {})}
+        state = WindowState({name: size for name, size in sizes.items() if size})
+        window_states[ward["id"]] = state
+    return state
+
+
 def compute_rolling_average(ward_id: str) -> float:
     """Pathway window function: tumbling 60s window -> rolling average AQI."""
-    history: List[Dict[str, Any]] = list(aqi_history[ward_id])
-    if not history:
+    state: Optional[WindowState] = window_states.get(ward_id)
+    if state is None or not state["rolling"].count:
         return 0.0
-    total: float = float(sum(int(r["aqi"]) for r in history))
-    return round(total / float(len(history)), 1)  # type: ignore[call-overload]
+    return round(state["rolling"].mean, 1)  # type: ignore[call-overload]
 
 
 def detect_spike(ward_id: str, current_aqi: int) -> Optional[Dict[str, Any]]:
@@ -170,13 +565,11 @@ def detect_spike(ward_id: str, current_aqi: int) -> Optional[Dict[str, Any]]:
     Pathway incremental transformation: spike detection.
     Detects if current AQI is > 30% above rolling average.
     """
-    history: List[Dict[str, Any]] = list(aqi_history[ward_id])
-    if len(history) < 3:
+    state: Optional[WindowState] = window_states.get(ward_id)
+    if state is None or state["rolling"].count < SPIKE_MIN_HISTORY:
         return None
-    recent: List[Dict[str, Any]] = history[-5:]  # type: ignore[index]
-    total: float = float(sum(int(r["aqi"]) for r in recent))
-    avg: float = total / float(min(5, len(history)))
-    if float(current_aqi) > avg * 1.30:
+    avg: float = state["spike"].mean
+    if float(current_aqi) > avg * SPIKE_RATIO:
         return {
             "type":         "SPIKE",
             "ward_id":      ward_id,
@@ -187,49 +580,132 @@ def detect_spike(ward_id: str, current_aqi: int) -> Optional[Dict[str, Any]]:
     return None
 
 
+def alert_settings() -> Dict[str, Any]:
+    return {
+        "thresholds":    ALERT_THRESHOLDS,
+        "hysteresis":    ALERT_HYSTERESIS_AQI,
+        "raise_dwell_s": ALERT_RAISE_DWELL_S,
+        "clear_dwell_s": ALERT_CLEAR_DWELL_S,
+        "dedup_s":       ALERT_DEDUP_S,
+    }
+
+
+def ward_alert_lifecycle(wards: Sequence[Dict[str, Any]]) -> AlertLifecycle:
+    """The front process's alert lifecycle over `wards` (ward and columnar modes), built on first use."""
+    global alert_lifecycle  # noqa: PLW0603
+    # reset_pipeline_state() drops it whenever the ward set changes
+    if alert_lifecycle is None or len(alert_lifecycle.ward_ids) != len(wards):
+        alert_lifecycle = AlertLifecycle(
+            [str(w["id"]) for w in wards], [str(w["name"]) for w in wards], **alert_settings()
+        )
+    return alert_lifecycle
+
+
 def check_threshold_alert(ward_id: str, ward_name: str, aqi: int) -> Optional[Dict[str, Any]]:
     """
     Pathway filter: aqi_stream.filter(pw.this.aqi > 150)
-    Generates automatic alerts for critical AQI threshold crosses.
-    """
-    prev_reading: Dict[str, Any] = latest_readings.get(ward_id, {})
-    prev: int = int(prev_reading.get("aqi", 0))
-    thresholds: List[tuple[int, str, str, str]] = [
-        (300, "EMERGENCY", "🚨", "Immediate action required. Industrial halt mandatory."),
-        (200, "CRITICAL",  "🔴", "High pollution. Vulnerable groups must stay indoors."),
-        (150, "WARNING",   "🟠", "Elevated AQI. Limit outdoor activities."),
-    ]
-    for level_aqi, severity, icon, action in thresholds:
-        if aqi >= level_aqi and prev < level_aqi:
-            return {
-                "type":      "THRESHOLD_ALERT",
-                "severity":  severity,
-                "icon":      icon,
-                "ward_id":   ward_id,
-                "ward_name": ward_name,
-                "aqi":       aqi,
-                "threshold": level_aqi,
-                "action":    action,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-    return None
+    Steps the ward's alert lifecycle; returns its transition, if any.
+    """
+    lifecycle: Optional[AlertLifecycle] = alert_lifecycle
+    if lifecycle is None or ward_id not in lifecycle.index:
+        lifecycle = ward_alert_lifecycle(WARDS)
+    return lifecycle.step_one(ward_id, aqi, clock.iso())
+
+
+def ward_spatial_index(wards: Sequence[Dict[str, Any]]) -> SpatialIndex:
+    """Spatial index over the wards' positions, built on first use (reset_pipeline_state() drops it)."""
+    global spatial_index, spatial_state  # noqa: PLW0603
+    if spatial_index is None or len(spatial_index) != len(wards):
+        spatial_index = SpatialIndex(
+            [float(w["lat"]) for w in wards], [float(w["lon"]) for w in wards], [str(w["id"]) for w in wards],
+            k=SPATIAL_K, max_neighbour_m=SPATIAL_NEIGHBOUR_M,
+        )
+        # Until the first tick every ward holds its baseline
+        spatial_state = {"aqi": np.array([w["base_aqi"] for w in wards], dtype=np.float64)}
+    return spatial_index
+
+
+def update_spatial(wards: Sequence[Dict[str, Any]], aqi: np.ndarray, rolling_avg: np.ndarray) -> None:
+    """
+    Neighbourhood aggregates of the tick (k-nearest average, rising neighbours),
+    then spatial corroboration of the tick's spikes: a spike whose neighbours
+    are rising too is a regional plume, otherwise a local spike.
+    """
+    global spatial_state  # noqa: PLW0603
+    started: float = time.perf_counter()
+    index: SpatialIndex = ward_spatial_index(wards)
+    hood: Dict[str, np.ndarray] = index.neighbourhood(aqi, rolling_avg, SPATIAL_RISE_RATIO)
+    for spike in tick_spikes:
+        i: int = index.position[str(spike["ward_id"])]
+        near: int = int(index.near_count[i])
+        rising: int = int(hood["neighbours_rising"][i])
+        knn_avg: float = float(hood["knn_avg"][i])
+        check: Dict[str, Any] = {
+            "type":              "SPIKE_CORROBORATION",
+            "ward_id":           spike["ward_id"],
+            "aqi":               int(spike["current_aqi"]),
+            "knn_avg":           round(knn_avg, 1) if math.isfinite(knn_avg) else None,  # type: ignore[call-overload]
+            "neighbours":        near,
+            "neighbours_rising": rising,
+            "regional":          near > 0 and rising >= max(1, math.ceil(SPATIAL_CORROBORATION * near)),
+        }
+        tick_corroborations.append(check)
+        if replay is not None:
+            replay.record(check)
+        if check["regional"]:
+            log_event("REGIONAL_PLUME", check, "warning")
+    tick_spikes.clear()
+    spatial_state = hood
+    pipeline_metrics.add("spatial", time.perf_counter() - started)
+
+
+def ward_forecast_model(wards: Sequence[Dict[str, Any]]) -> ForecastModel:
+    """Forecaster over all wards, built on first use (reset_pipeline_state() drops it)."""
+    global forecast_model  # noqa: PLW0603
+    if forecast_model is None or len(forecast_model) != len(wards):
+        forecast_model = ForecastModel(len(wards), FORECAST_HORIZONS)
+    return forecast_model
+
+
+def update_forecast(wards: Sequence[Dict[str, Any]], aqi: np.ndarray, rows: np.ndarray) -> None:
+    """
+    Fold the tick's readings into the forecasters of the wards that reported
+    (positions `rows`; `aqi` is aligned with `wards`) and cache the new forecasts.
+    """
+    global forecast_state  # noqa: PLW0603
+    started: float = time.perf_counter()
+    model: ForecastModel = ward_forecast_model(wards)
+    now: datetime = clock.now()
+    model.update(aqi, now.timestamp(), clock.local_hour(), rows)
+    forecast_state = {
+        **model.forecast(),
+        "timestamp": now.isoformat(),
+        "level":     model.level.copy(),
+        "trend":     model.trend.copy(),
+        "samples":   model.updates.copy(),
+        "updated":   model.last_t.copy(),
+    }
+    pipeline_metrics.add("forecast", time.perf_counter() - started)
 
 
-def rag_context(ward_name: str, aqi: int) -> Dict[str, Any]:
+def rag_context(ward_name: str, aqi: int, store: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Pathway Document Store + RAG:
     Retrieves relevant guidelines from Document Store based on current AQI.
+    The live pipeline reads precomputed results via rag_band() instead.
     """
+    if store is None:
+        store = DOCUMENT_STORE
     level: str = get_aqi_level(aqi)
     level_key: str = level.lower().replace(" ", "_")
 
-    guideline: Any = DOCUMENT_STORE["who_guidelines"].get(
+    guideline: Any = store["who_guidelines"].get(
         level_key,
-        DOCUMENT_STORE["who_guidelines"].get("moderate"),
+        store["who_guidelines"].get("moderate"),
     )
 
     # Retrieve applicable govt rules
-    govt: List[str] = DOCUMENT_STORE["govt_rules"]
+    govt: List[str] = store["govt_rules"]
     applicable_rules: List[str] = []
     if aqi > 300:
         applicable_rules = govt[0:3]
@@ -252,11 +728,266 @@ def rag_context(ward_name: str, aqi: int) -> Dict[str, Any]:
     return {
         "who_guideline":  guideline,
         "govt_rules":     applicable_rules,
-        "elderly_advice": DOCUMENT_STORE["elderly_advice"][elderly_key],
-        "heatwave":       DOCUMENT_STORE["heatwave_advisory"] if aqi > 150 else None,
+        "elderly_advice": store["elderly_advice"][elderly_key],
+        "heatwave":       store["heatwave_advisory"] if aqi > 150 else None,
     }
 
 
+# ─────────────────────────────────────────────
+#  Step 2b: Band-indexed RAG context
+#  rag_context() only depends on which AQI band a value falls into, so the
+#  finite set of distinct contexts is built once per Document Store version
+#  and looked up by AQI in O(1). Wards and the stream refer to a band id.
+# ─────────────────────────────────────────────
+RAG_MAX_AQI: int = 500
+RAG_STORE_KEYS: tuple[str, ...] = ("who_guidelines", "govt_rules", "heatwave_advisory", "elderly_advice")
+
+
+def build_rag_index(store: Dict[str, Any], version: int) -> Dict[str, Any]:
+    """Evaluate rag_context() for every AQI 0..RAG_MAX_AQI and collapse runs into bands."""
+    contexts: List[Dict[str, Any]] = []
+    band_of: List[int] = []
+    for aqi in range(RAG_MAX_AQI + 1):
+        ctx: Dict[str, Any] = rag_context("", aqi, store)
+        if not contexts or contexts[-1] != ctx:
+            contexts.append(ctx)
+        band_of.append(len(contexts) - 1)
+    return {
+        "version":    version,
+        "contexts":   contexts,
+        "band_of":    band_of,
+        "band_array": np.array(band_of, dtype=np.int64),
+        "indexed_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+if DOCSTORE_FILE:
+    with open(DOCSTORE_FILE, encoding="utf-8") as _fh:
+        DOCUMENT_STORE = json.load(_fh)
+rag_index: Dict[str, Any] = build_rag_index(DOCUMENT_STORE, 1)
+
+
+def rag_band(aqi: int) -> int:
+    """Band id of the RAG context for an AQI value (AQI above the scale saturates)."""
+    return rag_index["band_of"][min(max(aqi, 0), RAG_MAX_AQI)]
+
+
+def rag_bands_payload() -> Dict[str, Any]:
+    """Band table shipped with stream events; ward rows carry only `rag_band`."""
+    return {"version": rag_index["version"], "contexts": rag_index["contexts"]}
+
+
+docstore_reload_lock: threading.Lock = threading.Lock()   # one rebuild at a time, versions stay distinct
+
+
+def reload_document_store(store: Dict[str, Any]) -> Dict[str, Any]:
+    """Hot-swap the Document Store and rebuild both indexes (no engine restart)."""
+    global DOCUMENT_STORE, rag_index, doc_index  # noqa: PLW0603
+    missing: List[str] = [k for k in RAG_STORE_KEYS if k not in store]
+    if missing:
+        raise ValueError(f"Document Store is missing {', '.join(missing)}")
+    with docstore_reload_lock:
+        # Build first, then swap references: the pipeline never sees a half-built index
+        index: Dict[str, Any] = build_rag_index(store, int(rag_index["version"]) + 1)
+        vectors: DocumentIndex = build_document_index(store, DOCS_DIR)
+        DOCUMENT_STORE = store
+        rag_index = index
+        doc_index = vectors
+    return index
+
+
+# ─────────────────────────────────────────────
+#  Step 2c: Vector retrieval over the document index
+#  Top-k passages for every ward's pollutant profile, one batch per tick
+# ─────────────────────────────────────────────
+doc_index: DocumentIndex = build_document_index(DOCUMENT_STORE, DOCS_DIR)
+ward_retrievals: Dict[str, Any] = {"index": doc_index, "ward_index": {}, "ids": None, "scores": None}
+
+
+def refresh_retrievals(
+    ward_ids: Sequence[str],
+    aqi: np.ndarray,
+    pollutants: Dict[str, np.ndarray],
+    ward_types: Sequence[str],
+) -> None:
+    """Batch top-k retrieval for all wards; published as one immutable record."""
+    global ward_retrievals  # noqa: PLW0603
+    started: float = time.perf_counter()
+    index: DocumentIndex = doc_index
+    ids, scores = index.search_profiles(aqi, pollutants, ward_types, RAG_TOP_K)
+    ward_index: Dict[str, int] = ward_retrievals["ward_index"]
+    if len(ward_index) != len(ward_ids):
+        ward_index = {wid: i for i, wid in enumerate(ward_ids)}
+    ward_retrievals = {"index": index, "ward_index": ward_index, "ids": ids, "scores": scores}
+    pipeline_metrics.add("rag_context", time.perf_counter() - started)
+
+
+def refresh_reported_retrievals(
+    seen: np.ndarray,
+    ward_ids: Sequence[str],
+    batch: Mapping[str, Any],
+    ward_types: Sequence[str],
+) -> None:
+    """refresh_retrievals() for the batched modes, over the wards that have reported (`seen`) as in ward mode."""
+    if seen.all():
+        refresh_retrievals(ward_ids, batch["aqi"], batch, ward_types)
+        return
+    rows: np.ndarray = np.flatnonzero(seen)
+    at: List[int] = rows.tolist()
+    refresh_retrievals(
+        [ward_ids[i] for i in at], batch["aqi"][rows], {p: batch[p][rows] for p in POLLUTANTS}, [ward_types[i] for i in at],
+    )
+
+
+def ward_passages(ward_id: str) -> List[Dict[str, Any]]:
+    """Passages retrieved for a ward on the last tick."""
+    state: Dict[str, Any] = ward_retrievals
+    row: Optional[int] = state["ward_index"].get(ward_id)
+    if row is None or state["ids"] is None:
+        return []
+    index: DocumentIndex = state["index"]
+    return [
+        index.passage(int(i), float(sc))
+        for i, sc in zip(state["ids"][row].tolist(), state["scores"][row].tolist())
+        if sc > 0.0
+    ]
+
+
+# ─────────────────────────────────────────────
+#  Step 2d: Event-time windows + reading history
+#  Keyed on each reading's timestamp rather than arrival order; late
+#  readings within the allowed lateness re-emit the windows they change.
+#  Every ingested chunk is also appended to the history segment store.
+# ─────────────────────────────────────────────
+def start_event_windows(ward_ids: Sequence[str]) -> None:
+    global ward_event_clock  # noqa: PLW0603
+    event_windows[:] = [
+        EventTimeWindows(name, ward_ids, size, slide, ALLOWED_LATENESS_S, WATERMARK_DELAY_S, MAX_EVENT_SKEW_S)
+        for name, (size, slide) in EVENT_WINDOWS.items()
+    ]
+    ward_event_clock = np.full(len(ward_ids), -math.inf)
+
+
+def ingest_chunk(
+    rows: Sequence[Reading],
+    keys: Sequence[str],
+    index: Mapping[str, int],
+) -> tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Columnar view of one chunk of ingested readings: feeds the CPCB sub-index
+    stage (which resolves concentration-only readings), adds it to every
+    event-time window and queues it for the history store. Returns the chunk's
+    ward positions (-1 = unknown, stamped more than MAX_EVENT_SKEW_S ahead of
+    the engine clock, or no AQI could be computed), event times and resolved
+    columns (reading_columns() layout).
+    """
+    n: int = len(rows)
+    idx: np.ndarray = np.fromiter(map(index.get, map(itemgetter(0), rows), repeat(-1)), dtype=np.int64, count=n)
+    times: np.ndarray = event_times([r.timestamp for r in rows])
+    # A bad sensor clock must not move the ward clocks, the watermarks or the sub-index hour
+    now_s: float = clock.now().timestamp()
+    future: np.ndarray = (idx >= 0) & (times > now_s + MAX_EVENT_SKEW_S)
+    if future.any():
+        pipeline_stats["future_readings"] = int(pipeline_stats["future_readings"]) + int(future.sum())
+        idx[future] = -1
+    columns: Dict[str, np.ndarray] = reading_columns(rows)
+    resolve_concentrations(len(keys), idx, times, columns)
+    for windows in event_windows:
+        windows.add(idx, times, columns["aqi"], now_s)
+    if history_store is not None:
+        history_store.append(keys, idx, times, columns)
+    return idx, times, columns
+
+
+def in_event_order(idx: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """
+    Mask of readings not older than the newest reading already processed for
+    their ward, then advances the ward clocks. Older (late) readings only
+    reach the event-time windows; the sample-count transformations (rolling
+    average, spike detection) see every ward's readings in event-time order.
+    """
+    known: np.ndarray = idx >= 0
+    fresh: np.ndarray = ~known | ~(times < ward_event_clock[np.where(known, idx, 0)])
+    late: int = len(fresh) - int(fresh.sum())
+    if late:
+        pipeline_stats["late_readings"] = int(pipeline_stats["late_readings"]) + late
+    ok: np.ndarray = known & fresh & np.isfinite(times)
+    np.maximum.at(ward_event_clock, idx[ok], times[ok])
+    return fresh
+
+
+def advance_event_windows() -> List[Dict[str, Any]]:
+    """Fire / update event-time windows the watermark has passed; results go out with the tick."""
+    started: float = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+    for windows in event_windows:
+        results.extend(windows.advance())
+    for result in results:
+        for ward_id, values in result["wards"].items():
+            # Replaced, not updated in place: handlers may be serialising the previous dict
+            event_window_latest[ward_id] = {
+                **event_window_latest.get(ward_id, {}),
+                result["window"]: {"kind": result["kind"], "start": result["start"], "end": result["end"], **values},
+            }
+        event_window_log.append({
+            "window":    result["window"],
+            "kind":      result["kind"],
+            "start":     result["start"],
+            "end":       result["end"],
+            "watermark": result["watermark"],
+            "wards":     len(result["wards"]),
+        })
+    pipeline_metrics.add("event_windows", time.perf_counter() - started)
+    return results
+
+
+# ─────────────────────────────────────────────
+#  Step 2e: CPCB sub-index AQI (sub_index.py)
+#  Every ingested concentration goes into its pollutant's averaging window
+#  (24h PM / NO2, 8h CO); the sub-indices, their maximum (the AQI) and the
+#  dominant pollutant are recomputed for all wards once per tick. Readings
+#  that carry only concentrations take their ward's AQI from here.
+# ─────────────────────────────────────────────
+def ward_sub_index_engine(wards: int) -> SubIndexEngine:
+    """Sub-index windows over all wards, built on first use (reset_pipeline_state() drops them)."""
+    global sub_index_engine  # noqa: PLW0603
+    if sub_index_engine is None or len(sub_index_engine) != wards:
+        sub_index_engine = SubIndexEngine(wards, POLLUTANTS, SUBINDEX_MIN_COVERAGE, SUBINDEX_MIN_POLLUTANTS)
+    return sub_index_engine
+
+
+def resolve_concentrations(wards: int, idx: np.ndarray, times: np.ndarray, columns: Dict[str, np.ndarray]) -> None:
+    """
+    Add one chunk's concentrations to the sub-index windows, then give every
+    concentration-only reading its ward's CPCB AQI and estimate the pollutants
+    it did not report from that AQI, as for any other reading. Readings whose
+    ward has too little data for an AQI get position -1. Updates in place.
+    """
+    engine: SubIndexEngine = ward_sub_index_engine(wards)
+    engine.add(idx, times, columns)
+    missing: np.ndarray = np.flatnonzero(columns["aqi"] == NO_AQI)
+    if not len(missing):
+        return
+    aqi: np.ndarray = engine.aqi(idx[missing]).astype(np.float64)
+    columns["aqi"][missing] = aqi
+    for name, ratio in POLLUTANT_RATIOS.items():
+        column: np.ndarray = columns[name]
+        gap: np.ndarray = missing[np.isnan(column[missing])]
+        column[gap] = np.round(columns["aqi"][gap] * ratio, 2)
+    idx[missing[aqi < 0]] = -1
+
+
+def update_sub_index() -> None:
+    """Cache every ward's CPCB averages, sub-indices, AQI and dominant pollutant for the tick."""
+    global sub_index_state  # noqa: PLW0603
+    engine: Optional[SubIndexEngine] = sub_index_engine
+    if engine is None:
+        return
+    started: float = time.perf_counter()
+    sub_index_state = {**engine.state(), "timestamp": clock.iso(), "pollutants": engine.pollutants}
+    pipeline_metrics.add("sub_index", time.perf_counter() - started)
+
+
 # ─────────────────────────────────────────────
 #  Logging helper
 # ─────────────────────────────────────────────
@@ -268,136 +999,747 @@ def log_event(event_type: str, data: Dict[str, Any], level: str = "info") -> Non
         "type":      event_type,
         "level":     level,
         "data":      data,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": clock.iso(),
     })
 
 
 # ─────────────────────────────────────────────
-#  Broadcast helper  (thread-safe -> asyncio queue)
+#  Broadcast helper  (pipeline thread -> event loop)
 # ─────────────────────────────────────────────
-def broadcast(event: Dict[str, Any]) -> None:
-    """Put event into every active SSE client queue (thread-safe)."""
-    payload: str = json.dumps(event)
-    dead: List[asyncio.Queue[str]] = []
-    with stream_lock:
-        for q in stream_listeners:
-            try:
-                q.put_nowait(payload)
-            except asyncio.QueueFull:
-                dead.append(q)
-        for q in dead:
-            stream_listeners.remove(q)
+def broadcast(
+    event: Dict[str, Any],
+    encoded_wards: Optional[Dict[str, bytes]] = None,
+    body: Optional[bytes] = None,
+) -> None:
+    """
+    Encode event once and fan it out to every active SSE client (thread-safe)
+    and to the output workers subscribed to PATHWAY_PUBSUB.
+    encoded_wards: ward rows / patches already encoded by shard workers.
+    body: the event already encoded (a worker relaying the engine's tick).
+    """
+    started: float = time.perf_counter()
+    if body is None:
+        body = json.dumps(event).encode("utf-8") if encoded_wards is None else splice_json(
+            event, "wards", encoded_wards["rows"]
+        )
+    encode_s: float = time.perf_counter() - started
+    stream_hub.publish(body)
+    encode_s += stream_hub.encode_s
+    if tick_publisher is not None:
+        tick_publisher.send(TOPIC_TICK, body)
+    # Delta clients: one diff per tick, delivered together with the state it produces
+    encoded: float = time.perf_counter()
+    delta, state = delta_encoder.encode(event, encoded_wards)
+    diffed: float = time.perf_counter()
+    delta_hub.publish(delta, context=state)
+    pipeline_metrics.add("json_encoding", encode_s + delta_hub.encode_s)
+    pipeline_metrics.add("delta", diffed - encoded)
+    # Filtered clients: one projection per distinct filter, rows looked up only if one selects wards
+    projected: float = time.perf_counter()
+    if encoded_wards is None:
+        topic_router.publish(event, lambda: {str(row["ward_id"]): row for row in event["wards"]})
+    else:
+        topic_router.publish(event, lambda: latest_readings, encoded_wards["rows"])
+    pipeline_metrics.add("projection", time.perf_counter() - projected)
+    pipeline_metrics.add("broadcast", time.perf_counter() - started)
 
 
 # ─────────────────────────────────────────────
 #  Step 3: Stream Processor (Main Pipeline Loop)
 #  Runs in a daemon thread alongside uvicorn
 # ─────────────────────────────────────────────
-def pathway_pipeline() -> None:
+def build_city_summary(city_aqis: Sequence[int]) -> Dict[str, Any]:
+    """Tumbling-window aggregation over the latest AQI of every ward."""
+    city_avg: float = round(float(sum(city_aqis)) / float(len(city_aqis)), 1)  # type: ignore[call-overload]
+    return {
+        "avg_aqi":        city_avg,
+        "max_aqi":        max(city_aqis),
+        "aqi_level":      get_aqi_level(int(city_avg)),
+        "critical_wards": sum(1 for a in city_aqis if a > CRITICAL_AQI),
+        "total_wards":    len(WARDS),
+    }
+
+
+def publish_poll_snapshot(tick: int, event: Dict[str, Any], wards_json: Optional[bytes] = None) -> None:
+    """Hand a tick to /snapshot, /wards and /alerts; bodies are encoded on first request."""
+    global poll_snapshot  # noqa: PLW0603
+    poll_snapshot = {
+        "etag": f'"{stream_hub.epoch}-{tick}"', "event": event, "bodies": {}, "wards_json": wards_json,
+        "alerts": alert_store.values(),
+    }
+
+
+def pipeline_stats_payload() -> Dict[str, Any]:
+    return {
+        "total_events":      int(pipeline_stats["total_events"]),
+        "spikes_detected":   int(pipeline_stats["spikes_detected"]),
+        "alerts_triggered":  int(pipeline_stats["alerts_triggered"]),
+        "windows_processed": int(pipeline_stats["windows_processed"]),
+        "late_readings":     int(pipeline_stats["late_readings"]),
+        "future_readings":   int(pipeline_stats["future_readings"]),
+        "started_at":        PIPELINE_STARTED_AT,
+    }
+
+
+def record_spike(ward: Dict[str, Any], aqi: int, spike_info: Dict[str, Any]) -> None:
+    pipeline_stats["spikes_detected"] = int(pipeline_stats["spikes_detected"]) + 1
+    tick_spikes.append(spike_info)
+    if replay is not None:
+        replay.record(spike_info)
+    log_event("SPIKE_DETECTED", spike_info, "warning")
+    log.info("[Pathway Spike] %s: AQI %d (+%s%% above avg)", ward["name"], aqi, spike_info["increase_pct"])
+
+
+def record_alert_transitions(transitions: List[Dict[str, Any]]) -> None:
     """
-    Main Pathway pipeline loop.
-    Mimics: aqi_stream -> transformations -> output connector
-    Runs every 5 seconds (simulated real-time ingestion).
+    Collect a tick's alert transitions (publish_tick() applies them to the
+    store); only raises and escalations count and log as alerts.
     """
-    tick: int = 0
-    print("[Pathway Engine] Starting AQI Streaming Pipeline...")
-    print("[Pathway Engine] Ingesting AQI sensor streams from 8 wards...")
+    tick_transitions.extend(transitions)
+    for t in transitions:
+        if replay is not None:
+            replay.record(t)
+        alert: Dict[str, Any] = t["alert"]
+        if t["transition"] in ("raise", "escalate"):
+            pipeline_stats["alerts_triggered"] = int(pipeline_stats["alerts_triggered"]) + 1
+            log_event("THRESHOLD_ALERT", t, "critical")
+            log.info("[Pathway Alert] %s in %s: AQI=%d", alert["severity"], alert["ward_name"], t["aqi"])
+        elif t["transition"] != "reopen":
+            log_event("ALERT_TRANSITION", t, "info")
+
+
+def process_reading(ward: Dict[str, Any], reading: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-ward path: push one reading through the streaming transformations."""
+    started: float = time.perf_counter()
+    aqi_history[ward["id"]].append(reading)
+    window: WindowState = window_state_for(ward)
+    window.push(int(reading["aqi"]))
+    pipeline_stats["total_events"] = int(pipeline_stats["total_events"]) + 1
+
+    # ── STEP 2: Streaming Transformations ────────────
+    rolling_avg: float = compute_rolling_average(ward["id"])
+    rolled: float = time.perf_counter()
+    spike_info: Optional[Dict[str, Any]] = detect_spike(ward["id"], int(reading["aqi"]))
+    spiked: float = time.perf_counter()
+    transition: Optional[Dict[str, Any]] = check_threshold_alert(
+        ward["id"], str(ward["name"]), int(reading["aqi"])
+    )
+    pipeline_metrics.add("rolling_average", rolled - started)
+    pipeline_metrics.add("spike_detection", spiked - rolled)
+    pipeline_metrics.add("threshold_check", time.perf_counter() - spiked)
+
+    if spike_info:
+        record_spike(ward, int(reading["aqi"]), spike_info)
+    if transition:
+        record_alert_transitions([transition])
+
+    # Update latest
+    latest_readings[ward["id"]] = {
+        **reading,
+        "aqi_level":   get_aqi_level(int(reading["aqi"])),
+        "rolling_avg": rolling_avg,
+        "windows":     window.summary(),
+        "spike":       spike_info is not None or bool(reading.get("spike", False)),
+        "alert":       transition["alert"] if transition and transition["transition"] in RAISING else None,
+        "rag_band":    rag_band(int(reading["aqi"])),
+    }
+    return latest_readings[ward["id"]]
 
-    while True:
-        ward_updates: List[Dict[str, Any]] = []
-        city_aqis: List[int] = []
 
-        for ward in WARDS:
+def emit_tick(
+    tick: int,
+    ward_updates: List[Dict[str, Any]],
+    city_summary: Dict[str, Any],
+    window_results: Optional[List[Dict[str, Any]]] = None,
+    encoded_wards: Optional[Dict[str, bytes]] = None,
+) -> Dict[str, Any]:
+    """
+    STEP 3: Output Connector -> SSE, shared by every engine mode. In sharded
+    mode ward_updates is empty and the rows come pre-encoded (encoded_wards).
+    Returns the tick for publish_tick(), which shows it to the request handlers.
+    """
+    pipeline_stats["windows_processed"] = int(pipeline_stats["windows_processed"]) + 1
+    alert_transitions: List[Dict[str, Any]] = tick_transitions[:]
+    tick_transitions.clear()
+    corroborations: List[Dict[str, Any]] = tick_corroborations[:]
+    tick_corroborations.clear()
+    output_event: Dict[str, Any] = {
+        "event":     "aqi_update",
+        "tick":      tick,
+        "timestamp": clock.iso(),
+        "pipeline": {
+            "layer": "Pathway Streaming Engine",
+            "tick":  tick,
+            "stats": pipeline_stats_payload(),
+        },
+        "city_summary":  city_summary,
+        "wards":             ward_updates,
+        "alert_transitions": alert_transitions,
+        "rag_bands":         rag_bands_payload(),
+    }
+    if window_results:
+        output_event["window_results"] = window_results
+    if corroborations:
+        output_event["spike_corroboration"] = corroborations
+
+    broadcast(output_event, encoded_wards)
+    log_event("PIPELINE_TICK", {
+        "tick":           tick,
+        "city_avg":       city_summary["avg_aqi"],
+        "city_max":       city_summary["max_aqi"],
+        "critical_wards": city_summary["critical_wards"],
+    }, "info")
+
+    log.info(
+        "[Pathway] Tick %d: CityAvgAQI=%s | Max=%s | Critical=%s | Clients=%d",
+        tick, city_summary["avg_aqi"], city_summary["max_aqi"], city_summary["critical_wards"],
+        sse_clients(),
+    )
+    return {
+        "tick":        tick,
+        "event":       output_event,
+        "wards_json":  encoded_wards["rows"] if encoded_wards is not None else None,
+        "transitions": alert_transitions,
+    }
+
+
+def publish_tick(out: Dict[str, Any]) -> None:
+    """
+    Make a tick visible to the request handlers: the alert store, the polling
+    snapshot and engine_state move together. The async runtime calls this on
+    the event loop, so a handler sees either the previous tick or this one.
+    """
+    global engine_state  # noqa: PLW0603
+    alert_store.apply(out["transitions"])
+    publish_poll_snapshot(out["tick"], out["event"], out["wards_json"])
+    engine_state = engine_state_payload(out["tick"], out["event"]["pipeline"]["stats"])
+    if tick_publisher is not None:
+        tick_publisher.send(TOPIC_STATE, json.dumps({
+            "tick":           out["tick"],
+            "etag":           poll_snapshot["etag"],
+            "snapshot_etag":  poll_etag(poll_snapshot["etag"], "snapshot"),
+            "alerts_version": alert_store.version,
+            "alerts":         poll_snapshot["alerts"],
+            "engine":         engine_state,
+        }).encode("utf-8"))
+
+
+def publish_relayed_tick(event: Dict[str, Any], state: Dict[str, Any]) -> None:
+    """
+    Worker side of publish_tick(), on the event loop: the engine's active
+    alerts, ETag and counters for a tick the worker has already streamed.
+    """
+    global engine_state, alert_store, poll_snapshot, relayed_alerts_version  # noqa: PLW0603
+    if state["alerts_version"] != relayed_alerts_version:
+        store: AlertStore = AlertStore()
+        store.apply([{"alert": alert} for alert in state["alerts"]])
+        alert_store = store
+        relayed_alerts_version = state["alerts_version"]
+    poll_snapshot = {
+        "etag": state["etag"], "event": event, "bodies": {}, "wards_json": None, "alerts": alert_store.values(),
+    }
+    engine_state = state["engine"]
+
+
+def engine_state_payload(tick: Optional[int] = None, stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Counters, log and event-time window state as of a tick (copied: the pipeline keeps mutating its own)."""
+    return {
+        "tick":          tick,
+        "stats":         stats if stats is not None else pipeline_stats_payload(),
+        "wards":         len(latest_readings),
+        "active_alerts": len(alert_store),
+        "logs":          tuple(stream_events),
+        "windows":       [w.stats() for w in event_windows],
+        "window_log":    tuple(event_window_log),
+    }
+
+
+def ward_tick_step() -> tuple[TickStep, Collection[str]]:
+    """
+    Per-ward engine: set up, then return the function that runs one window
+    through the pipeline (None when the window held no usable reading).
+    Mimics: connectors -> aqi_stream -> transformations -> output connector
+    Every reading is processed as it is drained; one tick is emitted per window.
+    """
+    tick: int = 0
+    wards_by_id: Dict[str, Dict[str, Any]] = {str(w["id"]): w for w in WARDS}
+    ward_index: Dict[str, int] = {str(w["id"]): i for i, w in enumerate(WARDS)}
+    ward_keys: List[str] = list(ward_index)
+    start_event_windows(ward_keys)
+    log.info("[Pathway Engine] Starting AQI Streaming Pipeline...")
+    log.info("[Pathway Engine] Ingesting AQI sensor streams from %d wards...", len(WARDS))
+    if history_store is not None:
+        history_store.start()
+
+    def step(window: Iterable[List[Reading]]) -> Optional[Dict[str, Any]]:
+        nonlocal tick
+        updated: int = 0
+        reported: np.ndarray = np.zeros(len(WARDS), dtype=bool)
+        busy: float = 0.0   # processing time of this tick, excluding waits for readings
+        for chunk in window:
             # ── STEP 1: Ingestion Layer ──────────────────────
-            reading: Dict[str, Any] = generate_aqi_reading(ward, tick)
-            aqi_history[ward["id"]].append(reading)
-            pipeline_stats["total_events"] = int(pipeline_stats["total_events"]) + 1
-
-            # ── STEP 2: Streaming Transformations ────────────
-            rolling_avg: float = compute_rolling_average(ward["id"])
-            spike_info: Optional[Dict[str, Any]] = detect_spike(ward["id"], int(reading["aqi"]))
-            alert: Optional[Dict[str, Any]] = check_threshold_alert(
-                ward["id"], str(ward["name"]), int(reading["aqi"])
-            )
-            rag_ctx: Dict[str, Any] = rag_context(str(ward["name"]), int(reading["aqi"]))
-
-            if spike_info:
-                pipeline_stats["spikes_detected"] = int(pipeline_stats["spikes_detected"]) + 1
-                log_event("SPIKE_DETECTED", spike_info, "warning")
-                print(f"[Pathway Spike] {ward['name']}: AQI {reading['aqi']} (+{spike_info['increase_pct']}% above avg)")
-
-            if alert:
-                pipeline_stats["alerts_triggered"] = int(pipeline_stats["alerts_triggered"]) + 1
-                active_alerts[ward["id"]] = alert
-                log_event("THRESHOLD_ALERT", alert, "critical")
-                print(f"[Pathway Alert] {alert['severity']} in {ward['name']}: AQI={reading['aqi']}")
-
-            # Update latest
-            latest_readings[ward["id"]] = {
-                **reading,
-                "aqi_level":   get_aqi_level(int(reading["aqi"])),
-                "rolling_avg": rolling_avg,
-                "spike":       spike_info is not None or bool(reading.get("spike", False)),
-                "alert":       alert,
-                "rag_context": rag_ctx,
-            }
-            city_aqis.append(int(reading["aqi"]))
-            ward_updates.append(latest_readings[ward["id"]])
+            started: float = time.perf_counter()
+            idx, times, columns = ingest_chunk(chunk, ward_keys, ward_index)
+            unknown: int = int((idx < 0).sum())
+            ingest_queue.reject(unknown)
+            # Event-time order within the chunk; late readings only reach the event-time windows
+            order: np.ndarray = np.argsort(times, kind="stable")
+            fresh: np.ndarray = order[in_event_order(idx, times)[order] & (idx[order] >= 0)]
+            reported[idx[fresh]] = True
+            ingested: float = time.perf_counter()
+            pipeline_metrics.add("ingest", ingested - started)
+            for i in fresh.tolist():
+                reading: Reading = chunk[i]
+                if reading.aqi == NO_AQI:
+                    reading = reading._replace(
+                        aqi=int(columns["aqi"][i]), **{name: float(columns[name][i]) for name in POLLUTANTS}
+                    )
+                ward: Dict[str, Any] = wards_by_id[reading.ward_id]
+                process_reading(ward, reading_row(ward, reading, tick))
+            updated += len(chunk) - unknown
+            busy += time.perf_counter() - started
+        if not updated:
+            return None
+        closed: float = time.perf_counter()
+
+        ward_updates: List[Dict[str, Any]] = [
+            latest_readings[str(w["id"])] for w in WARDS if str(w["id"]) in latest_readings
+        ]
+        city_aqis: List[int] = [int(u["aqi"]) for u in ward_updates]
+        rows: List[Optional[Dict[str, Any]]] = [latest_readings.get(str(w["id"])) for w in WARDS]
+        states: List[Optional[WindowState]] = [window_states.get(str(w["id"])) for w in WARDS]
+        tick_aqi: np.ndarray = np.array([r["aqi"] if r else w["base_aqi"] for r, w in zip(rows, WARDS)], dtype=np.int64)
+        update_spatial(
+            WARDS,
+            tick_aqi,
+            # Unrounded window means, as the batched modes use
+            np.array([st["rolling"].mean if st else w["base_aqi"] for st, w in zip(states, WARDS)], dtype=np.float64),
+        )
+        update_forecast(WARDS, tick_aqi, np.flatnonzero(reported))
+        update_sub_index()
+        refresh_retrievals(
+            [str(u["ward_id"]) for u in ward_updates],
+            np.array(city_aqis, dtype=np.int64),
+            {p: np.array([u[p] for u in ward_updates], dtype=np.float64) for p in ("pm25", "pm10", "no2", "co")},
+            [str(u["ward_type"]) for u in ward_updates],
+        )
 
         # ── Window Aggregation (tumbling window) ──────────────
-        city_avg: float = round(float(sum(city_aqis)) / float(len(city_aqis)), 1)  # type: ignore[call-overload]
-        city_max: int = max(city_aqis)
-        pipeline_stats["windows_processed"] = int(pipeline_stats["windows_processed"]) + 1
-        critical_count: int = sum(1 for a in city_aqis if a > 150)
-
-        # ── STEP 3: Output Connector -> SSE ────────────────────
-        output_event: Dict[str, Any] = {
-            "event":     "aqi_update",
-            "tick":      tick,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "pipeline": {
-                "layer": "Pathway Streaming Engine",
-                "tick":  tick,
-                "stats": {
-                    "total_events":      int(pipeline_stats["total_events"]),
-                    "spikes_detected":   int(pipeline_stats["spikes_detected"]),
-                    "alerts_triggered":  int(pipeline_stats["alerts_triggered"]),
-                    "windows_processed": int(pipeline_stats["windows_processed"]),
-                    "started_at":        PIPELINE_STARTED_AT,
-                },
-            },
-            "city_summary": {
-                "avg_aqi":        city_avg,
-                "max_aqi":        city_max,
-                "aqi_level":      get_aqi_level(int(city_avg)),
-                "critical_wards": critical_count,
-                "total_wards":    len(WARDS),
-            },
-            "wards":         ward_updates,
-            "active_alerts": list(active_alerts.values()),
+        out: Dict[str, Any] = emit_tick(tick, ward_updates, build_city_summary(city_aqis), advance_event_windows())
+        pipeline_metrics.end_tick(busy + time.perf_counter() - closed)
+        tick = tick + 1
+        return out
+
+    return step, wards_by_id
+
+
+def run_ticks(step: TickStep, keys: Collection[str]) -> None:
+    """Thread runtime: pull windows from the connectors (or a replay) and publish every tick."""
+    for window in reading_windows(keys):
+        out: Optional[Dict[str, Any]] = step(window)
+        if out is not None:
+            publish_tick(out)
+
+
+def pathway_pipeline() -> None:
+    """Main Pathway pipeline loop (per-ward engine, thread runtime)."""
+    run_ticks(*ward_tick_step())
+
+
+# ─────────────────────────────────────────────
+#  Columnar engine mode (PATHWAY_ENGINE_MODE=columnar)
+#  Same transformations, one batched NumPy pass per tick
+# ─────────────────────────────────────────────
+def columnar_settings() -> Dict[str, Any]:
+    return {
+        "window":            ROLLING_WINDOW,
+        "spike_window":      SPIKE_WINDOW,
+        "spike_min_history": SPIKE_MIN_HISTORY,
+        "spike_ratio":       SPIKE_RATIO,
+        "critical_aqi":      CRITICAL_AQI,
+        "windows":           WINDOW_SIZES,
+    }
+
+
+def new_columnar_engine(wards: Sequence[Dict[str, Any]]) -> ColumnarEngine:
+    return ColumnarEngine(
+        [str(w["id"]) for w in wards], overrides=[w.get("windows") for w in wards], **columnar_settings()
+    )
+
+
+def process_columnar_tick(
+    engine: ColumnarEngine,
+    wards: Sequence[Dict[str, Any]],
+    batch: Dict[str, Any],
+) -> tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Columnar path: run one batch of readings (arrays aligned with `wards`) through
+    the engine, then materialise the same latest_readings rows as process_reading().
+    Only the wards that reported in the window (batch["reported"]) are stepped,
+    checked and get a new row; the summary covers every ward that has reported.
+    """
+    rows: np.ndarray = np.flatnonzero(batch["reported"])
+    result: Dict[str, Any] = engine.step(batch["aqi"], rows)
+    pipeline_metrics.add_all(engine.timings)
+    pipeline_stats["total_events"] = int(pipeline_stats["total_events"]) + int(batch["readings"])
+
+    aqis: List[int] = batch["aqi"].tolist()
+    for i in result["spike_index"].tolist():
+        spike_info: Dict[str, Any] = engine.spike_info(i)
+        record_spike(wards[i], aqis[i], spike_info)
+    # Wards that never reported: their baseline, as in ward mode
+    update_spatial(wards, batch["aqi"], np.where(engine.seq > 0, result["rolling_avg"], batch["aqi"]))
+    update_forecast(wards, batch["aqi"], rows)
+    update_sub_index()
+    checking: float = time.perf_counter()
+    lifecycle: AlertLifecycle = ward_alert_lifecycle(wards)
+    transitions: List[Dict[str, Any]] = lifecycle.step(batch["aqi"], clock.iso(), rows)
+    pipeline_metrics.add("threshold_check", time.perf_counter() - checking)
+    record_alert_transitions(transitions)
+    alerts: Dict[int, Dict[str, Any]] = {
+        lifecycle.index[t["ward_id"]]: t["alert"] for t in transitions if t["transition"] in RAISING
+    }
+
+    started: float = time.perf_counter()
+    bands: np.ndarray = rag_index["band_array"][np.clip(batch["aqi"], 0, RAG_MAX_AQI)]
+    for row in build_ward_rows(
+        wards, batch, result, engine.window_stats(), bands, alerts, get_aqi_level, clock.iso(),
+        None if len(rows) == len(wards) else rows,
+    ):
+        latest_readings[row["ward_id"]] = row
+    ward_updates: List[Dict[str, Any]] = [
+        latest_readings[str(w["id"])] for w in wards if str(w["id"]) in latest_readings
+    ]
+    pipeline_metrics.add("rows", time.perf_counter() - started)
+
+    city: Dict[str, Any] = result["city_summary"]
+    summary: Dict[str, Any] = {
+        "avg_aqi":        city["avg_aqi"],
+        "max_aqi":        city["max_aqi"],
+        "aqi_level":      get_aqi_level(int(city["avg_aqi"])),
+        "critical_wards": city["critical_wards"],
+        "total_wards":    city["total_wards"],
+    }
+    return ward_updates, summary
+
+
+def window_batcher(index: Mapping[str, int]) -> Callable[[Iterable[List[Reading]]], Optional[tuple[Dict[str, Any], float]]]:
+    """
+    Ingestion for the batched modes: one batch per tumbling window, each
+    ward's readings collapsed to one (window_batch), aligned with WARDS.
+    The returned function maps a window to (batch, seconds spent ingesting
+    it), or None when the window held no usable reading.
+    """
+    tick: int = 0
+    base_aqi: np.ndarray = np.array([int(w["base_aqi"]) for w in WARDS], dtype=np.int64)
+    # Wards that have not reported yet hold their baseline
+    previous: Dict[str, np.ndarray] = {"aqi": base_aqi.copy()}
+    for name, ratio in POLLUTANT_RATIOS.items():
+        previous[name] = np.round(base_aqi * ratio, 2)
+    ward_ids: List[str] = [str(w["id"]) for w in WARDS]
+    start_event_windows(ward_ids)
+    if history_store is not None:
+        history_store.start()
+
+    def collect(window: Iterable[List[Reading]]) -> Optional[tuple[Dict[str, Any], float]]:
+        nonlocal tick
+        rows: List[Reading] = []
+        parts: List[Dict[str, np.ndarray]] = []
+        busy: float = 0.0
+        for chunk in window:
+            started: float = time.perf_counter()
+            idx, times, columns = ingest_chunk(chunk, ward_ids, index)
+            # Unknown wards, future-stamped readings and concentration-only readings
+            # still without an AQI (all idx -1) are rejected here
+            keep: np.ndarray = in_event_order(idx, times) & (idx >= 0)
+            if keep.all():
+                rows.extend(chunk)
+                parts.append(columns)
+            else:
+                ingest_queue.reject(int((idx < 0).sum()))
+                rows.extend([r for r, ok in zip(chunk, keep.tolist()) if ok])
+                parts.append({name: column[keep] for name, column in columns.items()})
+            busy += time.perf_counter() - started
+        if not rows:
+            return None
+        started = time.perf_counter()
+        resolved: Dict[str, np.ndarray] = parts[0] if len(parts) == 1 else {
+            name: np.concatenate([part[name] for part in parts]) for name in parts[0]
         }
+        batch, unknown = window_batch(rows, index, previous, tick, resolved)
+        ingest_queue.reject(unknown)
+        if unknown == len(rows):
+            return None
+        busy += time.perf_counter() - started
+        pipeline_metrics.add("ingest", busy)
+        tick = tick + 1
+        return batch, busy
 
-        broadcast(output_event)
-        log_event("PIPELINE_TICK", {
-            "tick":           tick,
-            "city_avg":       city_avg,
-            "city_max":       city_max,
-            "critical_wards": critical_count,
-        }, "info")
-
-        print(
-            f"[Pathway] Tick {tick}: CityAvgAQI={city_avg} | "
-            f"Max={city_max} | Critical={critical_count} | "
-            f"Clients={len(stream_listeners)}"
-        )
-        tick = tick + 1  # type: ignore[operator]
-        time.sleep(5)
+    return collect
+
+
+def columnar_tick_step() -> tuple[TickStep, Collection[str]]:
+    """
+    Batched variant of ward_tick_step() for large ward grids: each window's
+    readings are collapsed to one per ward (window_batch) and run in one step.
+    """
+    engine: ColumnarEngine = new_columnar_engine(WARDS)
+    ward_ids: List[str] = [str(w["id"]) for w in WARDS]
+    ward_types: List[str] = [str(w["type"]) for w in WARDS]
+    log.info("[Pathway Engine] Starting AQI Streaming Pipeline (columnar mode)...")
+    log.info("[Pathway Engine] Ingesting AQI sensor streams from %d wards...", len(WARDS))
+    collect = window_batcher(engine.index)
+
+    def step(window: Iterable[List[Reading]]) -> Optional[Dict[str, Any]]:
+        collected: Optional[tuple[Dict[str, Any], float]] = collect(window)
+        if collected is None:
+            return None
+        batch, ingest_s = collected
+        started: float = time.perf_counter()
+        ward_updates, summary = process_columnar_tick(engine, WARDS, batch)
+        refresh_reported_retrievals(engine.seq > 0, ward_ids, batch, ward_types)
+        out: Dict[str, Any] = emit_tick(int(batch["tick"]), ward_updates, summary, advance_event_windows())
+        pipeline_metrics.end_tick(ingest_s + time.perf_counter() - started)
+        return out
+
+    return step, engine.index
+
+
+def columnar_pipeline() -> None:
+    run_ticks(*columnar_tick_step())
+
+
+# ─────────────────────────────────────────────
+#  Sharded engine mode (PATHWAY_ENGINE_MODE=sharded)
+#  Columnar ticks computed in worker processes (shards.py)
+# ─────────────────────────────────────────────
+def new_shard_pool(wards: Sequence[Dict[str, Any]], shards: int) -> ShardPool:
+    return ShardPool(
+        wards, shards, columnar_settings(),
+        [get_aqi_level(aqi) for aqi in range(RAG_MAX_AQI + 1)], alert_settings(),
+    )
+
+
+def process_sharded_tick(
+    pool: ShardPool,
+    wards_by_id: Mapping[str, Dict[str, Any]],
+    batch: Dict[str, Any],
+) -> tuple[Dict[str, Any], Dict[str, bytes]]:
+    """
+    Sharded path: the workers step their partitions; the front process only
+    records their spikes / alert transitions and merges the city summary. Returns the
+    summary and the encoded ward rows / patches for emit_tick().
+    """
+    batch["rag_band"] = rag_index["band_array"][np.clip(batch["aqi"], 0, RAG_MAX_AQI)]
+    out: Dict[str, Any] = pool.step(batch, int(batch["tick"]), clock.iso())
+    pipeline_metrics.add_all(out["timings"])
+    pipeline_stats["total_events"] = int(pipeline_stats["total_events"]) + int(batch["readings"])
+    for spike_info in out["spikes"]:
+        record_spike(wards_by_id[spike_info["ward_id"]], int(spike_info["current_aqi"]), spike_info)
+    update_spatial(
+        WARDS, batch["aqi"], np.where(pool.row_tick >= 0, pool.columns.arrays["rolling_avg"][pool.slot], batch["aqi"])
+    )
+    update_forecast(WARDS, batch["aqi"], np.flatnonzero(batch["reported"]))
+    update_sub_index()
+    record_alert_transitions(out["transitions"])
+    city: Dict[str, Any] = out["city_summary"]
+    summary: Dict[str, Any] = {
+        "avg_aqi":        city["avg_aqi"],
+        "max_aqi":        city["max_aqi"],
+        "aqi_level":      get_aqi_level(int(city["avg_aqi"])),
+        "critical_wards": city["critical_wards"],
+        "total_wards":    city["total_wards"],
+    }
+    return summary, out["encoded_wards"]
+
+
+def sharded_tick_step() -> tuple[TickStep, Collection[str]]:
+    """
+    columnar_tick_step() with the tick compute in SHARD_COUNT worker processes;
+    latest_readings becomes a read-only view over their shared columns.
+    """
+    global latest_readings, shard_pool  # noqa: PLW0603
+    pool: ShardPool = new_shard_pool(WARDS, SHARD_COUNT)
+    atexit.register(pool.close)
+    shard_pool = pool
+    latest_readings = pool.readings  # type: ignore[assignment]
+    wards_by_id: Dict[str, Dict[str, Any]] = {str(w["id"]): w for w in WARDS}
+    ward_ids: List[str] = [str(w["id"]) for w in WARDS]
+    ward_types: List[str] = [str(w["type"]) for w in WARDS]
+    log.info("[Pathway Engine] Starting AQI Streaming Pipeline (sharded mode, %d workers)...", len(pool))
+    log.info("[Pathway Engine] Ingesting AQI sensor streams from %d wards...", len(WARDS))
+    collect = window_batcher(pool.index)
+
+    def step(window: Iterable[List[Reading]]) -> Optional[Dict[str, Any]]:
+        collected: Optional[tuple[Dict[str, Any], float]] = collect(window)
+        if collected is None:
+            return None
+        batch, ingest_s = collected
+        started: float = time.perf_counter()
+        summary, encoded_wards = process_sharded_tick(pool, wards_by_id, batch)
+        refresh_reported_retrievals(pool.row_tick >= 0, ward_ids, batch, ward_types)
+        out: Dict[str, Any] = emit_tick(int(batch["tick"]), [], summary, advance_event_windows(), encoded_wards)
+        pipeline_metrics.end_tick(ingest_s + time.perf_counter() - started)
+        return out
+
+    return step, pool.index
+
+
+def sharded_pipeline() -> None:
+    run_ticks(*sharded_tick_step())
+
+
+# ─────────────────────────────────────────────
+#  Async runtime (PATHWAY_RUNTIME=async)
+#  The pipeline as a task on the server's event loop
+# ─────────────────────────────────────────────
+TICK_STEPS: Dict[str, Callable[[], tuple[TickStep, Collection[str]]]] = {
+    "ward":     ward_tick_step,
+    "columnar": columnar_tick_step,
+    "sharded":  sharded_tick_step,
+}
+
+
+def new_tick_executor() -> Optional[Executor]:
+    """PATHWAY_EXECUTOR: one worker thread for the tick compute, or None to run it on the loop."""
+    if TICK_EXECUTOR == "inline":
+        return None
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="pathway-tick")
+
+
+async def async_pipeline(mode: str = ENGINE_MODE, executor: Optional[Executor] = None) -> None:
+    """
+    Ticks on a fixed schedule (start + n * TICK_INTERVAL_S), so processing time
+    never shifts later ticks; a tick that overruns its slot skips the slots it
+    covered rather than firing them back to back. Each tick is computed on
+    `executor` (None: on the loop) - ticks are sequential, the compute holds
+    all engine state - and published from the loop. A replay runs back to back.
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+
+    async def run(fn: Callable[..., Any], *args: Any) -> Any:
+        return fn(*args) if executor is None else await loop.run_in_executor(executor, fn, *args)
+
+    step, _ = await run(TICK_STEPS.get(mode, ward_tick_step))
+    windows: Iterator[Iterable[List[Reading]]] = (
+        replay_windows() if replay is not None else scheduled_windows(start_connectors(threaded_simulator=False))
+    )
+
+    def next_tick() -> tuple[bool, Optional[Dict[str, Any]]]:
+        window: Optional[Iterable[List[Reading]]] = next(windows, None)
+        return (False, None) if window is None else (True, step(window))
+
+    interval: float = 0.0 if replay is not None else TICK_INTERVAL_S
+    start: float = loop.time()
+    slot: int = 0
+    while True:
+        more, out = await run(next_tick)
+        if not more:
+            return
+        if out is not None:
+            publish_tick(out)
+        if not interval:
+            continue
+        slot += 1
+        late: float = loop.time() - (start + slot * interval)
+        if late > 0:
+            missed: int = int(late // interval) + 1
+            slot += missed
+            pipeline_metrics.skip(missed)
+        await asyncio.sleep(start + slot * interval - loop.time())
+
+
+@asynccontextmanager
+async def async_runtime() -> AsyncIterator[None]:
+    """PATHWAY_RUNTIME=async: the pipeline starts and stops with the server."""
+    if RUNTIME != "async":
+        yield
+        return
+    executor: Optional[Executor] = new_tick_executor()
+    task: asyncio.Task[None] = asyncio.create_task(async_pipeline(ENGINE_MODE, executor), name="pathway-pipeline")
+
+    def finished(t: asyncio.Task[None]) -> None:
+        if not t.cancelled() and t.exception() is not None:
+            log.error("[Pathway Engine] Pipeline stopped: %r", t.exception())
+
+    task.add_done_callback(finished)
+    log.info("[Pathway Engine] Async runtime (%s executor)", "inline" if executor is None else "thread")
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+@asynccontextmanager
+async def tick_publishing() -> AsyncIterator[None]:
+    """PATHWAY_PUBSUB: publish every tick on a Unix socket for output workers and the Node bridge."""
+    global tick_publisher  # noqa: PLW0603
+    if not PUBSUB_PATH:
+        yield
+        return
+    tick_publisher = TickPublisher(PUBSUB_PATH)
+    log.info("[Pathway Engine] Publishing ticks on %s", PUBSUB_PATH)
+    try:
+        yield
+    finally:
+        publisher: TickPublisher = tick_publisher
+        tick_publisher = None
+        publisher.close()
+
+
+@asynccontextmanager
+async def output_relay() -> AsyncIterator[None]:
+    """
+    PATHWAY_ROLE=worker: no pipeline. Ticks subscribed from PATHWAY_PUBSUB go
+    through broadcast() (reusing the engine's encoding of the full event) on
+    the subscriber thread; their state is published on the loop.
+    """
+    global tick_subscriber  # noqa: PLW0603
+    if not PUBSUB_PATH:
+        raise RuntimeError("PATHWAY_ROLE=worker needs PATHWAY_PUBSUB (the engine's tick socket)")
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    relayed: Dict[str, Any] = {}   # last tick event, until its state arrives
+
+    def handle(topic: bytes, payload: bytes) -> None:
+        if topic == TOPIC_TICK:
+            event: Dict[str, Any] = json.loads(payload)
+            broadcast(event, body=payload)
+            relayed["event"] = event
+        elif topic == TOPIC_STATE:
+            state: Dict[str, Any] = json.loads(payload)
+            tick_event: Optional[Dict[str, Any]] = relayed.get("event")
+            if tick_event is not None and tick_event["tick"] == state["tick"]:
+                loop.call_soon_threadsafe(publish_relayed_tick, tick_event, state)
+
+    subscriber: TickSubscriber = TickSubscriber(PUBSUB_PATH, handle)
+    tick_subscriber = subscriber
+    subscriber.start()
+    log.info("[Pathway Worker] Serving ticks from %s (pid %d)", PUBSUB_PATH, os.getpid())
+    try:
+        yield
+    finally:
+        subscriber.stop()
+
+
+@asynccontextmanager
+async def lifespan(_: Any) -> AsyncIterator[None]:
+    """What starts and stops with the server: tick publishing and the async pipeline, or a worker's relay."""
+    if ROLE == "worker":
+        async with output_relay():
+            yield
+        return
+    async with tick_publishing(), async_runtime():
+        yield
 
 
 # ─────────────────────────────────────────────
 #  FastAPI App — Output Layer
 # ─────────────────────────────────────────────
-app = FastAPI(title="CityAirWatch Pathway Engine", version="1.0.0")
+app = FastAPI(title="CityAirWatch Pathway Engine", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -407,62 +1749,23 @@ app.add_middleware(
 )
 
 
-@app.get("/stream")
-async def stream_endpoint() -> StreamingResponse:
-    """SSE endpoint — Pathway output connector -> Dashboard."""
-    client_queue: asyncio.Queue[str] = asyncio.Queue(maxsize=100)
-    with stream_lock:
-        stream_listeners.append(client_queue)
-
-    async def event_generator():  # type: ignore[no-untyped-def]
-        # Send current state immediately as snapshot
-        if latest_readings:
-            city_aqis_snap: List[int] = [int(v["aqi"]) for v in latest_readings.values()]
-            avg_snap: float = round(float(sum(city_aqis_snap)) / float(len(city_aqis_snap)), 1)  # type: ignore[call-overload]
-            snapshot: Dict[str, Any] = {
-                "event":     "snapshot",
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "city_summary": {
-                    "avg_aqi":        avg_snap,
-                    "max_aqi":        max(city_aqis_snap),
-                    "aqi_level":      get_aqi_level(int(avg_snap)),
-                    "critical_wards": sum(1 for a in city_aqis_snap if a > 150),
-                    "total_wards":    len(WARDS),
-                },
-                "wards":         list(latest_readings.values()),
-                "active_alerts": list(active_alerts.values()),
-                "pipeline":      {
-                    "stats": {
-                        "total_events":      int(pipeline_stats["total_events"]),
-                        "spikes_detected":   int(pipeline_stats["spikes_detected"]),
-                        "alerts_triggered":  int(pipeline_stats["alerts_triggered"]),
-                        "windows_processed": int(pipeline_stats["windows_processed"]),
-                        "started_at":        PIPELINE_STARTED_AT,
-                    }
-                },
-            }
-            yield f"data: {json.dumps(snapshot)}\n\n"
+def delta_snapshot_frame(state: Dict[str, Any]) -> bytes:
+    """Encoded snapshot for delta clients, built once per seq however many clients connect."""
+    if delta_snapshot_cache["seq"] != state["seq"]:
+        delta_snapshot_cache["frame"] = encode_sse(
+            snapshot_event(state), delta_hub.event_id(delta_hub.delivered_id)
+        )
+        delta_snapshot_cache["seq"] = state["seq"]
+    return delta_snapshot_cache["frame"]
 
-        try:
-            while True:
-                try:
-                    payload: str = await asyncio.wait_for(client_queue.get(), timeout=3.0)
-                    yield f"data: {payload}\n\n"
-                except asyncio.TimeoutError:
-                    hb: str = json.dumps({
-                        "event":     "heartbeat",
-                        "timestamp": datetime.now(timezone.utc).isoformat(),
-                    })
-                    yield f"data: {hb}\n\n"
-        except GeneratorExit:
-            pass
-        finally:
-            with stream_lock:
-                if client_queue in stream_listeners:
-                    stream_listeners.remove(client_queue)
 
+def sse_clients() -> int:
+    return len(stream_hub) + len(delta_hub) + topic_router.clients()
+
+
+def sse_response(generator: Any) -> StreamingResponse:
     return StreamingResponse(
-        event_generator(),
+        generator,
         media_type="text/event-stream",
         headers={
             "Cache-Control":               "no-cache",
@@ -472,44 +1775,446 @@ async def stream_endpoint() -> StreamingResponse:
     )
 
 
+async def live_frames(hub: FanoutHub, client: Subscriber):  # type: ignore[no-untyped-def]
+    try:
+        # Ticks and heartbeats are shared bytes frames from the hub;
+        # a dropped (too slow) client gets None and its stream ends
+        while True:
+            frame: Optional[bytes] = await client.next_frame()
+            if frame is None:
+                break
+            yield frame
+    except GeneratorExit:
+        pass
+    finally:
+        hub.unsubscribe(client)
+
+
+async def full_stream(client: Subscriber, replay: Optional[List[bytes]]):  # type: ignore[no-untyped-def]
+    if replay is not None:
+        # Resumed via Last-Event-ID: missed ticks instead of a snapshot
+        for frame in replay:
+            yield frame
+    elif poll_snapshot["event"] is not None:
+        # State of the last tick as snapshot, encoded once per tick however many clients connect
+        yield encode_sse(poll_body(poll_snapshot, "stream"), stream_hub.event_id(stream_hub.delivered_id))
+
+    async for frame in live_frames(stream_hub, client):
+        yield frame
+
+
+async def delta_stream(client: Subscriber, replay: Optional[List[bytes]]):  # type: ignore[no-untyped-def]
+    if replay is not None:
+        for frame in replay:
+            yield frame
+    else:
+        # Snapshot matches the hub cursor exactly, so the next delta applies on top of it
+        state: Optional[Dict[str, Any]] = delta_hub.context
+        if state is not None:
+            yield delta_snapshot_frame(state)
+
+    async for frame in live_frames(delta_hub, client):
+        yield frame
+
+
+async def filtered_stream(projection: Projection, client: Subscriber, replay: Optional[List[bytes]]):  # type: ignore[no-untyped-def]
+    if replay is not None:
+        for frame in replay:
+            yield frame
+    else:
+        # Last projected tick, encoded once per tick for every client of this filter
+        snap: Dict[str, Any] = poll_snapshot
+        frame: Optional[bytes] = projection.snapshot_frame(snap["alerts"], snap["etag"])
+        if frame is not None:
+            yield frame
+
+    async for frame in live_frames(projection.hub, client):
+        yield frame
+
+
+@app.get("/stream", response_model=None)
+async def stream_endpoint(
+    request: Request,
+    mode: str = "full",
+    last_event_id: Optional[str] = None,
+    wards: Optional[str] = None,
+    topics: Optional[str] = None,
+) -> StreamingResponse | JSONResponse:
+    """
+    SSE endpoint — Pathway output connector -> Dashboard.
+    mode=full  : every tick carries the complete aqi_update event (default)
+    mode=delta : snapshot on connect, then seq-numbered aqi_delta events (see delta.py)
+    wards=ward_3,ward_6 / topics=alerts,summary (mode=full): only that part of
+    every tick (see topics.py); clients with the same filter share one encoding.
+    Reconnecting clients send Last-Event-ID (header, or ?last_event_id=) and are
+    replayed the ticks they missed from the hub journal instead of a snapshot.
+    """
+    resume: Optional[str] = request.headers.get("last-event-id") or last_event_id
+    if wards is not None or topics is not None:
+        if mode != "full":
+            return JSONResponse({"error": "wards / topics filters apply to mode=full"}, status_code=400)
+        try:
+            flt: Optional[StreamFilter] = parse_filter(wards, topics, ward_spatial_index(WARDS).position)
+        except ValueError as exc:
+            return JSONResponse({"error": str(exc)}, status_code=400)
+        if flt is not None:
+            joined: Optional[tuple[Projection, Subscriber]] = topic_router.subscribe(flt)
+            if joined is None:
+                return JSONResponse({"error": "too many distinct stream filters; retry later"}, status_code=503)
+            projection, sub = joined
+            return sse_response(filtered_stream(projection, sub, projection.hub.replay_since(resume)))
+    hub: FanoutHub = delta_hub if mode == "delta" else stream_hub
+    client: Subscriber = hub.subscribe()
+    replay: Optional[List[bytes]] = hub.replay_since(resume)
+    if mode == "delta":
+        return sse_response(delta_stream(client, replay))
+    return sse_response(full_stream(client, replay))
+
+
 @app.get("/status")
 async def status() -> Dict[str, Any]:
-    """Pathway pipeline status endpoint."""
+    """Pathway pipeline status endpoint (counters as of the last published tick)."""
+    state: Dict[str, Any] = engine_state or engine_state_payload()
     return {
         "status":        "running",
         "pipeline":      "Pathway Streaming Engine v1.0",
-        "stats": {
-            "total_events":      int(pipeline_stats["total_events"]),
-            "spikes_detected":   int(pipeline_stats["spikes_detected"]),
-            "alerts_triggered":  int(pipeline_stats["alerts_triggered"]),
-            "windows_processed": int(pipeline_stats["windows_processed"]),
-            "started_at":        PIPELINE_STARTED_AT,
-        },
-        "wards":         len(latest_readings),
-        "active_alerts": len(active_alerts),
-        "clients":       len(stream_listeners),
+        "engine_mode":   ENGINE_MODE,
+        "runtime":       RUNTIME,
+        "role":          ROLE,
+        "tick":          state["tick"],
+        "stats":         state["stats"],
+        "wards":         state["wards"],
+        "active_alerts": state["active_alerts"],
+        "clients":       sse_clients(),
+        "ingest":        ingest_queue.stats(),
+        "history":       history_store.stats() if history_store is not None else None,
+        "pubsub":        pubsub_stats(),
         "doc_store": {
             "guidelines": len(DOCUMENT_STORE["who_guidelines"]),
             "rules":      len(DOCUMENT_STORE["govt_rules"]),
-            "indexed_at": PIPELINE_STARTED_AT,
+            "rag_bands":  len(rag_index["contexts"]),
+            "documents":  len(doc_index.documents),
+            "chunks":     len(doc_index.chunks),
+            "version":    rag_index["version"],
+            "indexed_at": rag_index["indexed_at"],
         },
     }
 
 
+@app.post("/ingest")
+async def ingest_readings(request: Request) -> JSONResponse:
+    """
+    HTTP batch connector: a JSON array of readings ({"ward_id", "aqi", ...})
+    or {"readings": [...]}. 202 when every valid reading was queued, 429 with
+    Retry-After when the queue was full and some were dropped.
+    """
+    if ROLE == "worker":
+        return JSONResponse({"error": "output worker: send readings to the engine process"}, status_code=421)
+    try:
+        payload: Any = json.loads(await request.body())
+        result: Dict[str, int] = http_connector.submit(payload)
+    except ValueError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=400)
+    if result["dropped"]:
+        return JSONResponse(result, status_code=429, headers={"Retry-After": "1"})
+    return JSONResponse(result, status_code=202)
+
+
+@app.get("/ingest")
+async def ingest_status() -> Dict[str, Any]:
+    """Queue depth, drop / overflow counters and per-connector stats."""
+    return {
+        "queue":      ingest_queue.stats(),
+        "connectors": [c.stats() for c in connectors],
+        "sub_index":  sub_index_engine.stats() if sub_index_engine is not None else None,
+    }
+
+
+@app.get("/windows")
+async def get_event_windows(limit: int = 20) -> Dict[str, Any]:
+    """Event-time windows: watermark, lateness counters and the latest emissions."""
+    state: Dict[str, Any] = engine_state or engine_state_payload()
+    recent: tuple[Dict[str, Any], ...] = state["window_log"][-limit:] if limit > 0 else ()
+    return {"windows": state["windows"], "recent": list(reversed(recent))}
+
+
+@app.get("/windows/{ward_id}")
+async def get_ward_event_windows(ward_id: str) -> Dict[str, Any]:
+    """Latest event-time window result per window for one ward."""
+    if ward_id not in latest_readings:
+        return {"error": "Ward not found"}
+    return {"ward_id": ward_id, "windows": event_window_latest.get(ward_id, {})}
+
+
+@app.get("/history/{ward_id}")
+async def get_history(
+    ward_id: str,
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+    resolution: float = 60.0,
+) -> Dict[str, Any]:
+    """
+    Downsampled reading history from the segment store. from / to: ISO-8601 or
+    epoch seconds (default: the last 24h); resolution: bucket size in seconds.
+    """
+    if history_store is None:
+        return {"error": "History store is disabled (PATHWAY_HISTORY_DIR is empty)"}
+    now: float = time.time()
+    t_to: float = float(event_times([to])[0]) if to else now
+    t_from: float = float(event_times([from_])[0]) if from_ else t_to - 86400.0
+    if not (math.isfinite(t_from) and math.isfinite(t_to)):
+        return {"error": "'from' / 'to' must be ISO-8601 timestamps or epoch seconds"}
+    try:
+        # Segment scans run off the event loop
+        return await asyncio.to_thread(history_store.query, ward_id, t_from, t_to, resolution)
+    except ValueError as exc:
+        return {"error": str(exc)}
+
+
+def poll_payload(part: str, event: Optional[Dict[str, Any]], alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """`alerts`: the active alerts as of the tick (the event itself carries only transitions)."""
+    if event is None:
+        # No tick yet: live (empty) state
+        wards: List[Dict[str, Any]] = list(latest_readings.values())
+        if part == "wards":
+            return {"wards": wards}
+        if part == "alerts":
+            return {"alerts": alerts}
+        return {"tick": None, "timestamp": None, "city_summary": None,
+                "wards": wards, "alerts": alerts, "stats": pipeline_stats_payload()}
+    if part == "wards":
+        return {"wards": event["wards"]}
+    if part == "alerts":
+        return {"alerts": alerts}
+    if part == "stream":
+        # Snapshot a new full-mode SSE client starts from
+        return {
+            "event":         "snapshot",
+            "timestamp":     event["timestamp"],
+            "city_summary":  event["city_summary"],
+            "wards":         event["wards"],
+            "active_alerts": alerts,
+            "rag_bands":     event["rag_bands"],
+            "pipeline":      {"stats": event["pipeline"]["stats"]},
+        }
+    return {
+        "tick":              event["tick"],
+        "timestamp":         event["timestamp"],
+        "city_summary":      event["city_summary"],
+        "wards":             event["wards"],
+        "alerts":            alerts,
+        "alert_transitions": event["alert_transitions"],
+        "stats":             event["pipeline"]["stats"],
+    }
+
+
+def poll_body(snap: Dict[str, Any], part: str) -> bytes:
+    """JSON body of one part of a tick snapshot, encoded on first use and cached with it."""
+    body: Optional[bytes] = snap["bodies"].get(part)
+    if body is None:
+        payload: Dict[str, Any] = poll_payload(part, snap["event"], snap["alerts"])
+        if snap["wards_json"] is not None and "wards" in payload:
+            body = splice_json(payload, "wards", snap["wards_json"])
+        else:
+            body = json.dumps(payload).encode("utf-8")
+        if snap["etag"]:
+            snap["bodies"][part] = body
+    return body
+
+
+def poll_etag(version: str, part: str) -> str:
+    """ETag of one polling endpoint for a tick version: the endpoints share a tick, not a body."""
+    return f'{version[:-1]}-{part}"' if version else ""
+
+
+def poll_response(request: Request, part: str) -> Response:
+    """
+    Per-tick cached JSON body for a polling endpoint, encoded once per tick.
+    ETag = stream epoch + tick + part; a matching If-None-Match gets 304.
+    """
+    snap: Dict[str, Any] = poll_snapshot
+    etag: str = poll_etag(snap["etag"], part)
+    headers: Dict[str, str] = {"Cache-Control": "no-cache"}
+    if etag:
+        headers["ETag"] = etag
+        inm: str = request.headers.get("if-none-match", "")
+        if inm.strip() == "*" or etag in (t.strip().removeprefix("W/") for t in inm.split(",")):
+            return Response(status_code=304, headers=headers)
+    return Response(content=poll_body(snap, part), media_type="application/json", headers=headers)
+
+
+@app.get("/snapshot")
+async def get_snapshot(request: Request) -> Response:
+    """
+    Wards, alerts, city summary and pipeline stats of the last tick in one
+    response, for pollers (streamBridge.js). Send the ETag back as
+    If-None-Match: 304 until the next tick.
+    """
+    return poll_response(request, "snapshot")
+
+
 @app.get("/wards")
-async def get_wards() -> Dict[str, Any]:
-    return {"wards": list(latest_readings.values())}
+async def get_wards(request: Request) -> Response:
+    return poll_response(request, "wards")
 
 
 @app.get("/alerts")
-async def get_alerts() -> Dict[str, Any]:
-    return {"alerts": list(active_alerts.values())}
+async def get_alerts(
+    request: Request,
+    severity: Optional[str] = None,
+    since: Optional[str] = None,
+    ward: Optional[str] = None,
+) -> Response:
+    """
+    Active alerts. Unfiltered: the last tick's list (ETag / 304 like /snapshot).
+    severity (e.g. CRITICAL), since (ISO-8601 or epoch seconds; alerts whose
+    last transition is at or after it) and ward are answered from the alert
+    store's indexes.
+    """
+    if severity is None and since is None and ward is None:
+        return poll_response(request, "alerts")
+    severities: List[str] = [t[1] for t in ALERT_THRESHOLDS]
+    if severity is not None and severity.upper() not in severities:
+        return JSONResponse({"error": f"severity must be one of {', '.join(severities)}"}, status_code=400)
+    since_s: Optional[float] = float(event_times([since])[0]) if since else None
+    if since_s is not None and not math.isfinite(since_s):
+        return JSONResponse({"error": "'since' must be an ISO-8601 timestamp or epoch seconds"}, status_code=400)
+    alerts: List[Dict[str, Any]] = alert_store.query(severity.upper() if severity else None, since_s, ward)
+    return JSONResponse({"alerts": alerts, "count": len(alerts)})
+
+
+@app.get("/nearby")
+async def get_nearby(
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    radius: float = 2000.0,
+    ward: Optional[str] = None,
+    limit: int = 50,
+) -> Response:
+    """
+    Wards within `radius` metres of lat / lon (or of a ward), nearest first, with
+    AQI and k-nearest-ward average as of the last tick. Answered from the
+    spatial index: the cost follows the wards in range, not the grid size.
+    """
+    index: SpatialIndex = ward_spatial_index(WARDS)
+    if ward is not None:
+        i: Optional[int] = index.position.get(ward)
+        if i is None:
+            return JSONResponse({"error": "Ward not found"}, status_code=404)
+        lat, lon = float(index.lat[i]), float(index.lon[i])
+    if lat is None or lon is None:
+        return JSONResponse({"error": "'lat' and 'lon' (or 'ward') are required"}, status_code=400)
+    # Comparisons are False for nan, so this also rejects nan / inf
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return JSONResponse({"error": "'lat' must be in [-90, 90] and 'lon' in [-180, 180]"}, status_code=400)
+    if not 0.0 < radius <= 50000.0:
+        return JSONResponse({"error": "'radius' must be in (0, 50000] metres"}, status_code=400)
+    ids, dist = index.within(lat, lon, radius)
+    state: Dict[str, Any] = spatial_state
+    aqi: np.ndarray = state["aqi"]
+    knn: Optional[np.ndarray] = state.get("knn_avg")
+    in_range: np.ndarray = aqi[ids]
+    wards: List[Dict[str, Any]] = []
+    for i, d in zip(ids[:max(limit, 0)].tolist(), dist[:max(limit, 0)].tolist()):
+        w: Dict[str, Any] = WARDS[i]
+        value: int = int(aqi[i])
+        k_avg: float = float(knn[i]) if knn is not None else math.nan
+        wards.append({
+            "ward_id":    w["id"],
+            "ward_name":  w["name"],
+            "lat":        w["lat"],
+            "lon":        w["lon"],
+            "distance_m": round(d, 1),  # type: ignore[call-overload]
+            "aqi":        value,
+            "aqi_level":  get_aqi_level(value),
+            "knn_avg":    round(k_avg, 1) if math.isfinite(k_avg) else None,  # type: ignore[call-overload]
+        })
+    return JSONResponse({
+        "lat":      lat,
+        "lon":      lon,
+        "radius_m": radius,
+        "count":    len(ids),
+        "avg_aqi":  round(float(in_range.mean()), 1) if len(ids) else None,  # type: ignore[call-overload]
+        "max_aqi":  int(in_range.max()) if len(ids) else None,
+        "wards":    wards,
+    })
+
+
+@app.get("/forecast/{ward_id}")
+async def get_forecast(ward_id: str) -> Response:
+    """
+    1h / 3h / 6h AQI forecasts for a ward, with a 90% interval, as of the
+    ward's last reading. Served from the per-tick forecast cache; nothing is
+    computed per request.
+    """
+    i: Optional[int] = ward_spatial_index(WARDS).position.get(ward_id)
+    if i is None:
+        return JSONResponse({"error": "Ward not found"}, status_code=404)
+    state: Dict[str, Any] = forecast_state
+    if not state or not state["samples"][i]:
+        return JSONResponse({"error": "No forecast yet"}, status_code=503)
+    at: datetime = datetime.fromtimestamp(float(state["updated"][i]), timezone.utc)
+    horizons: Dict[str, Any] = {}
+    for h, name in enumerate(FORECAST_HORIZONS):
+        value: float = float(state["aqi"][i, h])
+        horizons[name] = {
+            "at":        (at + timedelta(seconds=FORECAST_HORIZONS[name])).isoformat(),
+            "aqi":       round(value),
+            "aqi_level": get_aqi_level(round(value)),
+            "lower":     round(float(state["lower"][i, h])),
+            "upper":     round(float(state["upper"][i, h])),
+        }
+    return JSONResponse({
+        "ward_id":        ward_id,
+        "ward_name":      WARDS[i]["name"],
+        "timestamp":      at.isoformat(),
+        "level":          round(float(state["level"][i]), 1),  # type: ignore[call-overload]
+        "trend_per_hour": round(float(state["trend"][i]) * 3600.0, 1),  # type: ignore[call-overload]
+        "samples":        int(state["samples"][i]),
+        "horizons":       horizons,
+    })
+
+
+@app.get("/subindex/{ward_id}")
+async def get_sub_index(ward_id: str) -> Response:
+    """
+    CPCB AQI of a ward from its pollutant concentrations: each pollutant's
+    average over its averaging period, its sub-index and the dominant
+    pollutant, as of the last tick (served from the per-tick cache).
+    """
+    i: Optional[int] = ward_spatial_index(WARDS).position.get(ward_id)
+    if i is None:
+        return JSONResponse({"error": "Ward not found"}, status_code=404)
+    state: Dict[str, Any] = sub_index_state
+    if not state:
+        return JSONResponse({"error": "No concentrations yet"}, status_code=503)
+    pollutants: Dict[str, Any] = {}
+    for j, name in enumerate(state["pollutants"]):
+        average: float = float(state["average"][j, i])
+        index: float = float(state["sub_index"][j, i])
+        pollutants[name] = {
+            "average":         round(average, 2 if name == "co" else 1) if math.isfinite(average) else None,
+            "averaging_hours": AVERAGING_HOURS[name],
+            "hours":           int(state["hours"][j, i]),
+            "sub_index":       round(index) if math.isfinite(index) else None,
+        }
+    aqi: int = int(state["aqi"][i])
+    dominant: int = int(state["dominant"][i])
+    return JSONResponse({
+        "ward_id":            ward_id,
+        "ward_name":          WARDS[i]["name"],
+        "timestamp":          state["timestamp"],
+        "aqi":                aqi if aqi >= 0 else None,
+        "aqi_level":          get_aqi_level(aqi) if aqi >= 0 else None,
+        "dominant_pollutant": state["pollutants"][dominant] if dominant >= 0 else None,
+        "pollutants":         pollutants,
+    })
 
 
 @app.get("/logs")
 async def get_logs(limit: int = 50) -> Dict[str, Any]:
-    all_events: List[Dict[str, Any]] = list(stream_events)
-    sliced: List[Dict[str, Any]] = all_events[-limit:]  # type: ignore[index]
+    all_events: tuple[Dict[str, Any], ...] = (engine_state or engine_state_payload())["logs"]
+    sliced: tuple[Dict[str, Any], ...] = all_events[-limit:] if limit > 0 else ()
     return {"events": list(reversed(sliced))}
 
 
@@ -523,23 +2228,222 @@ async def get_rag_context(ward_id: str) -> Dict[str, Any]:
         "ward":        reading["ward_name"],
         "current_aqi": reading["aqi"],
         "aqi_level":   reading["aqi_level"],
-        "rag_context": reading["rag_context"],
+        "rag_context": rag_index["contexts"][rag_band(int(reading["aqi"]))],
+        "passages":    ward_passages(ward_id),
         "rolling_avg": reading["rolling_avg"],
         "alert":       reading.get("alert"),
     }
 
 
 @app.get("/docstore")
-async def get_docstore() -> Dict[str, Any]:
-    """Exposes the Pathway Document Store content."""
-    return {"document_store": DOCUMENT_STORE}
+async def get_docstore(limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+    """Exposes the Pathway Document Store content and the indexed documents (paged)."""
+    index: DocumentIndex = doc_index
+    return {
+        "document_store": DOCUMENT_STORE,
+        "index":          index.stats(),
+        "documents":      index.documents[offset:offset + limit],
+    }
+
+
+@app.get("/docstore/search")
+async def search_docstore(q: str, k: int = Query(5, ge=1, le=50)) -> Dict[str, Any]:
+    """Free-text top-k search over the document index."""
+    return {"query": q, "passages": doc_index.search(q, k)}
+
+
+@app.post("/docstore/reload")
+async def reload_docstore(request: Request) -> Dict[str, Any]:
+    """
+    Hot-reload the Document Store: JSON body = new store, or an empty body to
+    re-read PATHWAY_DOCSTORE_FILE. Band contexts are rebuilt before the swap.
+    """
+    raw: bytes = await request.body()
+    if not raw.strip() and not DOCSTORE_FILE:
+        return {"error": "No Document Store given and PATHWAY_DOCSTORE_FILE is not set"}
+
+    def load() -> Dict[str, Any]:
+        if raw.strip():
+            return reload_document_store(json.loads(raw))
+        with open(DOCSTORE_FILE, encoding="utf-8") as fh:
+            return reload_document_store(json.load(fh))
+
+    try:
+        # Parsing and the index rebuild run off the event loop
+        index: Dict[str, Any] = await asyncio.to_thread(load)
+    except (OSError, ValueError, TypeError, KeyError) as exc:
+        return {"error": str(exc)}
+    log_event("DOCSTORE_RELOADED", {"version": index["version"], "bands": len(index["contexts"])}, "info")
+    return {"status": "reloaded", "version": index["version"], "rag_bands": len(index["contexts"])}
+
+
+# ─────────────────────────────────────────────
+#  Observability: Prometheus metrics + sampling profiler
+# ─────────────────────────────────────────────
+def sse_metrics() -> str:
+    """Per-stream client counts, drops and frames, plus the deepest per-client queues."""
+    hubs: Dict[str, FanoutHub] = {"full": stream_hub, "delta": delta_hub}
+    projections: List[Projection] = list(topic_router)
+    depths: List[tuple[int, str, str]] = sorted(
+        [
+            *((sub.depth, name, str(sub.id)) for name, hub in hubs.items() for sub in list(hub.subscribers)),
+            *((sub.depth, "filtered", f"{sub.id}@{p.filter}") for p in projections for sub in list(p.hub.subscribers)),
+        ],
+        reverse=True,
+    )
+    filtered_depth: int = max((s.depth for p in projections for s in list(p.hub.subscribers)), default=0)
+    return "".join((
+        format_metric("pathway_sse_clients", "gauge", "Connected SSE clients.",
+                      [*(({"stream": name}, len(hub)) for name, hub in hubs.items()),
+                       ({"stream": "filtered"}, sum(len(p.hub) for p in projections))]),
+        format_metric("pathway_sse_frames_published_total", "counter", "Frames published per stream.",
+                      [*(({"stream": name}, hub.published) for name, hub in hubs.items()),
+                       ({"stream": "filtered"}, topic_router.published())]),
+        format_metric("pathway_sse_dropped_clients_total", "counter",
+                      "Clients dropped for falling more than the ring size behind.",
+                      [*(({"stream": name}, hub.dropped) for name, hub in hubs.items()),
+                       ({"stream": "filtered"}, topic_router.dropped())]),
+        format_metric("pathway_sse_queue_depth_max", "gauge", "Deepest client queue (frames) per stream.",
+                      [*(({"stream": name}, max((s.depth for s in list(hub.subscribers)), default=0))
+                         for name, hub in hubs.items()),
+                       ({"stream": "filtered"}, filtered_depth)]),
+        format_metric("pathway_sse_projections", "gauge",
+                      "Distinct /stream filters, each projected and encoded once per tick.",
+                      [({}, len(projections))]),
+        format_metric("pathway_sse_client_queue_depth", "gauge",
+                      f"Frames queued per SSE client (deepest {METRICS_MAX_CLIENTS}).",
+                      [({"stream": name, "client": cid}, depth)
+                       for depth, name, cid in depths[:METRICS_MAX_CLIENTS]]),
+    ))
+
+
+def pubsub_stats() -> Optional[Dict[str, Any]]:
+    if tick_publisher is not None:
+        return {"side": "publisher", **tick_publisher.stats()}
+    if tick_subscriber is not None:
+        return {"side": "subscriber", **tick_subscriber.stats()}
+    return None
+
+
+def pubsub_metrics() -> str:
+    if tick_publisher is not None:
+        pub: Dict[str, Any] = tick_publisher.stats()
+        return "".join((
+            format_metric("pathway_pubsub_subscribers", "gauge", "Output processes subscribed to the tick socket.",
+                          [({}, pub["subscribers"])]),
+            format_metric("pathway_pubsub_messages_total", "counter", "Messages published on the tick socket.",
+                          [({}, pub["messages"])]),
+            format_metric("pathway_pubsub_dropped_subscribers_total", "counter",
+                          "Subscribers disconnected for falling too far behind.", [({}, pub["dropped"])]),
+            format_metric("pathway_pubsub_pending_bytes_max", "gauge", "Largest unsent backlog of a subscriber.",
+                          [({}, pub["pending_max"])]),
+        ))
+    if tick_subscriber is not None:
+        sub: Dict[str, Any] = tick_subscriber.stats()
+        return "".join((
+            format_metric("pathway_pubsub_connected", "gauge", "Subscribed to the engine's tick socket.",
+                          [({}, int(sub["connected"]))]),
+            format_metric("pathway_pubsub_messages_total", "counter", "Messages received from the tick socket.",
+                          [({"outcome": "received"}, sub["received"]), ({"outcome": "rejected"}, sub["errors"])]),
+        ))
+    return ""
+
+
+def process_metrics() -> str:
+    rss: List[tuple[Dict[str, str], float]] = []
+    own: Optional[int] = process_rss_bytes()
+    if own is not None:
+        rss.append(({"process": "engine"}, own))
+    if shard_pool is not None:
+        for proc in list(shard_pool.procs):
+            shard_rss: Optional[int] = process_rss_bytes(proc.pid)
+            if shard_rss is not None:
+                rss.append(({"process": str(proc.name)}, shard_rss))
+    return format_metric("pathway_process_resident_memory_bytes", "gauge", "Resident set size.", rss)
+
+
+def metrics_text() -> str:
+    queue: Dict[str, Any] = ingest_queue.stats()
+    counters: List[tuple[str, str, str]] = [
+        ("pathway_events_total", "total_events", "Readings processed."),
+        ("pathway_spikes_total", "spikes_detected", "Spikes detected."),
+        ("pathway_alerts_total", "alerts_triggered", "Threshold alerts raised."),
+        ("pathway_late_readings_total", "late_readings", "Readings older than their ward's clock."),
+        ("pathway_future_readings_total", "future_readings", "Readings stamped too far ahead of the engine clock (rejected)."),
+    ]
+    parts: List[str] = [
+        format_metric("pathway_engine_info", "gauge", "Engine mode.", [({"mode": ENGINE_MODE}, 1)]),
+        pipeline_metrics.render(),
+        *(format_metric(name, "counter", help_text, [({}, int(pipeline_stats[key]))])
+          for name, key, help_text in counters),
+        format_metric("pathway_ingest_queue_depth", "gauge", "Readings waiting in the ingest queue.",
+                      [({}, queue["depth"])]),
+        format_metric("pathway_ingest_queue_capacity", "gauge", "Ingest queue capacity.", [({}, queue["capacity"])]),
+        format_metric("pathway_ingest_readings_total", "counter", "Readings offered to the ingest queue.",
+                      [({"outcome": k}, queue[k]) for k in ("accepted", "dropped", "rejected")]),
+        sse_metrics(),
+        pubsub_metrics(),
+        process_metrics(),
+    ]
+    if history_store is not None:
+        history: Dict[str, Any] = history_store.stats()
+        parts.append(format_metric("pathway_history_records_written_total", "counter",
+                                   "Records written to the history store.", [({}, history["records_written"])]))
+        parts.append(format_metric("pathway_history_pending_chunks", "gauge",
+                                   "Chunks waiting for the history writer.", [({}, history["pending_chunks"])]))
+    console: Optional[BufferedConsole] = console_handler(log)
+    if console is not None:
+        parts.append(format_metric("pathway_log_lines_total", "counter", "Console log lines written / dropped.",
+                                   [({"outcome": "written"}, console.written), ({"outcome": "dropped"}, console.dropped)]))
+    parts.append(format_metric("pathway_profiler_running", "gauge", "1 while the sampling profiler runs.",
+                               [({}, int(profiler.running))]))
+    return "".join(parts)
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus text exposition (stage latency, tick drift, SSE queues, RSS)."""
+    return Response(metrics_text(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/profile")
+async def profile_status() -> Dict[str, Any]:
+    return {**profiler.status(), "dir": PROFILE_DIR}
+
+
+@app.post("/profile/start")
+async def profile_start(interval_ms: float = Query(5.0, gt=0)) -> JSONResponse:
+    """Start sampling every thread's stack every interval_ms."""
+    try:
+        profiler.start(interval_ms / 1000.0)
+    except RuntimeError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=409)
+    return JSONResponse(profiler.status())
+
+
+@app.post("/profile/stop")
+async def profile_stop() -> JSONResponse:
+    """Stop sampling and write a folded-stack file (flamegraph.pl / speedscope input)."""
+    try:
+        result: Dict[str, Any] = await asyncio.to_thread(profiler.stop)
+    except RuntimeError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=409)
+    return JSONResponse(result)
 
 
 # ─────────────────────────────────────────────
 #  Entry Point
 # ─────────────────────────────────────────────
 if __name__ == "__main__":
-    pipeline_thread: threading.Thread = threading.Thread(target=pathway_pipeline, daemon=True)
-    pipeline_thread.start()
-    print("[FastAPI] Starting output server on http://localhost:5000")
-    uvicorn.run(app, host="0.0.0.0", port=5000, log_level="warning")
+    if ROLE == "worker":
+        # Stateless output processes: each imports this module and subscribes on its own
+        log.info("[FastAPI] Starting %d output worker(s) on http://localhost:%d", WORKERS, PORT)
+        uvicorn.run("pathway_engine:app", host="0.0.0.0", port=PORT, workers=WORKERS, log_level="warning")
+        raise SystemExit(0)
+    if RUNTIME != "async":
+        # Async runtime: started by the app's lifespan instead
+        pipeline_target = {"columnar": columnar_pipeline, "sharded": sharded_pipeline}.get(ENGINE_MODE, pathway_pipeline)
+        pipeline_thread: threading.Thread = threading.Thread(target=pipeline_target, daemon=True)
+        pipeline_thread.start()
+    log.info("[FastAPI] Starting output server on http://localhost:%d", PORT)
+    uvicorn.run(app, host="0.0.0.0", port=PORT, log_level="warning")
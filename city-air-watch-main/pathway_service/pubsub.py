@@ -0,0 +1,279 @@
+"""
+=============================================================================
+  CITY AIR WATCH — LOCAL TICK PUB/SUB  (engine -> output workers, Node bridge)
+=============================================================================
+  The engine process computes the ticks; any number of output processes
+  (PATHWAY_ROLE=worker uvicorn workers, the Node stream bridge) subscribe
+  to them over a Unix domain socket and serve their own clients.
+
+  Wire format: one message per line,  <topic> SP <payload> LF
+    tick   the aqi_update event, byte for byte as the full /stream sends it
+    state  {"tick", "etag", "snapshot_etag", "alerts_version", "alerts",
+           "engine"}: what the polling endpoints need, sent once the tick is
+           published ("etag" is the tick version, "snapshot_etag" the
+           /snapshot ETag)
+  Payloads are compact JSON and never contain a raw LF.
+
+  TickPublisher (engine): one selector thread serves every subscriber.
+  send() only queues the message; the thread appends the same bytes object
+  to each subscriber's outbound buffer and writes as the sockets accept.
+  A subscriber more than `max_buffer` bytes behind is disconnected instead
+  of holding the engine back (it reconnects and starts over). The last
+  message of every topic is retained and sent first to a new subscriber,
+  so it has state before the next tick.
+
+  TickSubscriber (worker): reads messages on a thread and hands them to a
+  handler, reconnecting with a fixed delay whenever the engine goes away.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Any, Callable, Dict, Optional
+
+TOPIC_TICK: bytes = b"tick"
+TOPIC_STATE: bytes = b"state"
+
+
+class _Outbound:
+    """Bytes queued for one subscriber; messages are shared, only offsets are per subscriber."""
+
+    def __init__(self) -> None:
+        self.chunks: deque[memoryview] = deque()
+        self.pending: int = 0
+
+    def add(self, message: bytes) -> None:
+        self.chunks.append(memoryview(message))
+        self.pending += len(message)
+
+    def flush(self, conn: socket.socket) -> None:
+        while self.chunks:
+            head: memoryview = self.chunks[0]
+            try:
+                sent: int = conn.send(head)
+            except BlockingIOError:
+                return
+            self.pending -= sent
+            if sent < len(head):
+                self.chunks[0] = head[sent:]
+                return
+            self.chunks.popleft()
+
+
+class TickPublisher:
+    """Unix domain socket PUB side: broadcast every message to all connected subscribers."""
+
+    def __init__(self, path: str, max_buffer: int = 64 * 1024 * 1024) -> None:
+        self.path: str = path
+        self.max_buffer: int = max_buffer
+        self.retained: Dict[bytes, bytes] = {}
+        self.sent: int = 0          # messages published
+        self.connected: int = 0     # subscribers accepted, ever
+        self.dropped: int = 0       # subscribers cut off for falling behind
+        self._outbox: deque[tuple[bytes, bytes]] = deque()
+        self._subs: Dict[socket.socket, _Outbound] = {}
+        self._closed: bool = False
+        with suppress(FileNotFoundError):
+            os.unlink(path)   # stale socket of a previous run
+        self._server: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen(64)
+        self._server.setblocking(False)
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ, "accept")
+        self._selector.register(self._wake_r, selectors.EVENT_READ, "wake")
+        self._thread: threading.Thread = threading.Thread(target=self._run, name="pubsub-publisher", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    # ── any thread ────────────────────────────────
+    def send(self, topic: bytes, payload: bytes) -> None:
+        """Queue one message for every subscriber (never blocks on them)."""
+        self._outbox.append((topic, b"".join((topic, b" ", payload, b"\n"))))
+        self.sent += 1
+        with suppress(BlockingIOError):
+            self._wake_w.send(b"\0")   # a full wake pipe means the thread is already due to run
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        with suppress(OSError):
+            self._wake_w.send(b"\0")
+        self._thread.join(timeout=2.0)
+        for conn in list(self._subs):
+            conn.close()
+        self._subs.clear()
+        self._selector.close()
+        for sock in (self._server, self._wake_r, self._wake_w):
+            sock.close()
+        with suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path":        self.path,
+            "subscribers": len(self._subs),
+            "connected":   self.connected,
+            "dropped":     self.dropped,
+            "messages":    self.sent,
+            "pending_max": max((out.pending for out in list(self._subs.values())), default=0),
+        }
+
+    # ── publisher thread ──────────────────────────
+    def _run(self) -> None:
+        while not self._closed:
+            for key, mask in self._selector.select():
+                if key.data == "accept":
+                    self._accept()
+                elif key.data == "wake":
+                    with suppress(BlockingIOError):
+                        while self._wake_r.recv(4096):
+                            pass
+                    self._fan_out()
+                else:
+                    conn: socket.socket = key.fileobj   # type: ignore[assignment]
+                    if mask & selectors.EVENT_READ and not self._readable(conn):
+                        continue
+                    if mask & selectors.EVENT_WRITE:
+                        self._flush(conn)
+
+    def _accept(self) -> None:
+        try:
+            conn, _ = self._server.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        out: _Outbound = _Outbound()
+        for message in self.retained.values():
+            out.add(message)
+        self._subs[conn] = out
+        self.connected += 1
+        self._selector.register(conn, selectors.EVENT_READ | selectors.EVENT_WRITE, "sub")
+
+    def _fan_out(self) -> None:
+        while self._outbox:
+            topic, message = self._outbox.popleft()
+            self.retained[topic] = message
+            for conn, out in list(self._subs.items()):
+                out.add(message)
+                if out.pending > self.max_buffer:
+                    self.dropped += 1
+                    self._drop(conn)
+                    continue
+                self._flush(conn)
+
+    def _readable(self, conn: socket.socket) -> bool:
+        # Subscribers never send; readable means closed (or junk to discard)
+        try:
+            if conn.recv(4096):
+                return True
+        except BlockingIOError:
+            return True
+        except OSError:
+            pass
+        self._drop(conn)
+        return False
+
+    def _flush(self, conn: socket.socket) -> None:
+        out: Optional[_Outbound] = self._subs.get(conn)
+        if out is None:
+            return
+        try:
+            out.flush(conn)
+        except OSError:
+            self._drop(conn)
+            return
+        events: int = selectors.EVENT_READ | (selectors.EVENT_WRITE if out.chunks else 0)
+        if self._selector.get_key(conn).events != events:
+            self._selector.modify(conn, events, "sub")
+
+    def _drop(self, conn: socket.socket) -> None:
+        if self._subs.pop(conn, None) is None:
+            return
+        with suppress(KeyError, ValueError):
+            self._selector.unregister(conn)
+        conn.close()
+
+
+class TickSubscriber:
+    """Unix domain socket SUB side: handler(topic, payload) for every message, on a reader thread."""
+
+    def __init__(self, path: str, handler: Callable[[bytes, bytes], None], retry_s: float = 1.0) -> None:
+        self.path: str = path
+        self.handler: Callable[[bytes, bytes], None] = handler
+        self.retry_s: float = retry_s
+        self.connected: bool = False
+        self.connects: int = 0
+        self.received: int = 0
+        self.errors: int = 0          # messages the handler rejected
+        self.running: bool = False
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self.run, name="pubsub-subscriber", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        sock: Optional[socket.socket] = self._sock
+        if sock is not None:
+            with suppress(OSError):
+                sock.shutdown(socket.SHUT_RDWR)
+
+    def run(self) -> None:
+        while self.running:
+            sock: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                time.sleep(self.retry_s)
+                continue
+            self._sock = sock
+            self.connected = True
+            self.connects += 1
+            try:
+                with sock.makefile("rb") as stream:
+                    for line in stream:
+                        if not line.endswith(b"\n"):
+                            break   # cut off mid-message
+                        topic, _, payload = line[:-1].partition(b" ")
+                        self.received += 1
+                        try:
+                            self.handler(topic, payload)
+                        except (ValueError, KeyError, TypeError):
+                            self.errors += 1
+            except OSError:
+                pass
+            finally:
+                self.connected = False
+                self._sock = None
+                sock.close()
+            if self.running:
+                time.sleep(self.retry_s)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path":      self.path,
+            "connected": self.connected,
+            "connects":  self.connects,
+            "received":  self.received,
+            "errors":    self.errors,
+        }
@@ -0,0 +1,202 @@
+"""
+=============================================================================
+  CITY AIR WATCH — CLOCKS, RECORDINGS & DETERMINISTIC REPLAY
+=============================================================================
+  Clock        : wall time (default). The engine reads every timestamp it
+                 emits through its clock instead of datetime.now().
+  ReplayClock  : virtual time that only moves when the replay says so.
+
+  Recording format: the ingest line protocol, one JSON reading per line,
+  each tumbling window terminated by a comment line
+
+      # tick <n> <iso timestamp the window closed>
+
+  so a recording can also be tailed by the file connector (comments are
+  skipped). Recorder writes one from the live connectors (PATHWAY_RECORD).
+
+  Replay feeds a recording to the pipeline window by window with no
+  waiting: the pipeline runs as fast as the CPU allows, the clock jumps
+  to each window's close time, and every spike, spike corroboration and
+  alert transition is logged as (tick, kind, ward, values). digest() hashes that log in canonical
+  order, so two runs over the same recording — or two engine modes —
+  can be checked for equivalence.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, TextIO
+
+from ingest import Reading, parse_line
+from metrics import process_rss_bytes
+
+REPLAY_EPOCH: datetime = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+# ─────────────────────────────────────────────
+#  Clocks
+# ─────────────────────────────────────────────
+class Clock:
+    """Wall clock."""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def iso(self) -> str:
+        return self.now().isoformat()
+
+    def local_hour(self) -> int:
+        """Hour of day driving the simulator's time-of-day factor."""
+        return datetime.now().hour
+
+
+class ReplayClock(Clock):
+    """Virtual UTC time, moved only by set() / advance()."""
+
+    def __init__(self, start: datetime = REPLAY_EPOCH) -> None:
+        self.current: datetime = start
+
+    def now(self) -> datetime:
+        return self.current
+
+    def local_hour(self) -> int:
+        return self.current.hour
+
+    def set(self, when: datetime) -> None:
+        self.current = when if when.tzinfo is not None else when.replace(tzinfo=timezone.utc)
+
+    def advance(self, seconds: float) -> None:
+        self.current += timedelta(seconds=seconds)
+
+
+# ─────────────────────────────────────────────
+#  Recordings
+# ─────────────────────────────────────────────
+def reading_line(reading: Reading) -> str:
+    return json.dumps(reading._asdict())
+
+
+def write_window(fh: TextIO, tick: int, closed_at: str, rows: Iterable[Reading]) -> None:
+    fh.writelines(f"{reading_line(r)}\n" for r in rows)
+    fh.write(f"# tick {tick} {closed_at}\n")
+
+
+def read_recording(path: str) -> Iterator[tuple[Optional[str], List[Reading]]]:
+    """(window close time or None, readings) per recorded window."""
+    rows: List[Reading] = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.startswith("# tick"):
+                parts: List[str] = line.split()
+                yield (parts[3] if len(parts) > 3 else None), rows
+                rows = []
+                continue
+            reading: Optional[Reading] = parse_line(line)
+            if reading is not None:
+                rows.append(reading)
+    if rows:
+        yield None, rows
+
+
+class Recorder:
+    """Appends every live window the pipeline consumes to a recording."""
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.ticks: int = 0
+        self._fh: TextIO = open(path, "a", encoding="utf-8")
+
+    def tee(self, window: Iterable[List[Reading]], clock: Clock) -> Iterator[List[Reading]]:
+        """Pass a window's chunks through, writing them; the tick marker follows the last one."""
+        wrote: bool = False
+        for chunk in window:
+            self._fh.writelines(f"{reading_line(r)}\n" for r in chunk)
+            wrote = wrote or bool(chunk)
+            yield chunk
+        if wrote:
+            self._fh.write(f"# tick {self.ticks} {clock.iso()}\n")
+            self._fh.flush()
+            self.ticks += 1
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+# ─────────────────────────────────────────────
+#  Replay
+# ─────────────────────────────────────────────
+class Replay:
+    """A recording fed to the pipeline back to back, with per-tick timing and an event log."""
+
+    def __init__(self, path: str, clock: ReplayClock, tick_interval_s: float = 5.0) -> None:
+        self.path: str = path
+        self.clock: ReplayClock = clock
+        self.tick_interval_s: float = tick_interval_s
+        self.tick: int = -1
+        self.readings: int = 0
+        self.tick_seconds: List[float] = []   # pipeline time per window (parsing excluded)
+        self.peak_rss: int = 0
+        self.events: List[tuple[Any, ...]] = []
+        self.started_at: float = 0.0
+        self.finished_at: float = 0.0
+
+    def windows(self) -> Iterator[List[List[Reading]]]:
+        """One single-chunk window per recorded window; timing covers the consumer's work."""
+        self.started_at = time.perf_counter()
+        for closed_at, rows in read_recording(self.path):
+            self.tick += 1
+            self.readings += len(rows)
+            if closed_at:
+                self.clock.set(datetime.fromisoformat(closed_at))
+            else:
+                self.clock.advance(self.tick_interval_s)
+            started: float = time.perf_counter()
+            yield [rows]
+            self.tick_seconds.append(time.perf_counter() - started)
+            self.peak_rss = max(self.peak_rss, process_rss_bytes() or 0)
+        self.finished_at = time.perf_counter()
+
+    def record(self, event: Mapping[str, Any]) -> None:
+        """Log a SPIKE / SPIKE_CORROBORATION / ALERT_TRANSITION event raised during the current tick."""
+        if event["type"] == "SPIKE":
+            self.events.append((
+                self.tick, "spike", str(event["ward_id"]),
+                int(event["current_aqi"]), event["rolling_avg"], event["increase_pct"],
+            ))
+        elif event["type"] == "SPIKE_CORROBORATION":
+            self.events.append((
+                self.tick, "spike_corroboration", str(event["ward_id"]),
+                event["neighbours_rising"], event["knn_avg"], event["regional"],
+            ))
+        else:
+            self.events.append((
+                self.tick, "alert", str(event["ward_id"]), int(event["aqi"]), event["transition"], event["to"],
+            ))
+
+    def digest(self) -> str:
+        """sha256 of the event log, ordered by (tick, kind, ward) whatever order the engine raised them in."""
+        h = hashlib.sha256()
+        for event in sorted(self.events):
+            h.update(json.dumps(event).encode("utf-8"))
+            h.update(b"\n")
+        return h.hexdigest()
+
+    def stats(self) -> Dict[str, Any]:
+        spikes: int = sum(1 for e in self.events if e[1] == "spike")
+        plumes: int = sum(1 for e in self.events if e[1] == "spike_corroboration" and e[5])
+        wall: float = (self.finished_at or time.perf_counter()) - self.started_at
+        return {
+            "ticks":    len(self.tick_seconds),
+            "readings": self.readings,
+            "spikes":   spikes,
+            "alerts":   sum(1 for e in self.events if e[1] == "alert"),
+            "regional": plumes,
+            "wall_s":   wall,
+            "peak_rss": self.peak_rss,
+            "digest":   self.digest(),
+        }
+
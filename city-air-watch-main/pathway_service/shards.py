@@ -0,0 +1,406 @@
+"""
+=============================================================================
+  CITY AIR WATCH — SHARDED TICK WORKERS  (PATHWAY_ENGINE_MODE=sharded)
+=============================================================================
+  Runs the columnar tick in N worker processes, so tick compute uses
+  several cores and stays out of the interpreter (and GIL) that serves
+  HTTP / SSE.
+
+  Partitioning : a ward belongs to shard crc32(ward_id) % N (stable across
+                 processes and restarts, unlike hash()). Each worker holds
+                 a ColumnarEngine and an AlertLifecycle over its partition
+                 only.
+  Shared memory: one multiprocessing.shared_memory block holds every
+                 per-ward column, double-buffered by tick parity:
+                   inputs   aqi, pm25, pm10, no2, co, spike, rag_band,
+                            reported
+                   outputs  rolling_avg, detected and, per named
+                            window, count / mean / min / max / variance
+                 plus per-shard summary partials (sum / max / critical /
+                 count). The front process reads the slot of the last
+                 completed tick, so a lookup never sees a half-written tick.
+                 Wards that did not report in a tick carry their inputs and
+                 outputs over from the other slot; only reported wards are
+                 stepped, checked for alerts and get a new row.
+  Per tick     : the coordinator writes the window's batch, sends (tick,
+                 timestamp) down each worker's pipe and waits for every
+                 reply. A worker steps its partition, writes its outputs
+                 and replies with its spikes, alert transitions and its ward rows
+                 already JSON-encoded, both in full and as delta patches
+                 against its previous tick. Row dicts and json.dumps of
+                 the grid never run in the front process; it merges the
+                 partials and splices the fragments into the SSE / poll
+                 payloads (fanout.splice_json).
+  The block's name is unlinked as soon as every worker has attached, so it
+  is freed with the last mapping even if the engine is killed.
+  Ward rows in the encoded lists are grouped by shard, not in WARDS order.
+  Each reply also carries the worker's per-stage timings for /metrics.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import time
+import zlib
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from alerts import RAISING, AlertLifecycle
+from columnar import ColumnarEngine, build_ward_rows, window_sizes
+from delta import ward_patches
+
+INPUT_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("aqi",      "<i8"),
+    ("pm25",     "<f8"),
+    ("pm10",     "<f8"),
+    ("no2",      "<f8"),
+    ("co",       "<f8"),
+    ("spike",    "?"),
+    ("rag_band", "<i8"),
+    ("reported", "?"),
+)
+OUTPUT_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("rolling_avg", "<f8"),
+    ("detected",    "?"),
+)
+# Per named window of ColumnarEngine.window_stats() ("size" is fixed per ward and stays in the front process)
+WINDOW_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("count", "<i8"), ("mean", "<f8"), ("min", "<i8"), ("max", "<i8"), ("variance", "<f8"),
+)
+PARTIAL_COLUMNS: tuple[str, ...] = ("sum", "max", "critical", "count")
+
+
+def shard_of(ward_id: str, shards: int) -> int:
+    return zlib.crc32(ward_id.encode("utf-8")) % shards
+
+
+class SharedColumns:
+    """Named NumPy views over one shared-memory block: (2, wards) columns and (2, shards) partials."""
+
+    def __init__(self, wards: int, shards: int, windows: Sequence[str], name: Optional[str] = None) -> None:
+        specs: List[tuple[str, str, tuple[int, int]]] = [
+            (col, dtype, (2, wards)) for col, dtype in (*INPUT_COLUMNS, *OUTPUT_COLUMNS)
+        ]
+        specs += [
+            (f"{w}_{col}", dtype, (2, wards)) for w in windows for col, dtype in WINDOW_COLUMNS
+        ]
+        specs += [(col, "<i8", (2, shards)) for col in PARTIAL_COLUMNS]
+        layout: List[tuple[str, np.dtype, tuple[int, int], int]] = []
+        size: int = 0
+        for col, dtype, shape in specs:
+            dt: np.dtype = np.dtype(dtype)
+            layout.append((col, dt, shape, size))
+            size += -(-dt.itemsize * shape[0] * shape[1] // 8) * 8   # keep every column 8-byte aligned
+        self.shm: shared_memory.SharedMemory = shared_memory.SharedMemory(
+            name=name, create=name is None, size=max(size, 8)
+        )
+        self.arrays: Dict[str, np.ndarray] = {
+            col: np.ndarray(shape, dtype=dt, buffer=self.shm.buf, offset=offset)
+            for col, dt, shape, offset in layout
+        }
+
+    def close(self, unlink: bool = False) -> None:
+        self.arrays.clear()
+        if unlink:
+            self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            pass   # a view is still referenced somewhere; the mapping goes with the process
+
+
+def engine_window_sizes(settings: Mapping[str, Any], wards: Sequence[Mapping[str, Any]]) -> Dict[str, np.ndarray]:
+    """Per-ward sizes of the named windows a ColumnarEngine built from `settings` keeps for `wards`."""
+    return window_sizes(
+        {"spike": settings["spike_window"], "rolling": settings["window"], **settings.get("windows", {})},
+        [w.get("windows") for w in wards],
+    )
+
+
+def level_lookup(levels: Sequence[str]) -> Any:
+    """get_aqi_level() as a table lookup: levels[aqi] for aqi in 0..len-1, clamped."""
+    top: int = len(levels) - 1
+    return lambda aqi: levels[min(max(aqi, 0), top)]
+
+
+# ─────────────────────────────────────────────
+#  Worker process
+# ─────────────────────────────────────────────
+def _shard_main(
+    shard: int,
+    positions: np.ndarray,
+    wards: List[Dict[str, Any]],
+    settings: Dict[str, Any],
+    levels: List[str],
+    alert_settings: Dict[str, Any],
+    shm_name: str,
+    ward_count: int,
+    shard_count: int,
+    conn: Connection,
+) -> None:
+    engine: ColumnarEngine = ColumnarEngine(
+        [str(w["id"]) for w in wards], overrides=[w.get("windows") for w in wards], **settings
+    )
+    columns: SharedColumns = SharedColumns(
+        ward_count, shard_count, list(engine_window_sizes(settings, wards)), shm_name
+    )
+    a: Dict[str, np.ndarray] = columns.arrays
+    lifecycle: AlertLifecycle = AlertLifecycle(
+        engine.ward_ids, [str(w["name"]) for w in wards], **alert_settings
+    )
+    level_of: Any = level_lookup(levels)
+    previous: Dict[str, Dict[str, Any]] = {}
+    conn.send("ready")   # attached: the front process may unlink the block name now
+    try:
+        while True:
+            msg: Optional[tuple[int, str]] = conn.recv()
+            if msg is None:
+                break
+            tick, timestamp = msg
+            slot: int = tick % 2
+            batch: Dict[str, Any] = {"tick": tick, **{col: a[col][slot, positions] for col, _ in INPUT_COLUMNS}}
+            rows: np.ndarray = np.flatnonzero(batch["reported"])
+            result: Dict[str, Any] = engine.step(batch["aqi"], rows)
+            stats: Dict[str, Dict[str, Any]] = engine.window_stats()
+
+            # Windows of silent wards did not move; their spike flag is carried over
+            a["rolling_avg"][slot, positions] = result["rolling_avg"]
+            a["detected"][slot, positions] = np.where(
+                batch["reported"], result["spike"], a["detected"][1 - slot, positions]
+            )
+            for name, window in stats.items():
+                for col, _ in WINDOW_COLUMNS:
+                    a[f"{name}_{col}"][slot, positions] = window[col]
+            a["sum"][slot, shard] = int(engine.current.sum())   # 0 for wards that never reported
+            a["max"][slot, shard] = result["city_summary"]["max_aqi"]
+            a["critical"][slot, shard] = result["city_summary"]["critical_wards"]
+            a["count"][slot, shard] = int((engine.seq > 0).sum())
+
+            checking: float = time.perf_counter()
+            transitions: List[Dict[str, Any]] = lifecycle.step(batch["aqi"], timestamp, rows)
+            alerts: Dict[int, Dict[str, Any]] = {
+                lifecycle.index[t["ward_id"]]: t["alert"] for t in transitions if t["transition"] in RAISING
+            }
+            checked: float = time.perf_counter()
+            spikes: List[Dict[str, Any]] = [engine.spike_info(i) for i in result["spike_index"].tolist()]
+            started: float = time.perf_counter()
+            fresh: Dict[str, Dict[str, Any]] = {
+                str(r["ward_id"]): r
+                for r in build_ward_rows(
+                    wards, batch, result, stats, batch["rag_band"], alerts, level_of, timestamp,
+                    None if len(rows) == len(positions) else rows,
+                )
+            }
+            built: float = time.perf_counter()
+            # Every ward that has reported, in partition order; silent wards keep their row
+            by_id: Dict[str, Dict[str, Any]] = (
+                fresh if len(fresh) == len(positions) else {
+                    wid: fresh.get(wid) or previous[wid]
+                    for wid in engine.ward_ids if wid in fresh or wid in previous
+                }
+            )
+            patches: Dict[str, Dict[str, Any]] = ward_patches(previous, by_id)
+            previous = by_id
+            diffed: float = time.perf_counter()
+            rows_json: bytes = json.dumps(list(by_id.values()))[1:-1].encode("utf-8")
+            patches_json: bytes = json.dumps(patches)[1:-1].encode("utf-8")
+            timings: Dict[str, float] = {
+                **engine.timings,
+                "threshold_check": checked - checking,
+                "rows":            built - started,
+                "delta":           diffed - built,
+                "json_encoding":   time.perf_counter() - diffed,
+            }
+            conn.send((spikes, transitions, rows_json, patches_json, timings))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        columns.close()
+
+
+# ─────────────────────────────────────────────
+#  Front process: pool + read-only view
+# ─────────────────────────────────────────────
+class ShardPool:
+    """N worker processes stepping ward partitions in lockstep over shared columns."""
+
+    def __init__(
+        self,
+        wards: Sequence[Dict[str, Any]],
+        shards: int,
+        settings: Dict[str, Any],
+        levels: Sequence[str],
+        alert_settings: Dict[str, Any],
+    ) -> None:
+        if shards < 1:
+            raise ValueError("at least one shard is required")
+        self.wards: List[Dict[str, Any]] = [
+            {"id": str(w["id"]), "name": str(w["name"]), "type": str(w["type"]),
+             **({"windows": dict(w["windows"])} if w.get("windows") else {})}
+            for w in wards
+        ]
+        self.index: Dict[str, int] = {w["id"]: i for i, w in enumerate(self.wards)}
+        owner: np.ndarray = np.fromiter(
+            (shard_of(w["id"], shards) for w in self.wards), dtype=np.int64, count=len(self.wards)
+        )
+        self.shards: int = shards
+        self.partitions: List[np.ndarray] = [np.flatnonzero(owner == k) for k in range(shards)]
+        self.window_sizes: Dict[str, np.ndarray] = engine_window_sizes(settings, self.wards)
+        self.columns: SharedColumns = SharedColumns(len(self.wards), shards, list(self.window_sizes))
+        self.levels: List[str] = list(levels)
+        self.slot: int = -1           # slot of the last completed tick
+        self.tick: int = -1
+        self.timestamp: str = ""
+        # Per ward, as of its last reported tick (-1: never reported): tick, timestamp, alert raised / escalated
+        n: int = len(self.wards)
+        self.row_tick: np.ndarray = np.full(n, -1, dtype=np.int64)
+        self.row_timestamp: np.ndarray = np.full(n, "", dtype=object)
+        self.row_alert: np.ndarray = np.full(n, None, dtype=object)
+
+        ctx: Any = multiprocessing.get_context("spawn")   # the front process already runs threads
+        self.conns: List[Connection] = []
+        self.procs: List[Any] = []
+        for k, positions in enumerate(self.partitions):
+            if not len(positions):
+                continue
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(
+                target=_shard_main,
+                name=f"pathway-shard-{k}",
+                args=(
+                    k, positions, [self.wards[i] for i in positions.tolist()], dict(settings),
+                    self.levels, dict(alert_settings), self.columns.shm.name,
+                    len(self.wards), shards, child,
+                ),
+                daemon=True,
+            )
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+        for conn in self.conns:
+            conn.recv()
+        # Every worker holds its mapping: drop the name so nothing leaks, however the process ends
+        self.columns.shm.unlink()
+        self.readings: ShardedReadings = ShardedReadings(self)
+
+    def __len__(self) -> int:
+        return len(self.procs)
+
+    def step(self, batch: Mapping[str, Any], tick: int, timestamp: str) -> Dict[str, Any]:
+        """
+        Run one tick (batch arrays aligned with the ward list) on every shard.
+        Returns the merged city summary partials, spikes, alert transitions, the
+        encoded ward rows / patches ({"rows", "patches"}) and per-stage
+        worker timings (slowest shard).
+        """
+        slot: int = tick % 2
+        a: Dict[str, np.ndarray] = self.columns.arrays
+        reported: np.ndarray = np.asarray(batch["reported"], dtype=bool)
+        silent: np.ndarray = np.flatnonzero(~reported)
+        for col, _ in INPUT_COLUMNS:
+            a[col][slot] = batch[col]
+            if col != "reported":
+                a[col][slot, silent] = a[col][1 - slot, silent]
+        for conn in self.conns:
+            conn.send((tick, timestamp))
+        spikes: List[Dict[str, Any]] = []
+        transitions: List[Dict[str, Any]] = []
+        rows: List[bytes] = []
+        patches: List[bytes] = []
+        timings: Dict[str, float] = {}
+        for k, conn in enumerate(self.conns):
+            try:
+                shard_spikes, shard_transitions, shard_rows, shard_patches, shard_timings = conn.recv()
+            except EOFError:
+                raise RuntimeError(f"shard worker {self.procs[k].name} exited") from None
+            spikes.extend(shard_spikes)
+            transitions.extend(shard_transitions)
+            rows.append(shard_rows)
+            if shard_patches:
+                patches.append(shard_patches)
+            # Shards run in parallel: the slowest one is the tick's critical path
+            for stage, seconds in shard_timings.items():
+                timings[stage] = max(seconds, timings.get(stage, 0.0))
+
+        self.slot, self.tick, self.timestamp = slot, tick, timestamp
+        self.row_tick[reported] = tick
+        self.row_timestamp[reported] = timestamp
+        self.row_alert[reported] = None
+        for t in transitions:
+            if t["transition"] in RAISING:
+                self.row_alert[self.index[t["ward_id"]]] = t["alert"]
+        seen: int = int(a["count"][slot].sum())
+        return {
+            "city_summary": {
+                "avg_aqi":        round(float(int(a["sum"][slot].sum())) / float(seen), 1),  # type: ignore[call-overload]
+                "max_aqi":        int(a["max"][slot][a["count"][slot] > 0].max()),
+                "critical_wards": int(a["critical"][slot].sum()),
+                "total_wards":    len(self.wards),
+            },
+            "spikes": spikes,
+            "transitions": transitions,
+            "encoded_wards": {"rows": b", ".join(rows), "patches": b", ".join(patches)},
+            "timings": timings,
+        }
+
+    def close(self) -> None:
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for proc in self.procs:
+            proc.join(timeout=2.0)
+            if proc.is_alive():
+                proc.terminate()
+        self.conns.clear()
+        self.procs.clear()
+        self.columns.close()
+
+
+class ShardedReadings(Mapping[str, Dict[str, Any]]):
+    """
+    latest_readings for sharded mode: ward rows are built on lookup from the
+    shared columns of the last completed tick, so per-ward endpoints cost
+    one row and the front process never holds the whole grid as dicts.
+    """
+
+    def __init__(self, pool: ShardPool) -> None:
+        self.pool: ShardPool = pool
+
+    def __len__(self) -> int:
+        return int((self.pool.row_tick >= 0).sum())
+
+    def __iter__(self) -> Iterator[str]:
+        pool: ShardPool = self.pool
+        return (pool.wards[i]["id"] for i in np.flatnonzero(pool.row_tick >= 0).tolist())
+
+    def __contains__(self, ward_id: object) -> bool:
+        i: Optional[int] = self.pool.index.get(ward_id)  # type: ignore[arg-type]
+        return i is not None and self.pool.row_tick[i] >= 0
+
+    def __getitem__(self, ward_id: str) -> Dict[str, Any]:
+        pool: ShardPool = self.pool
+        i: Optional[int] = pool.index.get(ward_id)
+        if i is None or pool.row_tick[i] < 0:
+            raise KeyError(ward_id)
+        a: Dict[str, np.ndarray] = pool.columns.arrays
+        slot: int = pool.slot
+        pick: slice = slice(i, i + 1)
+        batch: Dict[str, Any] = {"tick": int(pool.row_tick[i]), **{col: a[col][slot, pick] for col, _ in INPUT_COLUMNS}}
+        result: Dict[str, Any] = {"rolling_avg": a["rolling_avg"][slot, pick], "spike": a["detected"][slot, pick]}
+        stats: Dict[str, Dict[str, Any]] = {
+            name: {"size": size[pick], **{col: a[f"{name}_{col}"][slot, pick] for col, _ in WINDOW_COLUMNS}}
+            for name, size in pool.window_sizes.items()
+        }
+        alert: Optional[Dict[str, Any]] = pool.row_alert[i]
+        return build_ward_rows(
+            [pool.wards[i]], batch, result, stats, batch["rag_band"].tolist(),
+            {0: alert} if alert else {}, level_lookup(pool.levels), str(pool.row_timestamp[i]),
+        )[0]
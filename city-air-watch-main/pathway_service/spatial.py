@@ -0,0 +1,173 @@
+"""
+=============================================================================
+  CITY AIR WATCH — SPATIAL INDEX & NEIGHBOURHOOD AGGREGATES
+=============================================================================
+  Ward positions (lat / lon) projected to local metres (equirectangular
+  about the grid's mean latitude: exact enough across one city) and
+  bucketed into a uniform grid of square cells. Wards are sorted by
+  row-major cell id, so each grid row of a query box is one contiguous
+  slice of `order`; a radius query touches only the cells under the
+  circle and measures great-circle distances for those candidates only.
+
+  Neighbours are fixed (sensors do not move): the k nearest wards within
+  max_neighbour_m are computed once, so per-tick aggregates are plain
+  gathers over an (n, k) index matrix:
+    knn_avg           mean AQI of a ward's neighbours
+    neighbours_rising neighbours whose AQI is above rise_ratio x their
+                      rolling average this tick
+  A spike with enough rising neighbours is a regional plume; one without
+  is local (a point source or a sensor glitch).
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+EARTH_RADIUS_M: float = 6_371_008.8
+
+
+def haversine_m(lat1: Any, lon1: Any, lat2: Any, lon2: Any) -> np.ndarray:
+    """Great-circle distances (metres), broadcasting like NumPy."""
+    p1: np.ndarray = np.radians(lat1)
+    p2: np.ndarray = np.radians(lat2)
+    a: np.ndarray = (
+        np.sin((p2 - p1) / 2.0) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(np.subtract(lon2, lon1)) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """Uniform-grid index over fixed ward positions, with precomputed k-nearest neighbours."""
+
+    def __init__(
+        self,
+        lat: Sequence[float],
+        lon: Sequence[float],
+        ids: Optional[Sequence[str]] = None,
+        cell_m: Optional[float] = None,
+        k: int = 6,
+        max_neighbour_m: float = 12000.0,
+    ) -> None:
+        self.lat: np.ndarray = np.asarray(lat, dtype=np.float64)
+        self.lon: np.ndarray = np.asarray(lon, dtype=np.float64)
+        n: int = len(self.lat)
+        self.position: Dict[str, int] = {wid: i for i, wid in enumerate(ids)} if ids is not None else {}
+        self.lat0: float = float(self.lat.mean()) if n else 0.0
+        self.x, self.y = self.project(self.lat, self.lon)
+        self.x_min: float = float(self.x.min()) if n else 0.0
+        self.y_min: float = float(self.y.min()) if n else 0.0
+        width: float = float(self.x.max()) - self.x_min if n else 0.0
+        height: float = float(self.y.max()) - self.y_min if n else 0.0
+        if cell_m is None:
+            # About four wards per cell on an evenly spread grid
+            cell_m = max(math.sqrt(max(width * height, 1.0) * 4.0 / max(n, 1)), 50.0)
+        self.cell_m: float = cell_m
+        self.nx: int = int(width // cell_m) + 1
+        self.ny: int = int(height // cell_m) + 1
+        cx: np.ndarray = ((self.x - self.x_min) // cell_m).astype(np.int64)
+        cy: np.ndarray = ((self.y - self.y_min) // cell_m).astype(np.int64)
+        cells: np.ndarray = cy * self.nx + cx
+        self.order: np.ndarray = np.argsort(cells, kind="stable")
+        # starts[c] .. starts[c + 1]: slice of `order` holding cell c
+        self.starts: np.ndarray = np.searchsorted(cells[self.order], np.arange(self.nx * self.ny + 1))
+        self.k: int = min(k, max(n - 1, 0))
+        self.max_neighbour_m: float = max_neighbour_m
+        self.neighbours, self.neighbour_m = self._nearest()
+        self.near: np.ndarray = self.neighbour_m <= max_neighbour_m
+        self.near_count: np.ndarray = self.near.sum(axis=1)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def project(self, lat: Any, lon: Any) -> tuple[Any, Any]:
+        """lat / lon -> local metres (x east, y north)."""
+        scale: float = math.pi / 180.0 * EARTH_RADIUS_M
+        return np.multiply(lon, scale * math.cos(math.radians(self.lat0))), np.multiply(lat, scale)
+
+    def _box(self, x: float, y: float, reach_m: float) -> np.ndarray:
+        """Indices of the wards in every cell within reach_m of (x, y) (a superset of the circle)."""
+        return self._cells(
+            int((x - reach_m - self.x_min) // self.cell_m), int((x + reach_m - self.x_min) // self.cell_m),
+            int((y - reach_m - self.y_min) // self.cell_m), int((y + reach_m - self.y_min) // self.cell_m),
+        )
+
+    def _cells(self, cx0: int, cx1: int, cy0: int, cy1: int) -> np.ndarray:
+        """Indices of the wards in cells cx0..cx1 x cy0..cy1 (clipped to the grid)."""
+        cx0, cx1 = max(cx0, 0), min(cx1, self.nx - 1)
+        cy0, cy1 = max(cy0, 0), min(cy1, self.ny - 1)
+        if cx0 > cx1 or cy0 > cy1:
+            return np.empty(0, dtype=np.int64)
+        rows: List[np.ndarray] = [
+            self.order[self.starts[cy * self.nx + cx0]:self.starts[cy * self.nx + cx1 + 1]]
+            for cy in range(cy0, cy1 + 1)
+        ]
+        return rows[0] if len(rows) == 1 else np.concatenate(rows)
+
+    def within(self, lat: float, lon: float, radius_m: float) -> tuple[np.ndarray, np.ndarray]:
+        """(ward indices, distances in metres) within radius_m of a point, nearest first."""
+        x, y = self.project(lat, lon)
+        candidates: np.ndarray = self._box(float(x), float(y), radius_m * 1.001)
+        dist: np.ndarray = haversine_m(lat, lon, self.lat[candidates], self.lon[candidates])
+        keep: np.ndarray = dist <= radius_m
+        candidates, dist = candidates[keep], dist[keep]
+        order: np.ndarray = np.argsort(dist, kind="stable")
+        return candidates[order], dist[order]
+
+    def _nearest(self, block: int = 2) -> tuple[np.ndarray, np.ndarray]:
+        """(n, k) nearest other wards and their distances, a block x block square of cells at a time."""
+        n: int = len(self.lat)
+        k: int = self.k
+        neighbours: np.ndarray = np.zeros((n, k), dtype=np.int64)
+        dist: np.ndarray = np.zeros((n, k), dtype=np.float64)
+        if not k:
+            return neighbours, dist
+        half: float = block * self.cell_m / 2.0
+        for by in range(0, self.ny, block):
+            for bx in range(0, self.nx, block):
+                members: np.ndarray = self._cells(bx, bx + block - 1, by, by + block - 1)
+                if not len(members):
+                    continue
+                cx: float = self.x_min + bx * self.cell_m + half
+                cy: float = self.y_min + by * self.cell_m + half
+                reach: float = half + 2.0 * self.cell_m
+                while True:
+                    # Exact once the k-th distance fits inside the searched box, however far it reaches
+                    candidates: np.ndarray = self._box(cx, cy, reach)
+                    d: np.ndarray = np.hypot(
+                        self.x[members, None] - self.x[None, candidates],
+                        self.y[members, None] - self.y[None, candidates],
+                    )
+                    d[members[:, None] == candidates[None, :]] = np.inf
+                    if len(candidates) > k:
+                        part: np.ndarray = np.argpartition(d, k - 1, axis=1)[:, :k]
+                        kth: np.ndarray = np.take_along_axis(d, part, axis=1)
+                        if float(kth.max()) <= reach - half or len(candidates) == n:
+                            break
+                    reach *= 2.0
+                ranked: np.ndarray = np.argsort(kth, axis=1, kind="stable")
+                neighbours[members] = np.take_along_axis(candidates[part], ranked, axis=1)
+        for i0 in range(0, n, 65536):
+            rows: slice = slice(i0, min(i0 + 65536, n))
+            dist[rows] = haversine_m(
+                self.lat[rows, None], self.lon[rows, None], self.lat[neighbours[rows]], self.lon[neighbours[rows]]
+            )
+        return neighbours, dist
+
+    def neighbourhood(self, aqi: np.ndarray, rolling_avg: np.ndarray, rise_ratio: float) -> Dict[str, np.ndarray]:
+        """Per-ward neighbourhood aggregates for one tick (arrays aligned with the wards)."""
+        values: np.ndarray = np.asarray(aqi, dtype=np.float64)
+        rising: np.ndarray = values > np.asarray(rolling_avg, dtype=np.float64) * rise_ratio
+        gathered: np.ndarray = np.where(self.near, values[self.neighbours], 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            knn_avg: np.ndarray = gathered.sum(axis=1) / self.near_count
+        return {
+            "aqi":               values,
+            "knn_avg":           knn_avg,   # NaN for a ward with no neighbour in range
+            "rising":            rising,
+            "neighbours_rising": (rising[self.neighbours] & self.near).sum(axis=1),
+        }
+
@@ -0,0 +1,224 @@
+"""
+=============================================================================
+  CITY AIR WATCH — CPCB SUB-INDEX AQI
+=============================================================================
+  The National AQI (CPCB) of a ward is the highest of its pollutant
+  sub-indices; each sub-index maps the pollutant's concentration, averaged
+  over that pollutant's period, onto the AQI scale by linear interpolation
+  inside the breakpoint band it falls in:
+
+    I = I_lo + (C - C_lo) * (I_hi - I_lo) / (C_hi - C_lo)
+
+  Averaging periods: 24 h for PM2.5, PM10, NO2, SO2 and NH3; 8 h for CO
+  and O3. Concentrations are µg/m³, CO mg/m³. The pollutant with the
+  highest sub-index is the dominant one. CPCB computes the index only
+  when at least three pollutants have data, one of them PM2.5 or PM10.
+
+  SubIndexEngine keeps every ward's averaging windows incrementally in
+  hourly buckets (a 24-slot ring of sum / count per pollutant, keyed on
+  each reading's own timestamp). A period's average is the mean of its
+  hourly means. Per ward and pollutant, the engine keeps the sum and the
+  number of those hourly means. A batch of readings updates only the
+  buckets it touches and adjusts these totals by the change in each
+  bucket's mean. When the newest reading starts a new hour, expired
+  buckets are cleared and the totals are rebuilt from the ring, once per
+  hour. Sub-indices are one searchsorted over the breakpoints per
+  pollutant for all wards.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+# AQI band edges: Good, Satisfactory, Moderate, Poor, Very Poor, Severe
+INDEX_BREAKPOINTS: tuple[float, ...] = (0.0, 50.0, 100.0, 200.0, 300.0, 400.0, 500.0)
+# Concentration band edges per pollutant. CPCB leaves the Severe band open;
+# it is closed here one Very Poor band width above its start, and
+# sub-indices are capped at 500.
+CONCENTRATION_BREAKPOINTS: Dict[str, tuple[float, ...]] = {
+    "pm25": (0.0, 30.0, 60.0, 90.0, 120.0, 250.0, 380.0),
+    "pm10": (0.0, 50.0, 100.0, 250.0, 350.0, 430.0, 510.0),
+    "no2":  (0.0, 40.0, 80.0, 180.0, 280.0, 400.0, 520.0),
+    "so2":  (0.0, 40.0, 80.0, 380.0, 800.0, 1600.0, 2400.0),
+    "nh3":  (0.0, 200.0, 400.0, 800.0, 1200.0, 1800.0, 2400.0),
+    "co":   (0.0, 1.0, 2.0, 10.0, 17.0, 34.0, 51.0),
+    "o3":   (0.0, 50.0, 100.0, 168.0, 208.0, 748.0, 1288.0),
+}
+AVERAGING_HOURS: Dict[str, int] = {"pm25": 24, "pm10": 24, "no2": 24, "so2": 24, "nh3": 24, "co": 8, "o3": 8}
+PARTICULATES: tuple[str, ...] = ("pm25", "pm10")
+MAX_INDEX: float = INDEX_BREAKPOINTS[-1]
+
+
+def _band_table(pollutant: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    conc: np.ndarray = np.array(CONCENTRATION_BREAKPOINTS[pollutant])
+    index: np.ndarray = np.array(INDEX_BREAKPOINTS)
+    # Upper concentration edge, lower edges and slope of every band
+    return conc[1:], conc[:-1], index[:-1], np.diff(index) / np.diff(conc)
+
+
+_BANDS: Dict[str, tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = {
+    p: _band_table(p) for p in CONCENTRATION_BREAKPOINTS
+}
+
+
+def sub_index(pollutant: str, concentration: np.ndarray) -> np.ndarray:
+    """Unrounded sub-indices for an array of concentrations (NaN stays NaN)."""
+    upper, c_lo, i_lo, slope = _BANDS[pollutant]
+    c: np.ndarray = np.asarray(concentration, dtype=np.float64)
+    band: np.ndarray = np.minimum(np.searchsorted(upper, c), len(upper) - 1)
+    return np.minimum(i_lo[band] + (c - c_lo[band]) * slope[band], MAX_INDEX)
+
+
+class SubIndexEngine:
+    """Per-pollutant averaging windows and CPCB sub-indices for all wards at once."""
+
+    def __init__(
+        self,
+        wards: int,
+        pollutants: Sequence[str],
+        min_coverage: float = 0.0,
+        min_pollutants: int = 3,
+    ) -> None:
+        unknown: List[str] = [p for p in pollutants if p not in CONCENTRATION_BREAKPOINTS]
+        if unknown:
+            raise ValueError(f"no CPCB breakpoints for {', '.join(unknown)}")
+        self.pollutants: List[str] = list(pollutants)
+        self.periods: np.ndarray = np.array([AVERAGING_HOURS[p] for p in self.pollutants], dtype=np.int64)
+        # Hours of data a period needs before its sub-index counts (CPCB: 16 of 24)
+        self.min_hours: np.ndarray = np.maximum(np.ceil(self.periods * min_coverage), 1).astype(np.int64)
+        self.min_pollutants: int = min(min_pollutants, len(self.pollutants))
+        self.particulates: List[int] = [j for j, p in enumerate(self.pollutants) if p in PARTICULATES]
+        self.slots: int = int(self.periods.max())
+        k: int = len(self.pollutants)
+        # Pollutant-major, then hour slot: each bucket row is contiguous over wards
+        self.sums: np.ndarray = np.zeros((k, self.slots, wards))
+        self.counts: np.ndarray = np.zeros((k, self.slots, wards), dtype=np.int64)
+        self.total: np.ndarray = np.zeros((k, wards))          # sum of hourly means in the period
+        self.hours: np.ndarray = np.zeros((k, wards), dtype=np.int64)   # hours with data in the period
+        self.hour: Optional[int] = None                          # newest event hour (epoch hours)
+
+        self.readings: int = 0
+        self.expired: int = 0      # older than the longest period when they arrived
+        self.rollovers: int = 0
+
+    def __len__(self) -> int:
+        return self.sums.shape[2]
+
+    def add(self, idx: np.ndarray, times: np.ndarray, columns: Mapping[str, np.ndarray]) -> None:
+        """
+        Add readings: ward positions (-1 = unknown), event times (epoch s) and
+        one concentration column per pollutant (NaN / negative = not reported).
+        """
+        ok: np.ndarray = (idx >= 0) & np.isfinite(times)
+        if not ok.any():
+            return
+        hour: np.ndarray = np.floor(times[ok] / 3600.0).astype(np.int64)
+        top: int = int(hour.max())
+        if self.hour is None or top > self.hour:
+            self._advance(top)
+        assert self.hour is not None
+        live: np.ndarray = hour > self.hour - self.slots
+        self.expired += int(len(live) - live.sum())
+        self.readings += int(live.sum())
+        n: int = len(self)
+        rows: np.ndarray = np.flatnonzero(ok)[live]
+        # Buckets touched by the batch (flat slot * wards + ward), grouped once for every pollutant
+        buckets, inverse = np.unique(hour[live] % self.slots * n + idx[rows], return_inverse=True)
+        per_bucket: np.ndarray = np.bincount(inverse, minlength=len(buckets))
+        ward: np.ndarray = buckets % n
+        age: np.ndarray = (self.hour - buckets // n) % self.slots
+        for j, name in enumerate(self.pollutants):
+            column: Optional[np.ndarray] = columns.get(name)
+            if column is None:
+                continue
+            value: np.ndarray = np.asarray(column, dtype=np.float64)[rows]
+            has: np.ndarray = value >= 0.0   # False for NaN too
+            if has.all():
+                added: np.ndarray = per_bucket
+            elif has.any():
+                added = np.bincount(inverse, weights=has, minlength=len(buckets)).astype(np.int64)
+                value = np.where(has, value, 0.0)
+            else:
+                continue
+            sums: np.ndarray = self.sums[j].reshape(-1)
+            counts: np.ndarray = self.counts[j].reshape(-1)
+            old_sum: np.ndarray = sums[buckets]
+            old_count: np.ndarray = counts[buckets]
+            new_sum: np.ndarray = old_sum + np.bincount(inverse, weights=value, minlength=len(buckets))
+            new_count: np.ndarray = old_count + added
+            sums[buckets] = new_sum
+            counts[buckets] = new_count
+            # Only buckets inside this pollutant's period count towards its average
+            inside: np.ndarray = age < self.periods[j]
+            delta: np.ndarray = new_sum / np.maximum(new_count, 1) - old_sum / np.maximum(old_count, 1)
+            np.add.at(self.total[j], ward[inside], delta[inside])
+            np.add.at(self.hours[j], ward[inside & (old_count == 0) & (added > 0)], 1)
+
+    def _advance(self, hour: int) -> None:
+        """Move the clock to `hour`: clear the buckets that fall out of the ring, rebuild the totals."""
+        if self.hour is not None:
+            if hour - self.hour >= self.slots:
+                self.sums.fill(0.0)
+                self.counts.fill(0)
+            else:
+                for h in range(self.hour + 1, hour + 1):
+                    self.sums[:, h % self.slots] = 0.0
+                    self.counts[:, h % self.slots] = 0
+            self.rollovers += 1
+        self.hour = hour
+        for j, period in enumerate(self.periods.tolist()):
+            slots: List[int] = [(hour - age) % self.slots for age in range(period)]
+            counts: np.ndarray = self.counts[j, slots]
+            self.total[j] = (self.sums[j, slots] / np.maximum(counts, 1)).sum(axis=0)
+            self.hours[j] = (counts > 0).sum(axis=0)
+
+    def state(self, rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Averages, sub-indices, AQI and dominant pollutant of every ward (or of
+        `rows`): "average" / "sub_index" / "hours" are (pollutants, wards),
+        NaN / 0 where a period has too little data; "aqi" (rounded) and
+        "dominant" (pollutant position) are -1 where no AQI can be given.
+        """
+        total: np.ndarray = self.total if rows is None else self.total[:, rows]
+        hours: np.ndarray = self.hours if rows is None else self.hours[:, rows]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average: np.ndarray = np.where(hours > 0, total / hours, math.nan)
+        valid: np.ndarray = hours >= self.min_hours[:, None]
+        index: np.ndarray = np.full(average.shape, -1.0)
+        for j, name in enumerate(self.pollutants):
+            index[j] = np.where(valid[j], sub_index(name, average[j]), -1.0)
+        enough: np.ndarray = valid.sum(axis=0) >= max(self.min_pollutants, 1)
+        if self.particulates:
+            enough &= valid[self.particulates].any(axis=0)
+        dominant: np.ndarray = np.where(enough, index.argmax(axis=0), -1)
+        aqi: np.ndarray = np.where(enough, np.rint(index.max(axis=0)), -1).astype(np.int64)
+        return {
+            "average":   average,
+            "sub_index": np.where(valid, index, math.nan),
+            "hours":     hours,
+            "aqi":       aqi,
+            "dominant":  dominant,
+        }
+
+    def aqi(self, rows: np.ndarray) -> np.ndarray:
+        """CPCB AQI of the wards at `rows` (-1 = unknown ward or too little data)."""
+        out: np.ndarray = np.full(len(rows), -1, dtype=np.int64)
+        known: np.ndarray = rows >= 0
+        if known.any():
+            out[known] = self.state(rows[known])["aqi"]
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pollutants":  self.pollutants,
+            "periods_h":   dict(zip(self.pollutants, self.periods.tolist())),
+            "min_hours":   dict(zip(self.pollutants, self.min_hours.tolist())),
+            "hour":        self.hour,
+            "readings":    self.readings,
+            "expired":     self.expired,
+            "rollovers":   self.rollovers,
+        }
@@ -0,0 +1,311 @@
+"""
+=============================================================================
+  CITY AIR WATCH — FILTERED SSE SUBSCRIPTIONS  (/stream?wards=&topics=)
+=============================================================================
+  A client may ask for a projection of the tick event instead of the whole
+  city:  /stream?wards=ward_3,ward_6&topics=alerts,summary
+
+    topics   wards          -> "wards"                 ward rows
+             alerts         -> "alert_transitions"     (snapshot: "active_alerts")
+             summary        -> "city_summary", "pipeline"
+             windows        -> "window_results"
+             corroboration  -> "spike_corroboration"
+             rag            -> "rag_bands"
+    wards    keeps only the rows, transitions, window values and
+             corroborations of those wards (summary / rag are city-wide)
+
+  Every frame keeps "event", "tick" and "timestamp". Filters are normalized
+  (sorted, de-duplicated), so clients asking for the same projection share
+  one FanoutHub: a tick is projected and encoded once per distinct filter,
+  however many clients hold it. Each projection has its own event ids and
+  journal, so Last-Event-ID resumes work as on the full stream.
+
+  A projection whose last client left keeps being published for
+  `idle_ticks` ticks (so reconnects can still resume), then it is dropped.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from typing import Any, Callable, Container, Dict, Iterator, List, Mapping, NamedTuple, Optional
+
+from fanout import FanoutHub, Subscriber, encode_sse, publish_many
+
+# Topic -> keys of the aqi_update event it carries
+TOPICS: Dict[str, tuple[str, ...]] = {
+    "wards":         ("wards",),
+    "alerts":        ("alert_transitions",),
+    "summary":       ("city_summary", "pipeline"),
+    "windows":       ("window_results",),
+    "corroboration": ("spike_corroboration",),
+    "rag":           ("rag_bands",),
+}
+# Per-ward lists of the event, filtered on their items' ward_id
+WARD_LISTS: frozenset[str] = frozenset(("alert_transitions", "spike_corroboration"))
+_KEY_HEADS: Dict[str, bytes] = {
+    key: f'"{key}": '.encode("ascii")
+    for key in ("event", "tick", "timestamp", *(k for keys in TOPICS.values() for k in keys))
+}
+
+
+class StreamFilter(NamedTuple):
+    """Normalized subscription: wards None means every ward."""
+
+    wards: Optional[tuple[str, ...]]
+    topics: tuple[str, ...]
+
+    def __str__(self) -> str:
+        wards: str = ",".join(self.wards) if self.wards is not None else "*"
+        return f"wards={wards}&topics={','.join(self.topics)}"
+
+
+def _split(raw: str) -> List[str]:
+    return sorted({part.strip() for part in raw.split(",") if part.strip()})
+
+
+def parse_filter(wards: Optional[str], topics: Optional[str], known_wards: Container[str]) -> Optional[StreamFilter]:
+    """
+    StreamFilter for the wards= / topics= query values, or None when they
+    select the whole event (the unfiltered stream). Raises ValueError for
+    unknown wards / topics and empty lists.
+    """
+    ward_ids: Optional[List[str]] = None
+    if wards is not None:
+        ward_ids = _split(wards)
+        if not ward_ids:
+            raise ValueError("'wards' must list at least one ward id")
+        unknown: List[str] = [w for w in ward_ids if w not in known_wards]
+        if unknown:
+            raise ValueError(f"unknown ward(s): {', '.join(unknown[:10])}")
+    names: List[str] = sorted(TOPICS)
+    if topics is not None:
+        names = _split(topics)
+        if not names:
+            raise ValueError("'topics' must list at least one topic")
+        bad: List[str] = [t for t in names if t not in TOPICS]
+        if bad:
+            raise ValueError(f"unknown topic(s): {', '.join(bad)}; topics are {', '.join(TOPICS)}")
+    if ward_ids is None and len(names) == len(TOPICS):
+        return None
+    return StreamFilter(tuple(ward_ids) if ward_ids is not None else None, tuple(names))
+
+
+def project(
+    event: Dict[str, Any],
+    flt: StreamFilter,
+    rows: Callable[[str], Optional[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """The part of an aqi_update event `flt` selects; rows(ward_id) looks up a ward's row of this tick."""
+    out: Dict[str, Any] = {"event": event["event"], "tick": event["tick"], "timestamp": event["timestamp"]}
+    wards: Optional[frozenset[str]] = frozenset(flt.wards) if flt.wards is not None else None
+    for topic in flt.topics:
+        for key in TOPICS[topic]:
+            value: Any = event.get(key)
+            if value is None:
+                continue
+            if wards is not None:
+                if key == "wards":
+                    value = [row for row in map(rows, flt.wards or ()) if row is not None]
+                elif key in WARD_LISTS:
+                    value = [item for item in value if item["ward_id"] in wards]
+                elif key == "window_results":
+                    value = [
+                        {**result, "wards": picked}
+                        for result in value
+                        if (picked := {w: v for w, v in result["wards"].items() if w in wards})
+                    ]
+                if not value and key != "alert_transitions":
+                    continue
+            out[key] = value
+    return out
+
+
+def snapshot_payload(projected: Dict[str, Any], flt: StreamFilter, alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Snapshot a new filtered client starts from: the last projected tick plus its active alerts."""
+    snap: Dict[str, Any] = {"event": "snapshot", "tick": projected["tick"], "timestamp": projected["timestamp"]}
+    for key in ("city_summary", "wards", "rag_bands"):
+        if key in projected:
+            snap[key] = projected[key]
+    if "pipeline" in projected:
+        snap["pipeline"] = {"stats": projected["pipeline"]["stats"]}
+    if "alerts" in flt.topics:
+        wards: Optional[frozenset[str]] = frozenset(flt.wards) if flt.wards is not None else None
+        snap["active_alerts"] = alerts if wards is None else [a for a in alerts if a["ward_id"] in wards]
+    return snap
+
+
+class SharedFragments:
+    """
+    JSON of one tick's projections, built from fragments shared between
+    them: values taken unchanged from the event (summary, stats, unfiltered
+    lists) and ward rows are encoded once per tick, however many
+    projections include them. encode(p) == json.dumps(p), as bytes.
+    """
+
+    def __init__(self, event: Dict[str, Any], wards_json: Optional[bytes] = None) -> None:
+        self.event: Dict[str, Any] = event
+        self.wards_json: Optional[bytes] = wards_json   # every ward row, pre-encoded (sharded mode)
+        self.values: Dict[str, bytes] = {}
+        self.rows: Dict[str, bytes] = {}
+
+    def row(self, row: Dict[str, Any]) -> bytes:
+        ward_id: str = str(row["ward_id"])
+        body: Optional[bytes] = self.rows.get(ward_id)
+        if body is None:
+            body = self.rows[ward_id] = json.dumps(row).encode("utf-8")
+        return body
+
+    def value(self, key: str, value: Any, flt: StreamFilter) -> bytes:
+        if key == "wards":
+            if flt.wards is None and self.wards_json is not None:
+                return b"[" + self.wards_json + b"]"
+            if flt.wards is not None:
+                return b"[" + b", ".join(map(self.row, value)) + b"]"
+        if value == []:
+            return b"[]"
+        if value is self.event.get(key):
+            body: Optional[bytes] = self.values.get(key)
+            if body is None:
+                body = self.values[key] = json.dumps(value).encode("utf-8")
+            return body
+        return json.dumps(value).encode("utf-8")
+
+    def encode(self, projected: Dict[str, Any], flt: StreamFilter) -> bytes:
+        parts: List[bytes] = []
+        for key, value in projected.items():
+            head: Optional[bytes] = _KEY_HEADS.get(key)
+            if head is None:
+                head = json.dumps(key).encode("utf-8") + b": "
+            parts.append(head + self.value(key, value, flt))
+        return b"{" + b", ".join(parts) + b"}"
+
+
+class Projection:
+    """One distinct filter: its hub and the cached snapshot frame of the current tick."""
+
+    def __init__(self, flt: StreamFilter, hub: FanoutHub) -> None:
+        self.filter: StreamFilter = flt
+        self.hub: FanoutHub = hub
+        self.idle_ticks: int = 0
+        self._snapshot: tuple[Any, bytes] = (None, b"")
+
+    def snapshot_frame(self, alerts: List[Dict[str, Any]], version: str) -> Optional[bytes]:
+        """Encoded snapshot as of the hub cursor; `version` identifies the alert list (e.g. the poll ETag)."""
+        context: Optional[tuple[Dict[str, Any], Optional[bytes]]] = self.hub.context
+        if context is None:
+            return None
+        key: tuple[int, int, str] = (self.hub.delivered_id, context[0]["tick"], version)
+        if self._snapshot[0] != key:
+            snap: Dict[str, Any] = snapshot_payload(context[0], self.filter, alerts)
+            self._snapshot = (key, encode_sse(
+                SharedFragments({}, context[1]).encode(snap, self.filter), self.hub.event_id(self.hub.delivered_id)
+            ))
+        return self._snapshot[1]
+
+
+class TopicRouter:
+    """
+    Registry of projections. subscribe() runs on the event loop, publish()
+    on the pipeline thread; a lock keeps a projection from being dropped
+    while a client joins it.
+    """
+
+    def __init__(self, new_hub: Callable[[], FanoutHub], idle_ticks: int = 120, max_projections: int = 1000) -> None:
+        self.new_hub: Callable[[], FanoutHub] = new_hub
+        self.idle_ticks: int = idle_ticks
+        self.max_projections: int = max_projections
+        self.projections: Dict[StreamFilter, Projection] = {}
+        self.created: int = 0
+        self.encoded: int = 0          # projections encoded, over all ticks
+        self.evicted_frames: int = 0   # frames published by projections since dropped
+        self.evicted_dropped: int = 0
+        # Last tick seen by publish(): (event, rows, wards_json), new projections start from it
+        self.last: Optional[tuple[Dict[str, Any], Callable[[], Mapping[str, Dict[str, Any]]], Optional[bytes]]] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.projections)
+
+    def __iter__(self) -> Iterator[Projection]:
+        return iter(list(self.projections.values()))
+
+    def clients(self) -> int:
+        return sum(len(p.hub) for p in self)
+
+    def published(self) -> int:
+        return self.evicted_frames + sum(p.hub.published for p in self)
+
+    def dropped(self) -> int:
+        return self.evicted_dropped + sum(p.hub.dropped for p in self)
+
+    # ── loop side ─────────────────────────────────
+    def subscribe(self, flt: StreamFilter) -> Optional[tuple[Projection, Subscriber]]:
+        """
+        Join (or create) the projection for `flt`; None when max_projections
+        distinct filters are already live. A new projection's snapshot is the
+        projection of the last published tick.
+        """
+        with self._lock:
+            projection: Optional[Projection] = self.projections.get(flt)
+            if projection is None:
+                if len(self.projections) >= self.max_projections:
+                    return None
+                hub: FanoutHub = self.new_hub()
+                self.created += 1
+                # Ids must not be mistaken for another projection's on resume
+                hub.epoch = f"{hub.epoch}p{self.created:x}"
+                if self.last is not None:
+                    event, rows, wards_json = self.last
+                    lookup: Mapping[str, Dict[str, Any]] = rows() if flt.wards is not None else {}
+                    hub.context = (project(event, flt, lookup.get), wards_json)
+                projection = Projection(flt, hub)
+                self.projections[flt] = projection
+            projection.idle_ticks = 0
+            return projection, projection.hub.subscribe()
+
+    # ── pipeline thread ───────────────────────────
+    def publish(
+        self,
+        event: Dict[str, Any],
+        rows: Callable[[], Mapping[str, Dict[str, Any]]],
+        wards_json: Optional[bytes] = None,
+    ) -> int:
+        """
+        Project, encode and publish one tick per live projection; returns how
+        many were encoded. rows() maps ward id -> row of this tick and is only
+        called if some projection selects wards; wards_json: every ward row,
+        pre-encoded (sharded mode, where event["wards"] is empty).
+        """
+        with self._lock:
+            self.last = (event, rows, wards_json)
+            for flt, projection in list(self.projections.items()):
+                if len(projection.hub):
+                    projection.idle_ticks = 0
+                    continue
+                projection.idle_ticks += 1
+                if projection.idle_ticks > self.idle_ticks:
+                    del self.projections[flt]
+                    self.evicted_frames += projection.hub.published
+                    self.evicted_dropped += projection.hub.dropped
+            live: List[Projection] = list(self.projections.values())
+        picked: Dict[str, Optional[Dict[str, Any]]] = {}
+        lookup: List[Mapping[str, Dict[str, Any]]] = []
+
+        def row(ward_id: str) -> Optional[Dict[str, Any]]:
+            # Shared by every projection of the tick: each ward row is looked up once
+            if ward_id not in picked:
+                if not lookup:
+                    lookup.append(rows())
+                picked[ward_id] = lookup[0].get(ward_id)
+            return picked[ward_id]
+
+        fragments: SharedFragments = SharedFragments(event, wards_json)
+        frames: List[tuple[FanoutHub, bytes, Any]] = []
+        for projection in live:
+            projected: Dict[str, Any] = project(event, projection.filter, row)
+            frames.append((projection.hub, fragments.encode(projected, projection.filter), (projected, wards_json)))
+        publish_many(frames)
+        self.encoded += len(live)
+        return len(live)
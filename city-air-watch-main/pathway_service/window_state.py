@@ -0,0 +1,130 @@
+"""
+=============================================================================
+  CITY AIR WATCH — INCREMENTAL WINDOW STATE
+=============================================================================
+  O(1)-per-sample sliding-window aggregates for one ward.
+
+  A WindowState owns a single ring buffer sized to its longest window and
+  any number of named SlidingWindows over it (e.g. 5-sample spike window,
+  20-sample rolling window, 1h / 24h NAQI averages). Each push updates
+  every window by the value entering and the value leaving it:
+    - running sum          -> mean
+    - Welford accumulators -> variance
+    - monotonic deques     -> min / max (amortized O(1))
+  so per-tick cost does not grow with window length.
+=============================================================================
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Dict, List, Mapping, Optional
+
+
+class SlidingWindow:
+    """Aggregates over the last `size` samples pushed into the owning WindowState."""
+
+    def __init__(self, size: int) -> None:
+        if size < 1:
+            raise ValueError("window size must be >= 1")
+        self.size: int = size
+        self.count: int = 0
+        self.sum: Any = 0
+        self._mean: float = 0.0
+        self._m2: float = 0.0
+        # (sequence number, value); fronts hold the current min / max
+        self._min_q: deque[tuple[int, Any]] = deque()
+        self._max_q: deque[tuple[int, Any]] = deque()
+
+    def _push(self, seq: int, value: Any, evicted: Optional[Any]) -> None:
+        self.sum += value
+        x: float = float(value)
+        if evicted is None:
+            # Welford add
+            self.count += 1
+            delta: float = x - self._mean
+            self._mean += delta / self.count
+            self._m2 += delta * (x - self._mean)
+        else:
+            # Welford replace: add x and remove the evicted sample in one step
+            self.sum -= evicted
+            y: float = float(evicted)
+            old_mean: float = self._mean
+            self._mean += (x - y) / self.count
+            self._m2 += (x - y) * (x - self._mean + y - old_mean)
+            if self._m2 < 0.0:
+                self._m2 = 0.0
+
+        oldest: int = seq - self.size
+        while self._min_q and self._min_q[-1][1] >= value:
+            self._min_q.pop()
+        self._min_q.append((seq, value))
+        if self._min_q[0][0] <= oldest:
+            self._min_q.popleft()
+        while self._max_q and self._max_q[-1][1] <= value:
+            self._max_q.pop()
+        self._max_q.append((seq, value))
+        if self._max_q[0][0] <= oldest:
+            self._max_q.popleft()
+
+    @property
+    def mean(self) -> float:
+        return float(self.sum) / float(self.count) if self.count else 0.0
+
+    @property
+    def variance(self) -> float:
+        """Population variance of the samples in the window."""
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def min(self) -> Any:
+        return self._min_q[0][1] if self._min_q else None
+
+    @property
+    def max(self) -> Any:
+        return self._max_q[0][1] if self._max_q else None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "size":     self.size,
+            "count":    self.count,
+            "mean":     round(self.mean, 1),  # type: ignore[call-overload]
+            "min":      self.min,
+            "max":      self.max,
+            "variance": round(self.variance, 2),  # type: ignore[call-overload]
+        }
+
+
+class WindowState:
+    """Named sliding windows over one ward's sample stream, sharing a ring buffer."""
+
+    def __init__(self, sizes: Mapping[str, int]) -> None:
+        if not sizes:
+            raise ValueError("at least one window is required")
+        self.windows: Dict[str, SlidingWindow] = {
+            name: SlidingWindow(int(size)) for name, size in sizes.items()
+        }
+        self.capacity: int = max(w.size for w in self.windows.values())
+        self._ring: List[Any] = [0] * self.capacity
+        self._seq: int = 0   # samples pushed so far; next write slot is _seq % capacity
+
+    @property
+    def samples(self) -> int:
+        """Samples currently retained (capped at the longest window)."""
+        return min(self._seq, self.capacity)
+
+    def push(self, value: Any) -> None:
+        seq: int = self._seq
+        for window in self.windows.values():
+            evicted: Optional[Any] = None
+            if seq >= window.size:
+                evicted = self._ring[(seq - window.size) % self.capacity]
+            window._push(seq, value, evicted)
+        self._ring[seq % self.capacity] = value
+        self._seq = seq + 1
+
+    def __getitem__(self, name: str) -> SlidingWindow:
+        return self.windows[name]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {name: window.summary() for name, window in self.windows.items()}
@@ -1,5 +1,6 @@
 import Prediction from '../models/Prediction.js';
 import Ward from '../models/Ward.js';
+import { getForecastFromPathway } from '../streamBridge.js';
 
 export const getPrediction = async (req, res) => {
   try {
@@ -22,6 +23,36 @@ export const getPrediction = async (req, res) => {
   }
 };
 
+// Live forecasts from the streaming engine (engine ward ids, e.g. "ward_3"),
+// in the shape of Prediction.predictions
+export const getLivePrediction = async (req, res) => {
+  try {
+    const live = await getForecastFromPathway(req.params.wardId);
+    if (live.error) {
+      // 404 unknown ward, 503 no forecast yet: keep the engine's status
+      return res.status(live.httpStatus || 502).json({ success: false, message: live.error });
+    }
+    const predictions = Object.entries(live.horizons).map(([horizon, f]) => ({
+      hour: parseInt(horizon, 10),
+      predictedAQI: f.aqi,
+      predictedLevel: f.aqi_level,
+      range: { lower: f.lower, upper: f.upper },
+      forecastFor: f.at,
+    }));
+    res.status(200).json({
+      success: true,
+      source: 'pathway',
+      ward: live.ward_name,
+      generatedAt: live.timestamp,
+      trendPerHour: live.trend_per_hour,
+      samples: live.samples,
+      predictions,
+    });
+  } catch (error) {
+    res.status(503).json({ success: false, message: error.message });
+  }
+};
+
 export const createPrediction = async (req, res) => {
   try {
     const {
@@ -1,5 +1,6 @@
 import Ward from '../models/Ward.js';
 import AQIData from '../models/AQIData.js';
+import { getNearbyFromPathway } from '../streamBridge.js';
 
 export const getAllWards = async (req, res) => {
   try {
@@ -101,30 +102,52 @@ export const getWardMap = async (req, res) => {
   }
 };
 
+// Engine /nearby rows in the shape of Ward documents, with the distance in metres
+const wardFromPathway = (w) => ({
+  name: w.ward_name,
+  code: w.ward_id,
+  coordinates: { type: 'Point', coordinates: [w.lon, w.lat] },
+  currentAQI: w.aqi,
+  aqiLevel: w.aqi_level,
+  distance: w.distance_m,
+});
+
 export const getNearbyWards = async (req, res) => {
   try {
-    const { longitude, latitude, distance = 5000 } = req.query;
+    const longitude = parseFloat(req.query.longitude);
+    const latitude = parseFloat(req.query.latitude);
+    const distance = parseFloat(req.query.distance ?? 5000);
 
-    if (!longitude || !latitude) {
+    if (!Number.isFinite(longitude) || !Number.isFinite(latitude)) {
       return res.status(400).json({ success: false, message: 'Coordinates are required' });
     }
+    if (Math.abs(latitude) > 90 || Math.abs(longitude) > 180 || !(distance > 0)) {
+      return res.status(400).json({ success: false, message: 'Coordinates or distance out of range' });
+    }
 
-    const wards = await Ward.find({
-      coordinates: {
-        $near: {
-          $geometry: {
-            type: 'Point',
-            coordinates: [parseFloat(longitude), parseFloat(latitude)],
-          },
-          $maxDistance: parseFloat(distance),
+    // Live engine state first; MongoDB while the engine is offline. Both answer in the same shape.
+    try {
+      const live = await getNearbyFromPathway(latitude, longitude, distance);
+      if (!live.error) {
+        const data = live.wards.map(wardFromPathway);
+        return res.status(200).json({ success: true, source: 'pathway', count: data.length, data });
+      }
+    } catch {
+      // fall through to MongoDB
+    }
+
+    const data = await Ward.aggregate([
+      {
+        $geoNear: {
+          near: { type: 'Point', coordinates: [longitude, latitude] },
+          distanceField: 'distance',
+          maxDistance: distance,
+          spherical: true,
         },
       },
-    });
+    ]);
 
-    res.status(200).json({
-      success: true,
-      data: wards,
-    });
+    res.status(200).json({ success: true, source: 'mongodb', count: data.length, data });
   } catch (error) {
     res.status(500).json({ success: false, message: error.message });
   }
@@ -71,6 +71,7 @@ app.get('/api/health/ward/:wardId/recommendations', healthController.getHealthRe
 // Prediction routes
 app.get('/api/predictions/city', predictionController.getCityWidePredictions);
 app.get('/api/predictions/ward/:wardId', predictionController.getPrediction);
+app.get('/api/predictions/ward/:wardId/live', predictionController.getLivePrediction);
 app.get('/api/predictions/ward/:wardId/48h', predictionController.get48HourPrediction);
 app.get('/api/predictions/ward/:wardId/sources', predictionController.getSourceAnalysis);
 app.get('/api/predictions/ward/:wardId/risk', predictionController.getRiskAssessment);
@@ -3,12 +3,19 @@
  * ─────────────────────────────────────────────────────
  * Polls the Pathway Python REST endpoints every 5s
  * and broadcasts updates to all connected frontend SSE clients.
+ *
+ * With PATHWAY_PUBSUB set (the engine's tick socket, see pathway_service/pubsub.py)
+ * the bridge subscribes instead and forwards every tick as soon as the engine
+ * publishes it; polling takes over again while the socket is unavailable.
  */
 
 import http from 'http';
+import net from 'net';
 
 const PATHWAY_BASE = 'http://localhost:5000';
 const POLL_INTERVAL_MS = 5000;
+const PUBSUB_PATH = process.env.PATHWAY_PUBSUB || '';
+const PUBSUB_RETRY_MS = 2000;
 
 // All connected frontend SSE clients
 const sseClients = new Set();
@@ -18,7 +25,11 @@ let latestStreamData = null;
 let pathwayConnected = false;
 let connectionAttempts = 0;
 let pollTimer = null;
+let pollInFlight = false;    // a /snapshot request is awaiting its response
 let tick = 0;
+let snapshotEtag = null;
+let subscribed = false;      // live on the engine's tick socket
+let pendingTick = null;      // last `tick` message, until its `state` arrives
 
 // ─── Stream Log Buffer ────────────────────────────────
 const streamLog = [];
@@ -59,7 +70,40 @@ function httpGet(url, timeoutMs = 4000) {
       let body = '';
       res.on('data', chunk => { body += chunk.toString(); });
       res.on('end', () => {
-        try { resolve(JSON.parse(body)); }
+        let data;
+        try { data = JSON.parse(body); }
+        catch (e) { reject(new Error('JSON parse error')); return; }
+        // Error bodies ({error}) keep the engine's status for callers to pass through
+        if (res.statusCode >= 400 && data && typeof data === 'object') data.httpStatus = res.statusCode;
+        resolve(data);
+      });
+    });
+    req.setTimeout(timeoutMs, () => {
+      req.destroy();
+      reject(new Error('Timeout'));
+    });
+    req.on('error', reject);
+  });
+}
+
+// ─── Conditional GET (If-None-Match / 304) ────────────
+function httpGetConditional(url, etag, timeoutMs = 4000) {
+  return new Promise((resolve, reject) => {
+    const headers = etag ? { 'If-None-Match': etag } : {};
+    const req = http.get(url, { headers }, (res) => {
+      if (res.statusCode === 304) {
+        res.resume();
+        resolve({ notModified: true, etag });
+        return;
+      }
+      let body = '';
+      res.on('data', chunk => { body += chunk.toString(); });
+      res.on('end', () => {
+        if (res.statusCode !== 200) {
+          reject(new Error(`HTTP ${res.statusCode}`));
+          return;
+        }
+        try { resolve({ notModified: false, etag: res.headers.etag || null, data: JSON.parse(body) }); }
         catch (e) { reject(new Error('JSON parse error')); }
       });
     });
@@ -187,62 +231,91 @@ function generateSimData() {
   };
 }
 
-// ─── Poll Pathway Engine REST ─────────────────────────
-async function pollPathway() {
-  try {
-    // Try /wards endpoint (snapshot of current state)
-    const wardsData = await httpGet(`${PATHWAY_BASE}/wards`);
-    const alertsData = await httpGet(`${PATHWAY_BASE}/alerts`);
-    const statusData = await httpGet(`${PATHWAY_BASE}/status`);
-
-    if (!pathwayConnected) {
-      pathwayConnected = true;
-      connectionAttempts = 0;
-      addLog('success', '🟢 Pathway Engine Connected — Live AQI stream active (port 5000)');
-      addLog('info', '📚 Document Store online: WHO Guidelines + Govt Rules + Health Advisories');
-      console.log('✅ [Bridge] Connected to Pathway Engine via REST polling');
-    }
+// ─── Engine connection state ──────────────────────────
+function markConnected(via) {
+  if (pathwayConnected) return;
+  pathwayConnected = true;
+  connectionAttempts = 0;
+  addLog('success', '🟢 Pathway Engine Connected — Live AQI stream active (port 5000)');
+  addLog('info', '📚 Document Store online: WHO Guidelines + Govt Rules + Health Advisories');
+  console.log(`✅ [Bridge] Connected to Pathway Engine via ${via}`);
+}
 
-    const wards = wardsData.wards || [];
-    const alerts = alertsData.alerts || [];
-    const aqis = wards.map(w => w.aqi || 0);
-    const cityAvg = aqis.length ? Math.round((aqis.reduce((a, b) => a + b, 0) / aqis.length) * 10) / 10 : 0;
+// ─── One engine tick -> logs + stream_update ──────────
+// data: { wards, alerts, alert_transitions, stats } (the /snapshot body)
+function applySnapshot(data) {
+  const wards = data.wards || [];
+  const alerts = data.alerts || [];
+  const aqis = wards.map(w => w.aqi || 0);
+  const cityAvg = aqis.length ? Math.round((aqis.reduce((a, b) => a + b, 0) / aqis.length) * 10) / 10 : 0;
 
-    // Log spikes from pathway
-    wards.filter(w => w.spike).forEach(w => {
-      addLog('warning', `⚡ SPIKE DETECTED: ${w.ward_name} — AQI ${w.aqi} (rolling avg: ${w.rolling_avg})`, { ward_id: w.ward_id, aqi: w.aqi });
-    });
-    alerts.forEach(a => {
+  // Log spikes from pathway
+  wards.filter(w => w.spike).forEach(w => {
+    addLog('warning', `⚡ SPIKE DETECTED: ${w.ward_name} — AQI ${w.aqi} (rolling avg: ${w.rolling_avg})`, { ward_id: w.ward_id, aqi: w.aqi });
+  });
+  // Log alert state changes only (the engine de-duplicates repeats); the full list rides in active_alerts
+  (data.alert_transitions || []).forEach(t => {
+    const a = t.alert;
+    if (t.transition === 'raise' || t.transition === 'escalate') {
       addLog('critical', `${a.icon || '🚨'} THRESHOLD ALERT: ${a.ward_name} — ${a.severity} (AQI=${a.aqi})`, { ward_id: a.ward_id });
-    });
+    } else if (t.transition === 'deescalate' || t.transition === 'resolve') {
+      addLog('info', `✅ ALERT ${t.transition === 'resolve' ? 'RESOLVED' : `EASED to ${t.to}`}: ${a.ward_name} (AQI=${t.aqi})`, { ward_id: a.ward_id });
+    }
+  });
 
-    // Summary log every tick
-    addLog('info',
-      `📊 Pathway window update — CityAvg: ${cityAvg} | Max: ${Math.max(...aqis, 0)} | Critical: ${wards.filter(w => w.aqi > 150).length}/${wards.length}`,
-      { tick }
-    );
+  // Summary log every tick
+  addLog('info',
+    `📊 Pathway window update — CityAvg: ${cityAvg} | Max: ${Math.max(...aqis, 0)} | Critical: ${wards.filter(w => w.aqi > 150).length}/${wards.length}`,
+    { tick }
+  );
 
-    const payload = {
-      event: 'aqi_update',
-      tick,
-      timestamp: new Date().toISOString(),
-      pipeline: {
-        layer: 'Pathway Streaming Engine v1.0',
-        stats: statusData.stats || {},
-      },
-      city_summary: {
-        avg_aqi: cityAvg,
-        max_aqi: Math.max(...aqis, 0),
-        aqi_level: getAQILevel(Math.round(cityAvg)),
-        critical_wards: wards.filter(w => w.aqi > 150).length,
-        total_wards: wards.length,
-      },
-      wards,
-      active_alerts: alerts,
-    };
+  const payload = {
+    event: 'aqi_update',
+    tick,
+    timestamp: new Date().toISOString(),
+    pipeline: {
+      layer: 'Pathway Streaming Engine v1.0',
+      stats: data.stats || {},
+    },
+    city_summary: {
+      avg_aqi: cityAvg,
+      max_aqi: Math.max(...aqis, 0),
+      aqi_level: getAQILevel(Math.round(cityAvg)),
+      critical_wards: wards.filter(w => w.aqi > 150).length,
+      total_wards: wards.length,
+    },
+    wards,
+    active_alerts: alerts,
+  };
+
+  latestStreamData = payload;
+  broadcastToClients({ event: 'stream_update', payload });
+}
 
-    latestStreamData = payload;
-    broadcastToClients({ event: 'stream_update', payload });
+// ─── Poll Pathway Engine REST ─────────────────────────
+// Starts the poll loop unless one is already scheduled or in flight
+function startPolling() {
+  if (!pollTimer && !pollInFlight) pollPathway();
+}
+
+async function pollPathway() {
+  pollTimer = null;
+  if (subscribed) return;   // ticks arrive on the socket
+  pollInFlight = true;
+  try {
+    // One conditional request: wards + alerts + stats of the engine's last tick
+    const snapshot = await httpGetConditional(`${PATHWAY_BASE}/snapshot`, pathwayConnected ? snapshotEtag : null);
+    markConnected('REST polling');
+
+    if (snapshot.notModified) {
+      // No engine tick since the last poll; clients already hold this state
+      tick++;
+      pollInFlight = false;
+      pollTimer = setTimeout(pollPathway, POLL_INTERVAL_MS);
+      return;
+    }
+    snapshotEtag = snapshot.etag;
+    applySnapshot(snapshot.data);
 
   } catch (err) {
     connectionAttempts++;
@@ -267,9 +340,78 @@ async function pollPathway() {
 
   tick++;
   // Schedule next poll
+  pollInFlight = false;
   pollTimer = setTimeout(pollPathway, POLL_INTERVAL_MS);
 }
 
+// ─── Subscribe to the engine's tick socket ────────────
+// Lines of `<topic> <json>`: `tick` carries the aqi_update event, `state`
+// the active alerts once the engine has published that tick.
+function handlePubsubMessage(line) {
+  const space = line.indexOf(32);
+  if (space < 0) return;
+  const topic = line.toString('latin1', 0, space);
+  const message = JSON.parse(line.toString('utf8', space + 1));
+  if (topic === 'tick') {
+    pendingTick = message;
+  } else if (topic === 'state' && pendingTick && pendingTick.tick === message.tick) {
+    const event = pendingTick;
+    pendingTick = null;
+    applySnapshot({
+      wards: event.wards,
+      alerts: message.alerts,
+      alert_transitions: event.alert_transitions,
+      stats: event.pipeline?.stats,
+    });
+    snapshotEtag = message.snapshot_etag;
+    tick++;
+  }
+}
+
+function subscribePathway() {
+  const sock = net.createConnection(PUBSUB_PATH);
+  let partial = [];
+
+  sock.on('connect', () => {
+    subscribed = true;
+    if (pollTimer) {
+      clearTimeout(pollTimer);
+      pollTimer = null;
+    }
+    markConnected(`tick socket ${PUBSUB_PATH}`);
+  });
+
+  sock.on('data', (chunk) => {
+    let start = 0;
+    let nl;
+    while ((nl = chunk.indexOf(10, start)) !== -1) {
+      partial.push(chunk.subarray(start, nl));
+      const line = partial.length === 1 ? partial[0] : Buffer.concat(partial);
+      partial = [];
+      start = nl + 1;
+      try {
+        handlePubsubMessage(line);
+      } catch (err) {
+        console.warn(`⚠️  [Bridge] Bad tick message: ${err.message}`);
+      }
+    }
+    if (start < chunk.length) partial.push(chunk.subarray(start));
+  });
+
+  sock.on('error', () => { /* 'close' follows */ });
+
+  sock.on('close', () => {
+    const wasSubscribed = subscribed;
+    subscribed = false;
+    pendingTick = null;
+    if (wasSubscribed) {
+      console.warn('⚠️  [Bridge] Tick socket closed — polling until it is back');
+    }
+    startPolling();
+    setTimeout(subscribePathway, PUBSUB_RETRY_MS);
+  });
+}
+
 // ─── Express Route Handlers ───────────────────────────
 export function setupStreamRoutes(app) {
   // SSE endpoint for frontend
@@ -348,8 +490,29 @@ export function setupStreamRoutes(app) {
 export function initStreamBridge() {
   addLog('info', '🚀 Pathway Stream Bridge initializing...');
   addLog('info', '🔌 Connecting to Pathway Engine at http://localhost:5000...');
-  // Start polling immediately
+  // Start polling immediately; the tick socket, when configured, replaces it once connected
   pollPathway();
+  if (PUBSUB_PATH) subscribePathway();
+}
+
+/**
+ * Wards within `radius` metres of a point, from the engine's spatial index and live AQI
+ * @returns {Promise<Object>} rejects while the engine is unreachable
+ */
+export function getNearbyFromPathway(latitude, longitude, radius, limit = 200) {
+  if (!pathwayConnected) return Promise.reject(new Error('Pathway engine offline'));
+  const params = new URLSearchParams({ lat: latitude, lon: longitude, radius, limit });
+  return httpGet(`${PATHWAY_BASE}/nearby?${params}`, 2000);
+}
+
+/**
+ * 1h / 3h / 6h AQI forecasts for an engine ward id, from the engine's per-tick forecast cache
+ * @returns {Promise<Object>} rejects while the engine is unreachable; `{error, httpStatus}`
+ *   for an unknown ward (404) or before the first forecast (503)
+ */
+export function getForecastFromPathway(wardId) {
+  if (!pathwayConnected) return Promise.reject(new Error('Pathway engine offline'));
+  return httpGet(`${PATHWAY_BASE}/forecast/${encodeURIComponent(wardId)}`, 2000);
 }
 
 /**